@@ -0,0 +1,3950 @@
+# -*- coding: gbk -*-
+"""ûΪݷĹʵ
+
+bigdata-analyze.py(raw_user_action)data-analyze.py(user_action)ֻԲͬ
+run()׼mysql-rollup.pyֱӵ뱾ģ鲢set_table()ѡݱ
+"""
+import pymysql
+import pandas as pd
+import numpy as np
+import traceback
+import logging
+import os
+import sys
+from datetime import datetime
+import psutil
+import time
+import argparse
+import json
+import multiprocessing
+import queue
+import threading
+import contextlib
+import functools
+import cProfile
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import importlib.util
+import hashlib
+import inspect
+try:
+    import resource
+except ImportError:  # Windowsûresourceģ
+    resource = None
+
+# MySQLݱset_table()(SQLִʱȡ)
+TABLE = 'raw_user_action'
+# ػĿ¼աۺ״̬λͼĿ¼
+CACHE_DIR = "cache"
+
+
+def set_table(table):
+    """ѡҪݱ"""
+    global TABLE
+    TABLE = table
+
+
+def table_cache_dir():
+    return os.path.join(CACHE_DIR, TABLE)
+
+
+# еʱ־ļܱ湲
+RUN_TIMESTAMP = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+# ־ϵͳ
+def setup_logging():
+    """־¼ϵͳ"""
+    log_dir = "logs"
+    os.makedirs(log_dir, exist_ok=True)
+    
+    log_filename = os.path.join(log_dir, f"user_behavior_analysis_{RUN_TIMESTAMP}.log")
+    
+    # ɫĿ̨־ʽ
+    class ColorFormatter(logging.Formatter):
+        COLORS = {
+            logging.INFO: '\033[92m',  # ɫ
+            logging.WARNING: '\033[93m',  # ɫ
+            logging.ERROR: '\033[91m',  # ɫ
+            logging.CRITICAL: '\033[91m\033[1m'  # ɫӴ
+        }
+        RESET = '\033[0m'
+        
+        def format(self, record):
+            color = self.COLORS.get(record.levelno, '')
+            message = super().format(record)
+            return f"{color}{message}{self.RESET}" if color else message
+    
+    logger = logging.getLogger('user_behavior_analysis')
+    logger.setLevel(logging.INFO)
+    
+    # ļ
+    file_handler = logging.FileHandler(log_filename)
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    
+    # ̨
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(ColorFormatter('%(asctime)s - %(levelname)s - %(message)s'))
+    
+    logger.addHandler(file_handler)
+    logger.addHandler(console_handler)
+    
+    return logger
+
+logger = setup_logging()
+
+### 0. ֽ׶ (ǽ/CPUʱ䡢ֵڴ桢£JSON)
+def _peak_rss_mb():
+    """ķֵRSS(MB)֧resourceģƽ̨˻ΪǰRSS"""
+    if resource is not None:
+        # Linuxru_maxrssλΪKB
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return psutil.Process().memory_info().rss / (1024 ** 2)
+
+
+def _reset_peak_rss():
+    """ѷֵRSS(VmHWMru_maxrss֮)ΪǰRSSڲ׶εķֵ
+
+    Linux/proc/self/clear_refs֧ʱFalse
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _window_peak_rss_mb():
+    """ϴķֵRSS(MB)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return _peak_rss_mb()
+
+
+class StageMetrics:
+    """¼׶εָ
+
+    ͬ׶(ۺ)ϲΪһ¼ۼӵôʱ
+    ֵȡֵ׶οǶףtracemallocֵRSSֵǶ׽׶֮ϴݣ
+    cProfile̵ֻ߳׶ο(ͬһʱֻһprofiler)
+    ߳еĽ׶ֻ¼ʱtracemallocֵǽ̼ģ̼߳֡
+    ߳̽׶οʼʱý̵ķֵRSSpeak_rss_mbΪ׶ķֵrss_growth_mbΪ
+    ֵԽ׶οʼʱRSSǰ׶εķֵ㵽Ľ׶ϣ
+    ֧÷ֵƽ̨rss_growth_mb˻Ϊ׶ڽ̷ֵRSS
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.profile_dir = None
+        self.trace_memory = False
+        self._started = time.perf_counter()
+        self._lifetime_peak_rss_mb = 0.0
+        self._profiles = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def _stack(self):
+        # жȡĹ̸߳ά׶ջ
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def enable(self, trace_memory=True, profile_dir=None):
+        self.trace_memory = trace_memory
+        self.profile_dir = profile_dir
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+
+    @contextlib.contextmanager
+    def stage(self, name, rows_in=None):
+        """ͳһ׶Σwithrecord['rows_in'] / record['rows_out']"""
+        record = {'rows_in': rows_in, 'rows_out': None, '_tracemalloc_peak': 0, '_rss_peak_mb': 0.0}
+        main_thread = threading.current_thread() is threading.main_thread()
+        trace = self.trace_memory and main_thread and tracemalloc.is_tracing()
+        if trace:
+            if self._stack:
+                # ÷ֵǰȰзֵǵ׶
+                parent = self._stack[-1]
+                parent['_tracemalloc_peak'] = max(parent['_tracemalloc_peak'], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        profiler = None
+        if self.profile_dir and main_thread and not self._stack:
+            # ͬ׶θͬһprofilerεõͳۼһ
+            profiler = self._profiles.setdefault(name, cProfile.Profile())
+            profiler.enable()
+        rss_window = False
+        if main_thread:
+            # ÷ֵRSSǰȰзֵǵ׶̷ֵ
+            window_peak = _window_peak_rss_mb()
+            if self._stack:
+                parent = self._stack[-1]
+                parent['_rss_peak_mb'] = max(parent['_rss_peak_mb'], window_peak)
+            self._lifetime_peak_rss_mb = max(self._lifetime_peak_rss_mb, window_peak)
+            rss_window = _reset_peak_rss()
+        self._stack.append(record)
+        rss_start = psutil.Process().memory_info().rss
+        lifetime_peak_start = _peak_rss_mb()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            self._stack.pop()
+            if profiler is not None:
+                profiler.disable()
+            traced_peak = None
+            if trace:
+                traced_peak = max(record['_tracemalloc_peak'], tracemalloc.get_traced_memory()[1])
+                if self._stack:
+                    parent = self._stack[-1]
+                    parent['_tracemalloc_peak'] = max(parent['_tracemalloc_peak'], traced_peak)
+            stage_peak = None
+            if rss_window:
+                stage_peak = max(record['_rss_peak_mb'], _window_peak_rss_mb())
+                if self._stack:
+                    parent = self._stack[-1]
+                    parent['_rss_peak_mb'] = max(parent['_rss_peak_mb'], stage_peak)
+                self._lifetime_peak_rss_mb = max(self._lifetime_peak_rss_mb, stage_peak)
+                growth = stage_peak - rss_start / (1024 ** 2)
+            else:
+                growth = _peak_rss_mb() - lifetime_peak_start
+            self.add(name, wall, cpu, rows_in=record['rows_in'], rows_out=record['rows_out'],
+                     rss_start=rss_start, tracemalloc_peak=traced_peak, peak_rss_mb=stage_peak,
+                     rss_growth_mb=growth)
+
+    def add(self, name, wall, cpu, rows_in=None, rows_out=None, rss_start=None, tracemalloc_peak=None,
+            peak_rss_mb=None, rss_growth_mb=None):
+        """ϲһ׶β(ӽвõĽҲͨ˷)"""
+        with self._lock:
+            self._add(name, wall, cpu, rows_in, rows_out, rss_start, tracemalloc_peak, peak_rss_mb, rss_growth_mb)
+
+    def _add(self, name, wall, cpu, rows_in, rows_out, rss_start, tracemalloc_peak, peak_rss_mb, rss_growth_mb):
+        entry = self.stages.setdefault(name, {
+            'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'rows_in': None, 'rows_out': None,
+            'rss_start_mb': None, 'rss_end_mb': None, 'peak_rss_mb': None, 'rss_growth_mb': None,
+            'tracemalloc_peak_mb': None})
+        entry['calls'] += 1
+        entry['wall_seconds'] += wall
+        entry['cpu_seconds'] += cpu
+        for key, value in (('rows_in', rows_in), ('rows_out', rows_out)):
+            if value is not None:
+                entry[key] = (entry[key] or 0) + int(value)
+        if rss_start is not None and entry['rss_start_mb'] is None:
+            entry['rss_start_mb'] = round(rss_start / (1024 ** 2), 1)
+        if rss_start is not None:
+            entry['rss_end_mb'] = round(psutil.Process().memory_info().rss / (1024 ** 2), 1)
+        peak = _peak_rss_mb() if peak_rss_mb is None else peak_rss_mb
+        entry['peak_rss_mb'] = round(max(entry['peak_rss_mb'] or 0, peak), 1)
+        if rss_growth_mb is not None:
+            entry['rss_growth_mb'] = round(max(entry['rss_growth_mb'] or 0, rss_growth_mb, 0), 1)
+        if tracemalloc_peak is not None:
+            entry['tracemalloc_peak_mb'] = round(max(entry['tracemalloc_peak_mb'] or 0,
+                                                     tracemalloc_peak / (1024 ** 2)), 2)
+        rows = entry['rows_in'] if entry['rows_in'] is not None else entry['rows_out']
+        entry['rows_per_sec'] = round(rows / entry['wall_seconds'], 1) if rows and entry['wall_seconds'] > 0 else None
+
+    def profile_path(self, name):
+        safe_name = "".join(c if c.isalnum() else "_" for c in name)
+        return os.path.join(self.profile_dir, f"{safe_name}.prof")
+
+    def report(self):
+        return {
+            'started_at': RUN_TIMESTAMP,
+            'wall_seconds': round(time.perf_counter() - self._started, 3),
+            'pid': os.getpid(),
+            'python': sys.version.split()[0],
+            'cpu_count': os.cpu_count(),
+            'memory_total_mb': round(psutil.virtual_memory().total / (1024 ** 2), 1),
+            'peak_rss_mb': round(max(self._lifetime_peak_rss_mb, _peak_rss_mb()), 1),
+            'stages': self.stages,
+        }
+
+    def write_report(self, path):
+        for name, profiler in self._profiles.items():
+            profiler.dump_stats(self.profile_path(name))
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        logger.info(f"ָ걨ѱ: {path}")
+
+
+def _default_rows(args, result):
+    """Ĭͳ: Ϊ׸DataFrameΪDataFrameۺϽrow_count"""
+    rows_in = len(args[0]) if args and isinstance(args[0], pd.DataFrame) else None
+    if isinstance(result, pd.DataFrame):
+        rows_out = len(result)
+    elif isinstance(result, dict) and 'row_count' in result:
+        rows_out = result['row_count']
+    else:
+        rows_out = None
+    return rows_in, rows_out
+
+
+def instrumented(name, rows=_default_rows):
+    """װ: ѺÿεüΪһ׶"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with METRICS.stage(name) as record:
+                result = func(*args, **kwargs)
+                record['rows_in'], record['rows_out'] = rows(args, result)
+                return result
+        return wrapper
+    return decorator
+
+
+METRICS = StageMetrics()
+
+
+# ͼⰴأִֻͼʱŵmatplotlib/seaborn
+plt = None
+sns = None
+FONT_CACHE_PATH = os.path.join("cache", "font_cache.json")
+selected_font = None
+
+
+def _resolve_chinese_font(mpl):
+    """ϵͳвҵһõ壬(, ļ)"""
+    # ѡ
+    chinese_fonts = [
+        "SimHei", 
+        "Microsoft YaHei",
+        "WenQuanYi Micro Hei",
+        "WenQuanYi Zen Hei",
+        "Noto Sans CJK SC",
+        "Source Han Sans SC",
+        "Droid Sans Fallback",
+        "sans-serif"
+    ]
+    
+    # ȡϵͳ
+    available_fonts = {f.name.lower(): f.fname for f in mpl.font_manager.fontManager.ttflist}
+    logger.info(f": {len(available_fonts)}")
+    
+    # ҵһõ
+    for font in chinese_fonts:
+        # ƻ
+        if font.lower() in available_fonts:
+            return font, available_fonts[font.lower()]
+        # ļǷڣɿķ
+        try:
+            font_file = mpl.font_manager.findfont(font, fallback_to_default=False)
+            if font_file and font_file != mpl.font_manager.get_default_font():
+                return font, font_file
+        except ValueError:
+            continue  # 岻ڣһ
+    return None, None
+
+
+def configure_chinese_font(mpl):
+    """ȷʾ (Ubuntu 18.04)浽ļи"""
+    global selected_font
+    try:
+        # ļȻʱֱӸãɨ
+        cached = None
+        if os.path.exists(FONT_CACHE_PATH):
+            with open(FONT_CACHE_PATH, encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('matplotlib') != mpl.__version__ or (
+                    cached.get('file') and not os.path.exists(cached['file'])):
+                cached = None
+        
+        if cached is not None:
+            selected_font = cached.get('font')
+            logger.info(f"ʹû: {selected_font}")
+        else:
+            selected_font, font_file = _resolve_chinese_font(mpl)
+            os.makedirs(os.path.dirname(FONT_CACHE_PATH), exist_ok=True)
+            with open(FONT_CACHE_PATH, 'w', encoding='utf-8') as f:
+                json.dump({'font': selected_font, 'file': font_file, 'matplotlib': mpl.__version__},
+                          f, ensure_ascii=False)
+        
+        if selected_font:
+            # ȫ壨MatplotlibЧ
+            plt.rcParams['font.family'] = selected_font
+            # Seaborn壨Ҫã
+            sns.set(font=selected_font)
+            logger.info(f"ɹ: {selected_font}")
+        else:
+            logger.warning("δҵʵ壬ʹĬ")
+            # ǿû˷
+            plt.rcParams['font.family'] = ['sans-serif']
+            plt.rcParams['font.sans-serif'] = ['DejaVu Sans', 'Arial Unicode MS', 'sans-serif']
+        
+        plt.rcParams['axes.unicode_minus'] = False
+        logger.info("ʾ")
+    except Exception as e:
+        logger.error(f"ô: {str(e)}")
+        logger.error(traceback.format_exc())
+
+
+def load_plotting(backend=None):
+    """״εʱmatplotlib/seaborn"""
+    global plt, sns
+    if plt is not None:
+        return
+    import matplotlib as mpl
+    if backend:
+        mpl.use(backend)
+    import matplotlib.pyplot as _plt
+    import seaborn as _sns
+    plt, sns = _plt, _sns
+    configure_chinese_font(mpl)
+
+
+### 1. MySQLݿⲢȡ (ַֿ֧ȡ)
+@instrumented("connect")
+def connect_mysql(cursorclass=pymysql.cursors.DictCursor, max_retries=3, retry_delay=5):
+    """MySQLݿ⣬ʧʱ()"""
+    for attempt in range(max_retries):
+        try:
+            conn = pymysql.connect(
+                host='127.0.0.1',
+                port=3306,
+                user='root',
+                password='root',
+                database='dblab',
+                connect_timeout=30,
+                charset='utf8mb4',
+                cursorclass=cursorclass
+            )
+            logger.info("ݿӳɹ")
+            return conn
+        except pymysql.OperationalError as oe:
+            if attempt < max_retries - 1:
+                logger.warning(f"ݿʧ({str(oe)}){retry_delay}... ( {attempt+1}/{max_retries})")
+                time.sleep(retry_delay)
+            else:
+                raise Exception(f"ݿʧ: {str(oe)}")
+
+
+# ԭʼеĽڴͣMySQLоΪVARCHARʱͳһת
+COMPACT_SCHEMA = {
+    'id': 'int64',
+    'uid': 'int32',
+    'item_id': 'int64',
+    'behavior_type': 'int8',
+    'item_category': 'category',
+    'visit_date': 'datetime64',
+    'province': 'category',
+}
+
+
+def _compact_ints(series, dtype, factorize=False, defer=False):
+    """תΪָȵ
+
+    ȡֱֵת(Ρбȶ)factorize=Trueʱ
+    ֻ򳬳ΧиΪӻ롣ֵʱʹÿɿ͡
+    ӻֻͬһεһ£ֿȡʱdefer=True:
+    Ҫӻԭأϲͳһ롣
+    """
+    info = np.iinfo(dtype)
+    if pd.api.types.is_integer_dtype(series.dtype):
+        numeric = series
+    else:
+        numeric = pd.to_numeric(series, errors='coerce')
+    valid = numeric.notna()
+    in_range = bool(((numeric[valid] >= info.min) & (numeric[valid] <= info.max)).all())
+    fully_numeric = valid.sum() == series.notna().sum()
+
+    if factorize and not (fully_numeric and in_range):
+        if defer:
+            return series
+        codes, _ = pd.factorize(series)
+        numeric = pd.Series(codes, index=series.index).where(codes >= 0)
+        valid = numeric.notna()
+    elif not in_range:
+        raise ValueError(f" {series.name} ȡֵ {dtype} Χ")
+
+    if valid.all():
+        return numeric.astype(dtype)
+    return numeric.astype(dtype.capitalize())
+
+
+def apply_compact_schema(data, defer_factorize=False):
+    """COMPACT_SCHEMAѹУID/ΪΪʡ/ΪcategoricalΪdatetime64
+
+    defer_factorize=Trueѹ: ֻתֵIDУҪӻбԭ
+    ɺϲٴεͳһ(鵥ӻõ໥ͻı)
+    """
+    for col, kind in COMPACT_SCHEMA.items():
+        if col not in data.columns:
+            continue
+        series = data[col]
+        if kind == 'category':
+            if not isinstance(series.dtype, pd.CategoricalDtype):
+                data[col] = series.astype('category')
+        elif kind == 'datetime64':
+            if not pd.api.types.is_datetime64_any_dtype(series.dtype):
+                data[col] = pd.to_datetime(series, errors='coerce')
+        elif series.dtype != np.dtype(kind):
+            # Ϊ͵ЧȡֵΪգԤͳƲ޳
+            data[col] = _compact_ints(series, kind, factorize=(col != 'behavior_type'),
+                                      defer=defer_factorize)
+    return data
+
+
+class TypedColumnBuffer:
+    """Ԥ䡢ɰ豶ͻл
+
+    ֱд붨飬άֵֻд룬
+    дdatetime64[D]δ֪бΪobject
+    apply_compact_schemaһ: ޷Ϊ-1(תΪֵ)޷ڼΪNaT
+    factorize=TrueIDֻ򳬳Χȡֵʱֵ롣
+    """
+
+    def __init__(self, kind, capacity=1024, factorize=False):
+        self.kind = kind
+        self.size = 0
+        self.factorize = factorize
+        # (ΪֵID)ȡֵ -> 
+        self.lookup = None
+        if kind == 'category':
+            self.lookup = {}
+            dtype = np.int32
+        elif kind == 'datetime64':
+            dtype = 'datetime64[D]'
+        elif kind in ('int8', 'int32', 'int64'):
+            dtype = np.dtype(kind)
+        else:
+            dtype = object
+        self.array = np.empty(max(capacity, 1), dtype=dtype)
+
+    def _reserve(self, n):
+        if self.size + n > len(self.array):
+            new_capacity = max(len(self.array) * 2, self.size + n)
+            grown = np.empty(new_capacity, dtype=self.array.dtype)
+            grown[:self.size] = self.array[:self.size]
+            self.array = grown
+
+    def _convert(self, values):
+        n = len(values)
+        if self.kind == 'category':
+            lookup = self.lookup
+            return np.fromiter(
+                (-1 if v is None else lookup.setdefault(v, len(lookup)) for v in values),
+                dtype=np.int32, count=n)
+        if self.kind == 'datetime64':
+            try:
+                return np.array(values, dtype='datetime64[D]')
+            except (ValueError, TypeError):
+                # ޷ʱЧȡֵΪNaT
+                dates = pd.to_datetime(pd.Series(values, dtype=object), errors='coerce')
+                return dates.to_numpy().astype('datetime64[D]')
+        if self.array.dtype == object:
+            return values
+        if self.lookup is not None:
+            return self._encode(values)
+        # ֵΪ-1Ԥ׶ͳһ޳
+        try:
+            return np.fromiter((int(v) if v not in (None, '') else -1 for v in values),
+                               dtype=self.array.dtype, count=n)
+        except (ValueError, TypeError, OverflowError):
+            return self._convert_invalid(values)
+
+    def _convert_invalid(self, values):
+        """Чȡֵ: IDлΪֵ룬Ϊ-1"""
+        info = np.iinfo(self.array.dtype)
+        result = np.empty(len(values), dtype=self.array.dtype)
+        for i, v in enumerate(values):
+            try:
+                number = int(v)
+            except (ValueError, TypeError):
+                number = None
+            if number is None or not info.min <= number <= info.max:
+                if self.factorize and v not in (None, ''):
+                    self._fall_back_to_codes()
+                    return self._encode(values)
+                number = -1
+            result[i] = number
+        return result
+
+    def _fall_back_to_codes(self):
+        """ֵ룬дֵȡֵ±룻ֵα"""
+        lookup = self.lookup = {}
+        existing = self.array[:self.size]
+        self.array[:self.size] = np.fromiter(
+            (-1 if x == -1 else lookup.setdefault(int(x), len(lookup)) for x in existing),
+            dtype=self.array.dtype, count=self.size)
+
+    def _encode(self, values):
+        lookup = self.lookup
+        return np.fromiter(
+            (-1 if v in (None, '') else lookup.setdefault(_code_key(v), len(lookup)) for v in values),
+            dtype=self.array.dtype, count=len(values))
+
+    def extend(self, values):
+        """׷һȡֵfetchmanyһУ"""
+        n = len(values)
+        self._reserve(n)
+        self.array[self.size:self.size + n] = self._convert(values)
+        self.size += n
+
+    def to_series(self, name, start=0):
+        """[start:size]תΪpandasУ⸴ֵݣ"""
+        values = self.array[start:self.size]
+        if self.lookup is not None:
+            categories = list(self.lookup)
+            return pd.Series(pd.Categorical.from_codes(values, categories=categories), name=name)
+        if self.kind == 'datetime64':
+            return pd.Series(values.astype('datetime64[s]'), name=name)
+        if self.array.dtype != object:
+            invalid = values == -1
+            if invalid.any():
+                # _compact_intsһ£ֵ/Чֵʹÿɿ
+                return pd.Series(values, name=name).astype(self.kind.capitalize()).mask(invalid)
+        return pd.Series(values, name=name)
+
+
+def _code_key(value):
+    """ֵļ: ɽΪȡֵ鲢('42'42ΪͬһID)"""
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return value
+
+
+def _column_buffer(col, capacity):
+    """COMPACT_SCHEMAΪдΪΪֵ"""
+    return TypedColumnBuffer(COMPACT_SCHEMA.get(col, 'object'), capacity,
+                             factorize=(col != 'behavior_type'))
+
+
+def _typed_buffers(cursor, capacity):
+    """αĽдӦͻ"""
+    columns = [desc[0] for desc in cursor.description]
+    return columns, [_column_buffer(col, capacity) for col in columns]
+
+
+def fetch_typed_columns(cursor, batch_size=100000, capacity=None):
+    """ִвѯαfetchmanyȡֱдͻл
+
+    ڷα(SSCursor)صԪУΪÿйֵ䡣
+    capacityΪԤ(COUNT(*))һԤ仺
+    """
+    columns, buffers = _typed_buffers(cursor, capacity or batch_size)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for buf, values in zip(buffers, zip(*rows)):
+            buf.extend(values)
+    return pd.DataFrame({col: buf.to_series(col) for col, buf in zip(columns, buffers)})
+
+
+def iter_typed_chunks(cursor, chunk_size=100000, sizer=None):
+    """ͻDataFrameڸ֮䱣һ
+
+    sizer(AdaptiveChunkSizer)ʱÿ鰴sizer.sizeȡСʱ仯
+    """
+    columns, buffers = _typed_buffers(cursor, chunk_size)
+    while True:
+        rows = cursor.fetchmany(sizer.size if sizer is not None else chunk_size)
+        if not rows:
+            break
+        # ÿ鸴ͬһ黺ֵֻ
+        for buf, values in zip(buffers, zip(*rows)):
+            buf.size = 0
+            buf.extend(values)
+        yield pd.DataFrame({col: buf.to_series(col).copy() for col, buf in zip(columns, buffers)})
+
+
+@instrumented("fetch:aggregate_in_mysql")
+def aggregate_in_mysql(conn, fingerprint=None):
+    """MySQLԤۺϣֱӷͼľۺϽ
+
+    Ϊ(Ϊ, , , ʡ)ۼӣȥû
+    ۼӣMySQL˼HyperLogLogͼϲơܱ뵱ǰ
+    ָһʱֱӶȡܱɨԭʼ
+    """
+    start_time = time.time()
+    use_rollups = fingerprint is not None and rollups_are_fresh(conn, fingerprint)
+    if use_rollups:
+        logger.info("ܱݱһ£ֱӶȡܱ")
+        query = f"""
+    SELECT behavior_type, visit_date, item_category, province, total_actions
+    FROM {rollup_tables()['actions']}
+    """
+    else:
+        query = f"""
+    SELECT 
+        behavior_type,
+        visit_date,
+        item_category,
+        province,
+        COUNT(*) AS total_actions
+    FROM {TABLE}
+    GROUP BY behavior_type, visit_date, item_category, province
+    """
+    logger.info("ִоۺϲѯ...")
+    data = apply_compact_schema(pd.read_sql(query, conn))
+    processed = preprocess_data(data)
+    if processed is None or processed.empty:
+        logger.warning(": ۺϲѯؿս")
+        return None
+    
+    state = build_partial_aggregates(processed, with_retention=False, exact_distinct=False)
+    state['user_sketches'] = (fetch_user_sketches_from_rollups(conn) if use_rollups
+                              else fetch_user_sketches_from_mysql(conn))
+    aggregates = finalize_aggregates(state, with_retention=False)
+    logger.info(f"Ԥۺɣۺ: {len(processed):,}, ԭʼ: {state['row_count']:,}, "
+                f"ʱ: {time.time() - start_time:.2f}")
+    return aggregates
+
+
+### 1.1 ʽջ
+
+
+def table_status(conn):
+    """information_schemaȡݱĹʱʱ(ɨ)
+
+    InnoDBĹͳƣƫʮٷֵ㣬ֻڼع滮־
+    """
+    with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+        # MySQL 8Ĭϰinformation_schemaͳƻ24СʱỰرջԶȡǰֵ(5.7ûиñ)
+        with contextlib.suppress(pymysql.MySQLError):
+            cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+        cursor.execute("SELECT TABLE_ROWS AS row_count, CREATE_TIME AS created, UPDATE_TIME AS updated "
+                       f"FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = '{TABLE}'")
+        row = cursor.fetchone() or {}
+    return {
+        'row_count': int(row.get('row_count') or 0),
+        'created': None if row.get('created') is None else str(row['created']),
+        'updated': None if row.get('updated') is None else str(row['updated']),
+    }
+
+
+def get_table_fingerprint(conn, status=None):
+    """ݱָƣжϿܱǷȻЧ
+
+    ֻԪ˵㣬ɨ: ʱ(TRUNCATE/ؽʱ仯)ʱ
+    (κд仯MySQLΪNULLֱһд)Լidx_id_num
+    ȡid(׷дʱ仯ûиʱʡ)ͳϢָơ
+    """
+    status = status or table_status(conn)
+    max_id = None
+    if has_index(conn, PARTITION_INDEXES['id']):
+        with conn.cursor(pymysql.cursors.Cursor) as cursor:
+            cursor.execute(f"SELECT MAX({ID_KEY}) FROM {TABLE}")
+            max_id = cursor.fetchone()[0]
+    return {
+        'table': TABLE,
+        'created': status['created'],
+        'updated': status['updated'],
+        'max_id': None if max_id is None else int(max_id),
+    }
+
+
+@instrumented("snapshot:save")
+def save_snapshot(data, fingerprint, snapshot_dir=None):
+    """ݰбΪ.npyļԪ(ָơ͡ȡֵ)дsnapshot.json"""
+    start_time = time.time()
+    snapshot_dir = snapshot_dir or table_cache_dir()
+    os.makedirs(snapshot_dir, exist_ok=True)
+    meta_path = os.path.join(snapshot_dir, "snapshot.json")
+    # ɾԪļд;ʧʱɿռʧЧ
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    columns = []
+    for col in data.columns:
+        series = data[col]
+        path = os.path.join(snapshot_dir, f"{col}.npy")
+        column_meta = {'name': col, 'dtype': str(series.dtype)}
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            np.save(path, series.cat.codes.to_numpy())
+            column_meta['categories'] = series.cat.categories.tolist()
+        elif pd.api.types.is_extension_array_dtype(series.dtype):
+            # ɿ: ֱ𱣴ȡֵֵ
+            mask = series.isna().to_numpy()
+            np.save(path, series.to_numpy(dtype=series.dtype.numpy_dtype, na_value=0))
+            np.save(os.path.join(snapshot_dir, f"{col}.mask.npy"), mask)
+            column_meta['nullable'] = True
+        else:
+            np.save(path, series.to_numpy(), allow_pickle=(series.dtype == object))
+        columns.append(column_meta)
+
+    meta = {'fingerprint': fingerprint, 'rows': len(data), 'columns': columns,
+            'created_at': datetime.now().isoformat(timespec='seconds')}
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    logger.info(f"д뱾ؿ: {snapshot_dir}, : {len(data):,}, ʱ: {time.time() - start_time:.2f}")
+
+
+@instrumented("snapshot:load")
+def load_snapshot(fingerprint, snapshot_dir=None):
+    """ָһʱӱؿռݣ򷵻None"""
+    snapshot_dir = snapshot_dir or table_cache_dir()
+    meta_path = os.path.join(snapshot_dir, "snapshot.json")
+    if not os.path.exists(meta_path):
+        logger.info("δҵؿ")
+        return None
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('fingerprint') != fingerprint:
+            logger.info("ݱָѱ仯ؿʧЧ")
+            return None
+
+        start_time = time.time()
+        columns = {}
+        for column_meta in meta['columns']:
+            col = column_meta['name']
+            values = np.load(os.path.join(snapshot_dir, f"{col}.npy"),
+                             allow_pickle=(column_meta['dtype'] == 'object'))
+            if 'categories' in column_meta:
+                columns[col] = pd.Categorical.from_codes(values, categories=column_meta['categories'])
+            elif column_meta.get('nullable'):
+                mask = np.load(os.path.join(snapshot_dir, f"{col}.mask.npy"))
+                columns[col] = pd.arrays.IntegerArray(values, mask)
+            else:
+                columns[col] = values
+        data = pd.DataFrame(columns)
+        logger.info(f"Ѵӱؿռݣ: {len(data):,}, ʱ: {time.time() - start_time:.2f}")
+        return data
+    except Exception as e:
+        logger.warning(f"ȡؿʧ({str(e)})Ϊݿȡ")
+        return None
+
+
+@instrumented("fetch")
+def get_data_from_mysql(use_aggregated_query=False, chunk_size=100000, typed_fetch=False,
+                        use_cache=True, refresh_cache=False, workers=1, partition_by='id', range_size=500000,
+                        plan=None):
+    """MySQLȡûΪݣַֿ֧ȡԤۺ
+
+    ǷԤۺϡǷֿȡɼع滮(plan_load)ݿڴʵÿ
+    ֽδplanʱڴ˴ɡ滮ΪstreamʱͬԤۺϣ
+    ֤ڴ氲ȫ(ʽģʽmainֱӵ)
+    typed_fetch=Trueʱʹ÷αȡԪУֱдͻл
+    workers>1ʱpartition_byѱзΪΧɶ߳̾ӳزжȡ
+    use_cache=Trueʱָδ仯ֱӼرؿգrefresh_cache=True
+    ʱпգ¶ȡǡ
+    """
+    logger.info("ݿⲢȡ...")
+    
+    # ¼ڴʹ (ϵͳusedڹû)
+    start_mem = psutil.Process().memory_info().rss / (1024 ** 2)  # MB
+    
+    conn = None
+    
+    try:
+        conn = connect_mysql()
+        
+        # Ƿ
+        with conn.cursor() as cursor:
+            cursor.execute(f"SHOW TABLES LIKE '{TABLE}'")
+            if not cursor.fetchone():
+                logger.error(f": ݿûΪ '{TABLE}' ı")
+                return None
+        
+        # ݹģڴѡѯʽ
+        status = table_status(conn)
+        total_rows = status['row_count']
+        logger.info(f"ݱ: {total_rows:,}")
+        if plan is None:
+            plan = plan_load(total_rows, *sample_bytes_per_row(conn))
+            log_load_plan(plan)
+        aggregated = use_aggregated_query or plan['strategy'] in ('stream', 'aggregate')
+        # ֻбؿܱҪָƣ߶òʱȡ
+        fingerprint = get_table_fingerprint(conn, status) if use_cache or aggregated else None
+        
+        # δ仯ʱֱʹñؿ
+        if use_cache and not refresh_cache and not aggregated:
+            data = load_snapshot(fingerprint)
+            if data is not None and not data.empty:
+                return data
+        
+        with conn.cursor() as cursor:
+            # ݼʹԤۺϲѯֱӷؾۺϽ
+            if aggregated:
+                logger.info("⵽ݼʹԤۺϲѯ...")
+                return aggregate_in_mysql(conn, fingerprint)
+            else:
+                logger.info("ʹݲѯ...")
+                query = f"SELECT * FROM {TABLE}"
+                
+                if workers > 1:
+                    # Χз֣Ӳжȡ
+                    data = parallel_read_mysql(workers=workers, partition_by=partition_by,
+                                               range_size=range_size, batch_size=chunk_size, conn=conn)
+                elif typed_fetch:
+                    # α + ԪУֱдͻ
+                    logger.info(f"ʹ÷αͻȡ(batch_size={chunk_size})")
+                    with conn.cursor(pymysql.cursors.SSCursor) as ss_cursor:
+                        ss_cursor.execute(query)
+                        data = fetch_typed_columns(ss_cursor, batch_size=chunk_size, capacity=total_rows)
+                # ݼֿȡ
+                elif plan['strategy'] == 'chunked':
+                    logger.info(f"ԭʼ֡ڴԤ({total_rows:,})÷ֿȡ(chunk_size={chunk_size})")
+                    chunks = []
+                    rows_read = 0
+                    for i, chunk in enumerate(pd.read_sql(query, conn, chunksize=chunk_size)):
+                        # ѹַͣʽפڴ棻ӻϲ֮
+                        chunks.append(apply_compact_schema(chunk, defer_factorize=True))
+                        rows_read += len(chunk)
+                        logger.info(f"Ѷȡ #{i+1}, ۼ: {rows_read:,}")
+                    data = pd.concat(chunks, ignore_index=True)
+                else:
+                    data = pd.read_sql(query, conn)
+                
+                # ķȡֵͬϲͳһΪcategoricalԷIDͳһӻ
+                data = apply_compact_schema(data)
+        
+        # ǷΪ
+        if data.empty:
+            logger.warning(": ݿѯؿս")
+            return None
+        
+        # д뱾ؿգ´ֱӼ
+        if use_cache and not aggregated:
+            try:
+                save_snapshot(data, fingerprint)
+            except Exception as e:
+                logger.warning(f"д뱾ؿʧ: {str(e)}")
+        
+        # ڴʹñ
+        end_mem = psutil.Process().memory_info().rss / (1024 ** 2)
+        frame_mem = data.memory_usage(deep=True).sum() / (1024 ** 2)
+        logger.info(f"ɹȡݣ: {len(data):,}, ڴ: {end_mem - start_mem:.2f} MB, ռ: {frame_mem:.2f} MB")
+        return data
+    
+    except pymysql.OperationalError as oe:
+        logger.error(f"ݿӴ: {str(oe)}")
+        logger.error(": 1. MySQLǷ 2. ݿǷȷ")
+        return None
+    
+    except Exception as e:
+        logger.error(f"ݿ: {str(e)}")
+        logger.error(traceback.format_exc())
+        return None
+    
+    finally:
+        if conn:
+            conn.close()
+            logger.info("ݿѹر")
+
+
+def fold_query_into_state(conn, query, params=None, state=None, chunk_size=100000, with_retention=True,
+                          exact_distinct=False, user_index=None, adaptive=False):
+    """ִвѯѽ۵־ۺ״̬ԭʼ
+
+    (ۺ״̬, ȡ, ζȡݵˮλ)ˮλ߼¼id
+    ԼڵķΧˢʹáĬHyperLogLogͼͳȥû
+    ʹ״̬Сûuser_index=(uidֵ, λͼ)ʱ
+    ÿͬʱдλͼadaptive=TrueʱʵڴС
+    """
+    rows_read = 0
+    sizer = AdaptiveChunkSizer(chunk_size) if adaptive else None
+    watermark = {'id': None, 'min_visit_date': None, 'max_visit_date': None}
+    cursor = conn.cursor()
+    try:
+        if params is None:
+            cursor.execute(query)
+        else:
+            cursor.execute(query, params)
+        chunk_start = time.time()
+        for i, chunk in enumerate(iter_typed_chunks(cursor, chunk_size=chunk_size, sizer=sizer)):
+            chunk_rows = len(chunk)
+            rows_read += chunk_rows
+            if 'id' in chunk.columns and pd.api.types.is_numeric_dtype(chunk['id'].dtype) \
+                    and chunk['id'].notna().any():
+                chunk_max = int(chunk['id'].max())
+                watermark['id'] = chunk_max if watermark['id'] is None else max(watermark['id'], chunk_max)
+            if 'visit_date' in chunk.columns and chunk['visit_date'].notna().any():
+                lo = chunk['visit_date'].min().strftime('%Y-%m-%d')
+                hi = chunk['visit_date'].max().strftime('%Y-%m-%d')
+                watermark['min_visit_date'] = min(filter(None, [watermark['min_visit_date'], lo]))
+                watermark['max_visit_date'] = max(filter(None, [watermark['max_visit_date'], hi]))
+            
+            processed = preprocess_data(chunk)
+            if processed is not None and not processed.empty:
+                partial = build_partial_aggregates(processed, with_retention=with_retention,
+                                                   exact_distinct=exact_distinct)
+                state = merge_partial_aggregates(state, partial)
+                if user_index is not None:
+                    update_user_index(processed, user_index[1], user_index[0])
+            del chunk, processed
+            
+            rss_bytes = psutil.Process().memory_info().rss
+            logger.info(f"Ѵ #{i+1}, ۼ: {rows_read:,}, ڴ: {rss_bytes / (1024 ** 2):.2f} MB")
+            if sizer is not None:
+                sizer.observe(chunk_rows, time.time() - chunk_start, rss_bytes)
+            chunk_start = time.time()
+    finally:
+        cursor.close()
+    return state, rows_read, watermark
+
+
+@instrumented("fetch+aggregate:stream")
+def stream_aggregates_from_mysql(chunk_size=100000, with_retention=True, user_index=None, adaptive=False):
+    """ʽȡMySQLݣÿ۵ɺϲĲ־ۺϺ
+
+    ʹ÷αȡֵڴȡchunk_sizeۺ״̬С
+    ޹ءfinalize_aggregatesɵľۺϽ
+    """
+    logger.info(f"ʽģʽȡ(chunk_size={chunk_size})...")
+    start_time = time.time()
+    conn = None
+    
+    try:
+        # α(SSCursor)ȡͻ˻
+        conn = connect_mysql(cursorclass=pymysql.cursors.SSCursor)
+        
+        with conn.cursor() as cursor:
+            cursor.execute(f"SHOW TABLES LIKE '{TABLE}'")
+            if not cursor.fetchone():
+                logger.error(f": ݿûΪ '{TABLE}' ı")
+                return None
+        
+        state, rows_read, _ = fold_query_into_state(
+            conn, f"SELECT * FROM {TABLE}",
+            chunk_size=chunk_size, with_retention=with_retention, user_index=user_index, adaptive=adaptive)
+        
+        if state is None:
+            logger.warning(": ݿѯؿս")
+            return None
+        
+        aggregates = finalize_aggregates(state, with_retention=with_retention)
+        elapsed = time.time() - start_time
+        logger.info(f"ʽۺɣ: {rows_read:,}, ʱ: {elapsed:.2f}")
+        return aggregates
+    
+    except pymysql.OperationalError as oe:
+        logger.error(f"ݿӴ: {str(oe)}")
+        logger.error(": 1. MySQLǷ 2. ݿǷȷ")
+        return None
+    
+    except Exception as e:
+        logger.error(f"ʽۺϹз: {str(e)}")
+        logger.error(traceback.format_exc())
+        return None
+    
+    finally:
+        if conn:
+            conn.close()
+            logger.info("ݿѹر")
+
+
+### 1.2 ˢ (idˮλֻȡУϲ־ûۺ״̬)
+def aggregate_state_path():
+    return os.path.join(table_cache_dir(), "aggregate_state.pkl")
+
+
+def load_aggregate_state(path=None):
+    """ȡϴбľۺ״̬ˮλߣڻʱNone"""
+    path = path or aggregate_state_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        return pd.read_pickle(path)
+    except Exception as e:
+        logger.warning(f"ȡۺ״̬ʧ({str(e)})ȫ")
+        return None
+
+
+def save_aggregate_state(saved, path=None):
+    """ԭӵرۺ״̬(дʱļ滻)"""
+    path = path or aggregate_state_path()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    pd.to_pickle(saved, tmp_path)
+    os.replace(tmp_path, path)
+
+
+@instrumented("fetch+aggregate:incremental")
+def incremental_aggregates_from_mysql(chunk_size=100000, rebuild=False, user_index=None, adaptive=False):
+    """ˢ£ֻȡidϴˮλߵУϲ־ûľۺ״̬
+
+    ۺ״̬ÿȥûԼ(û, )ϡ
+    ˮλжidx_id_num(migrate.sh)ȡ: idֻĩˣ
+    һΧɨ裬ÿˢµĶȡۺϹֻȣ
+    ûиʱÿˢ¶Ҫɨȫؽ(ʱ仯)idʱ
+    ԶΪȫ㡣Ϊ־ֻ׷д룬޸ĻɾѴ--refreshؽ
+    """
+    logger.info("ģʽˢ¾ۺϽ...")
+    start_time = time.time()
+    conn = None
+    
+    try:
+        conn = connect_mysql(cursorclass=pymysql.cursors.SSCursor)
+        
+        with conn.cursor() as cursor:
+            cursor.execute(f"SHOW TABLES LIKE '{TABLE}'")
+            if not cursor.fetchone():
+                logger.error(f": ݿûΪ '{TABLE}' ı")
+                return None
+        
+        if not has_index(conn, PARTITION_INDEXES['id']):
+            logger.warning(f"{TABLE} û {PARTITION_INDEXES['id']}ȡҪɨȫ"
+                           "(migrate.sh)")
+        fingerprint = get_table_fingerprint(conn)
+        max_id = fingerprint['max_id']
+        
+        saved = None if rebuild else load_aggregate_state()
+        if saved is not None:
+            last = saved['watermark']
+            if saved.get('created') != fingerprint['created']:
+                logger.warning("ݱѱؽˮλʧЧΪȫ")
+                saved = None
+            elif max_id is not None and max_id < last['id']:
+                logger.warning("ݱidˣˮλʧЧΪȫ")
+                saved = None
+            elif user_index is not None and not saved.get('user_index'):
+                logger.warning("ۺ״̬δͬάλͼΪȫ")
+                saved = None
+            elif user_index is not None and load_user_index_meta().get('watermark') != last:
+                logger.warning("λͼȱʧۺ״̬ˮλ߲һ£Ϊȫ")
+                saved = None
+        if saved is None and user_index is not None:
+            user_index[1].clear()
+        
+        if saved is None:
+            state, rows_before, last_id, last_date = None, 0, -1, None
+        else:
+            state, rows_before = saved['state'], saved['rows']
+            last_id, last_date = saved['watermark']['id'], saved['watermark']['max_visit_date']
+            logger.info(f"ϴˮλ: id={last_id}, visit_date={last_date}, Ѵ: {rows_before:,}")
+        
+        state, rows_read, watermark = fold_query_into_state(
+            conn, f"SELECT * FROM {TABLE} WHERE {ID_KEY} > %s",
+            params=(last_id,), state=state, chunk_size=chunk_size, user_index=user_index, adaptive=adaptive)
+        logger.info(f": {rows_read:,}")
+        
+        if last_date and watermark['min_visit_date'] and watermark['min_visit_date'] < last_date:
+            logger.warning(f"ݰϴˮλߵķ({watermark['min_visit_date']})һϲ")
+        
+        if state is None:
+            logger.warning(": ݿѯؿս")
+            return None
+        
+        # finalizeѹ״̬еȥؼ󱣴湩´ʹ
+        aggregates = finalize_aggregates(state)
+        new_watermark = {
+            'id': last_id if watermark['id'] is None else max(last_id, watermark['id']),
+            'max_visit_date': max(filter(None, [last_date, watermark['max_visit_date']]), default=None),
+        }
+        if user_index is not None:
+            # λͼۺ״̬¼ͬһˮλߣ´ξݴжǷͬ
+            save_user_index(*user_index, fingerprint=fingerprint, watermark=new_watermark)
+        save_aggregate_state({
+            'watermark': new_watermark,
+            'rows': rows_before + rows_read,
+            'created': fingerprint['created'],
+            'state': state,
+            'user_index': user_index is not None,
+        })
+        
+        elapsed = time.time() - start_time
+        logger.info(f"ˢɣۼ: {rows_before + rows_read:,}, ʱ: {elapsed:.2f}")
+        return aggregates
+    
+    except pymysql.OperationalError as oe:
+        logger.error(f"ݿӴ: {str(oe)}")
+        logger.error(": 1. MySQLǷ 2. ݿǷȷ")
+        return None
+    
+    except Exception as e:
+        logger.error(f"ˢ¹з: {str(e)}")
+        logger.error(traceback.format_exc())
+        return None
+    
+    finally:
+        if conn:
+            conn.close()
+            logger.info("ݿѹر")
+
+
+### 1.3 SQLۺƹ滮 (ͼۺϣϲΪٵGROUP BYѯ)
+# ά -> SQLʽ
+PUSHDOWN_DIMENSIONS = {
+    'behavior_type': 'behavior_type',
+    'item_category': 'item_category',
+    'province': 'province',
+    'month': 'MONTH(visit_date)',
+    'day': 'DAY(visit_date)',
+}
+
+#  -> (SQLʽ, Ƿɼ)ɼӶɸϸȵĽٻܵõ
+PUSHDOWN_MEASURES = {
+    'actions': ('COUNT(*)', True),
+    'users': ('COUNT(DISTINCT uid)', False),
+}
+
+# ͼľۺ: άȡֵԼǷֵ
+CHART_AGGREGATE_SPECS = {
+    'behavior_counts': {'dims': ('behavior_type',), 'measure': 'actions'},
+    'category_purchases': {'dims': ('item_category',), 'measure': 'actions',
+                           'filters': {'behavior_type': 4}, 'sort': True},
+    'month_behavior': {'dims': ('month', 'behavior_type'), 'measure': 'actions'},
+    'province_purchases': {'dims': ('province',), 'measure': 'actions',
+                           'filters': {'behavior_type': 4}, 'sort': True},
+    'daily_users': {'dims': ('day', 'behavior_type'), 'measure': 'users'},
+    'category_behavior': {'dims': ('item_category', 'behavior_type'), 'measure': 'actions'},
+}
+
+# ޷GROUP BYķΪֻȡеԭʼ
+RAW_FALLBACK_QUERIES = {
+    'retention': "SELECT DISTINCT uid, visit_date FROM {table} WHERE {where}",
+    'ordered_funnel': "SELECT uid, visit_date, behavior_type{extra} FROM {table} WHERE {where}",
+}
+
+# preprocess_dataһ: ؼΪյвͳ
+PUSHDOWN_BASE_FILTER = " AND ".join(f"{col} IS NOT NULL" for col in
+                                    ('uid', 'behavior_type', 'visit_date', 'item_category', 'province'))
+
+
+def plan_pushdown_queries(specs):
+    """ѾۺϲΪٵGROUP BYѯ
+
+    ɼӶĵֵвάȣ벻˵Թ
+    һѯάȼϱһѯֱɸòѯܵõɼӶ
+    (ȥû)ֻάȺ͹ȫͬĲѯش
+    (ѯб,  -> ѯ)ѯΪ{'dims', 'measure', 'filters'}
+    """
+    queries, assignment = [], {}
+
+    def needed_dims(spec):
+        dims = tuple(spec['dims'])
+        if PUSHDOWN_MEASURES[spec['measure']][1]:
+            dims += tuple(c for c in sorted(spec.get('filters', {})) if c not in dims)
+        return dims
+
+    # άȶȽѯάٵ
+    for name, spec in sorted(specs.items(), key=lambda kv: -len(needed_dims(kv[1]))):
+        dims = needed_dims(spec)
+        additive = PUSHDOWN_MEASURES[spec['measure']][1]
+        for i, query in enumerate(queries):
+            if query['measure'] != spec['measure']:
+                continue
+            if additive and set(dims) <= set(query['dims']):
+                assignment[name] = i
+                break
+            if not additive and set(dims) == set(query['dims']) and query['filters'] == spec.get('filters', {}):
+                assignment[name] = i
+                break
+        else:
+            queries.append({'dims': dims, 'measure': spec['measure'],
+                            'filters': {} if additive else dict(spec.get('filters', {}))})
+            assignment[name] = len(queries) - 1
+    return queries, assignment
+
+
+def build_pushdown_sql(query, use_rollups=False):
+    """ɵGROUP BYѯSQL (ֵΪ)
+
+    use_rollups=TrueʱɼӶΪԻܱtotal_actions͡
+    """
+    select = [d if PUSHDOWN_DIMENSIONS[d] == d else f"{PUSHDOWN_DIMENSIONS[d]} AS {d}" for d in query['dims']]
+    if use_rollups and PUSHDOWN_MEASURES[query['measure']][1]:
+        table, base_filter = rollup_tables()['actions'], []
+        select.append("SUM(total_actions) AS value")
+    else:
+        table, base_filter = TABLE, [PUSHDOWN_BASE_FILTER]
+        select.append(f"{PUSHDOWN_MEASURES[query['measure']][0]} AS value")
+    where = base_filter + [f"{PUSHDOWN_DIMENSIONS[c]} = {int(v)}" for c, v in query['filters'].items()]
+    where = where or ["1 = 1"]
+    group_by = ", ".join(PUSHDOWN_DIMENSIONS[d] for d in query['dims'])
+    return f"SELECT {', '.join(select)} FROM {table} WHERE {' AND '.join(where)} GROUP BY {group_by}"
+
+
+def _shape_pushdown_result(result, spec):
+    """Ӳѯܳıʽfinalize_aggregatesһ"""
+    for col, value in spec.get('filters', {}).items():
+        if col in result.columns and col not in spec['dims']:
+            result = result[result[col] == value]
+    dims = list(spec['dims'])
+    values = result.groupby(dims, observed=True)['value'].sum().astype(np.int64)
+    # ΪͳһΪbehavior_type_num
+    values = values.rename_axis(['behavior_type_num' if d == 'behavior_type' else d for d in dims])
+    if len(dims) == 2:
+        table = values.unstack(fill_value=0).sort_index().sort_index(axis=1)
+        table.columns.name = None
+        return table
+    if spec.get('sort'):
+        return values[values > 0].sort_values(ascending=False)
+    return values.sort_index()
+
+
+def _normalize_pushdown_frame(frame):
+    """ѯ͹: Ϊ//Ϊint8ʡΪcategory"""
+    for col in ('behavior_type', 'month', 'day'):
+        if col in frame.columns:
+            frame[col] = pd.to_numeric(frame[col], errors='coerce')
+    frame = frame.dropna(subset=[c for c in ('behavior_type', 'month', 'day') if c in frame.columns])
+    for col in ('behavior_type', 'month', 'day'):
+        if col in frame.columns:
+            frame[col] = frame[col].astype(np.int8)
+    for col in ('item_category', 'province'):
+        if col in frame.columns:
+            frame[col] = frame[col].astype('category')
+    return frame
+
+
+@instrumented("fetch+aggregate:pushdown")
+def pushdown_aggregates_from_mysql(specs=None, funnel_window=7, funnel_by=None, with_retention=False,
+                                   with_funnel=False, conn=None):
+    """ۺMySQLGROUP BYֻѾۺϺдPython
+
+    ©޷GROUP BYֻܻΪȡ(û, )ȥ
+    ļԭʼУصӽԼΪƵһ룬Ĭ
+    㣬with_retention/with_funnelʽ(--user-indexλͼ)
+    compute_aggregatesʽһµľۺϽ
+    """
+    specs = CHART_AGGREGATE_SPECS if specs is None else specs
+    logger.info("Ծۺģʽȡ...")
+    start_time = time.time()
+    own_conn = conn is None
+    
+    try:
+        if own_conn:
+            conn = connect_mysql()
+        
+        queries, assignment = plan_pushdown_queries(specs)
+        logger.info(f"{len(specs)} ۺϲΪ {len(queries)} GROUP BYѯ")
+        
+        # ܱݱһʱΪѯĶܱ
+        use_rollups = rollups_are_fresh(conn, get_table_fingerprint(conn))
+        if use_rollups:
+            logger.info("ܱݱһ£ɼӶΪȡܱ")
+        
+        results = []
+        for query in queries:
+            sql = build_pushdown_sql(query, use_rollups=use_rollups)
+            query_start = time.time()
+            frame = _normalize_pushdown_frame(pd.read_sql(sql, conn))
+            logger.info(f"Ʋѯ {len(frame):,} , ʱ: {time.time() - query_start:.2f}: {sql}")
+            results.append(frame)
+        
+        aggregates = {name: _shape_pushdown_result(results[assignment[name]], spec)
+                      for name, spec in specs.items()}
+        aggregates['row_count'] = int(aggregates['behavior_counts'].sum()) if 'behavior_counts' in aggregates else None
+        aggregates.setdefault('distinct_users_approx', False)
+        aggregates['retention_rates'], aggregates['retention_users'] = None, 0
+        aggregates['ordered_funnel'] = None
+        
+        if not (with_retention and with_funnel):
+            logger.info("/©˶ȡӽԭʼУδĲ"
+                        "(--pushdown-retention/--pushdown-funnel)")
+        
+        # ԭʼл: 
+        if with_retention:
+            sql = RAW_FALLBACK_QUERIES['retention'].format(table=TABLE, where=PUSHDOWN_BASE_FILTER)
+            user_days = pd.read_sql(sql, conn)
+            logger.info(f"˲ѯ {len(user_days):,} (û, )")
+            user_days['visit_date'] = pd.to_datetime(user_days['visit_date'], errors='coerce')
+            aggregates['retention_rates'], aggregates['retention_users'] = \
+                compute_user_retention(user_days.dropna())
+        
+        # ԭʼл: ©ֻȡҪ
+        if with_funnel:
+            extra = f", {funnel_by}" if funnel_by else ""
+            sql = RAW_FALLBACK_QUERIES['ordered_funnel'].format(
+                table=TABLE, extra=extra, where=PUSHDOWN_BASE_FILTER + " AND behavior_type IN (1, 2, 3, 4)")
+            events = _normalize_pushdown_frame(pd.read_sql(sql, conn)).rename(
+                columns={'behavior_type': 'behavior_type_num'})
+            events['visit_date'] = pd.to_datetime(events['visit_date'], errors='coerce')
+            logger.info(f"©˲ѯ {len(events):,} ")
+            aggregates['ordered_funnel'] = compute_ordered_funnel(events, window_days=funnel_window, by=funnel_by)
+        
+        elapsed = time.time() - start_time
+        logger.info(f"ۺɣʱ: {elapsed:.2f}")
+        return aggregates
+    
+    except pymysql.OperationalError as oe:
+        logger.error(f"ݿӴ: {str(oe)}")
+        logger.error(": 1. MySQLǷ 2. ݿǷȷ")
+        return None
+    
+    except Exception as e:
+        logger.error(f"ۺƹз: {str(e)}")
+        logger.error(traceback.format_exc())
+        return None
+    
+    finally:
+        if own_conn and conn:
+            conn.close()
+            logger.info("ݿѹر")
+
+
+### 1.4 ΧĲжȡ (нӳ + ߳)
+class MySQLConnectionPool:
+    """нMySQLӳأӰ贴size
+
+    ߳ͨconnection()ӣ黹У߳
+    ӺľʱȴӶݿ˵Ĳ
+    """
+
+    def __init__(self, size, cursorclass=pymysql.cursors.SSCursor):
+        self.size = size
+        self.cursorclass = cursorclass
+        self._idle = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._all = []
+
+    @contextlib.contextmanager
+    def connection(self):
+        conn = None
+        with self._lock:
+            if self._idle.empty() and self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        try:
+            if create:
+                conn = connect_mysql(cursorclass=self.cursorclass)
+                with self._lock:
+                    self._all.append(conn)
+            else:
+                conn = self._idle.get()
+            yield conn
+        finally:
+            if conn is not None:
+                self._idle.put(conn)
+            elif create:
+                with self._lock:
+                    self._created -= 1
+
+    def close(self):
+        for conn in self._all:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._all.clear()
+
+
+# idΪVARCHARֵͳһøñʽmigrate.shĺidx_id_numıʽȫһ
+ID_KEY = "CAST(id AS UNSIGNED)"
+# Ӧ(migrate.sh)
+PARTITION_INDEXES = {'id': 'idx_id_num', 'visit_date': 'idx_visit_date'}
+
+
+def has_index(conn, index_name):
+    """ݱǷָƵ"""
+    with conn.cursor(pymysql.cursors.Cursor) as cursor:
+        cursor.execute(f"SHOW INDEX FROM {TABLE} WHERE Key_name = %s", (index_name,))
+        return cursor.fetchone() is not None
+
+
+def plan_read_ranges(conn, partition_by='id', range_size=500000, workers=1):
+    """ݱзΪȡΧ[(WHEREν, , )]
+
+    ʱз: idзʱÿΧrange_sizeidvisit_date
+    зʱÿΧrange_size죬νΪҿļΧÿΧһ
+    Χɨ裬ֻȡеУзΧϼƶȡȫһΡ
+    ûʱΧÿΧɨȫʱΪCRC32(id)
+    ϣзΪǡworkers: ÿɨһȫworkersΣ
+    ִУҳڻй
+    """
+    if not has_index(conn, PARTITION_INDEXES[partition_by]):
+        n = max(int(workers), 1)
+        logger.warning(f"{TABLE} û {PARTITION_INDEXES[partition_by]}ΧȡʹÿΧ"
+                       f"ɨȫΪCRC32(id)ϣзΪ {n} (ÿɨһȫ)")
+        return [("CRC32(id) %% %s = %s", (n, k), f"CRC32(id) % {n} = {k}") for k in range(n)]
+    
+    key = 'visit_date' if partition_by == 'visit_date' else ID_KEY
+    with conn.cursor(pymysql.cursors.Cursor) as cursor:
+        # MINMAXֿѯ߶ֻȡһ
+        cursor.execute(f"SELECT (SELECT MIN({key}) FROM {TABLE}), (SELECT MAX({key}) FROM {TABLE})")
+        lo, hi = cursor.fetchone()
+    if lo is None:
+        return []
+    if partition_by == 'visit_date':
+        lo, hi = pd.Timestamp(lo).normalize(), pd.Timestamp(hi).normalize()
+        step = pd.Timedelta(days=max(int(range_size), 1))
+        ranges, start = [], lo
+        while start <= hi:
+            end = start + step
+            ranges.append(("visit_date >= %s AND visit_date < %s",
+                           (start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')),
+                           f"visit_date [{start.date()}, {end.date()})"))
+            start = end
+        return ranges
+    
+    lo, hi, step = int(lo), int(hi), max(int(range_size), 1)
+    return [(f"{ID_KEY} >= %s AND {ID_KEY} < %s", (start, start + step),
+             f"id [{start}, {start + step})") for start in range(lo, hi + 1, step)]
+
+
+def _read_range(pool, predicate, params, batch_size):
+    """߳: ӣ÷αȡһΧΪͻ"""
+    start_time = time.time()
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT * FROM {TABLE} WHERE {predicate}", params)
+            frame = fetch_typed_columns(cursor, batch_size=batch_size)
+    return frame, time.time() - start_time, threading.current_thread().name
+
+
+def concat_typed_frames(frames):
+    """ƴӸΧͻÿֻһ
+
+    ΧķʹøԵֵ䣬union_categoricalsͳһΪȫֵ䣬
+    pd.concatڷ಻һʱ˻ΪobjectСַΧIDлΪֵʱ
+    аobjectƴӣapply_compact_schemaͳһӻ
+    """
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame()
+    columns = {}
+    for col in frames[0].columns:
+        parts = [f[col] for f in frames]
+        categorical = [isinstance(p.dtype, pd.CategoricalDtype) for p in parts]
+        if all(categorical) and len({p.cat.categories.dtype for p in parts}) == 1:
+            columns[col] = pd.Series(pd.api.types.union_categoricals(parts), name=col)
+        elif any(categorical):
+            columns[col] = pd.Series(np.concatenate([p.astype(object).to_numpy() for p in parts]), name=col)
+        else:
+            columns[col] = pd.Series(np.concatenate([p.to_numpy() for p in parts]), name=col)
+    return pd.DataFrame(columns)
+
+
+@instrumented("fetch:parallel_read")
+def parallel_read_mysql(workers=4, partition_by='id', range_size=500000, batch_size=100000, conn=None):
+    """ѱзΪȡΧ(ʱΪΧΪworkersϣplan_read_ranges)
+    нӳɶ̲߳ȡƴ
+
+    ÿΧȡɺ¼£ʱ̻߳ܡ
+    pymysqlнGILƣҪݿɨ紫ĲС
+    """
+    start_time = time.time()
+    pool = MySQLConnectionPool(workers)
+    try:
+        if conn is None:
+            with pool.connection() as planning_conn:
+                ranges = plan_read_ranges(planning_conn, partition_by, range_size, workers)
+        else:
+            ranges = plan_read_ranges(conn, partition_by, range_size, workers)
+        logger.info(f" {partition_by} зΪ {len(ranges)} Χʹ {workers} ̲߳жȡ")
+        
+        frames = [None] * len(ranges)
+        worker_stats = {}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mysql-reader') as executor:
+            futures = {executor.submit(_read_range, pool, predicate, params, batch_size): (i, label)
+                       for i, (predicate, params, label) in enumerate(ranges)}
+            for future in as_completed(futures):
+                i, label = futures[future]
+                frame, elapsed, worker = future.result()
+                frames[i] = frame
+                rows, seconds = worker_stats.get(worker, (0, 0.0))
+                worker_stats[worker] = (rows + len(frame), seconds + elapsed)
+                logger.info(f"[{worker}] {label}: {len(frame):,} , ʱ {elapsed:.2f}, "
+                            f"{len(frame) / max(elapsed, 1e-9):,.0f} /")
+        
+        for worker, (rows, seconds) in sorted(worker_stats.items()):
+            logger.info(f"߳ {worker}:  {rows:,} , ȡʱ {seconds:.2f}, "
+                        f"ƽ {rows / max(seconds, 1e-9):,.0f} /")
+        
+        data = concat_typed_frames(frames)
+        elapsed = time.time() - start_time
+        logger.info(f"жȡɣ: {len(data):,}, ʱ: {elapsed:.2f}, "
+                    f" {len(data) / max(elapsed, 1e-9):,.0f} /")
+        return data
+    finally:
+        pool.close()
+
+
+### 1.5 MySQLܱ (mysql-rollup.pyڷά)
+# ܱݱ֣Ϊ rollup_<ݱ>_<׺>
+ROLLUP_SUFFIXES = {
+    'actions': 'daily_actions',              #  x Ϊ x  x ʡ Ϊ
+    'date_behavior': 'user_sketch_daily',    #  x Ϊ ȥûͼĴ
+    'province': 'user_sketch_province',      #  x ʡ ȥûͼĴ
+    'partitions': 'partitions',              # ÿڷǩ
+    'meta': 'meta',                          # ʱݱָ
+}
+
+
+def rollup_tables():
+    """ǰݱӦĸܱ"""
+    return {key: f"rollup_{TABLE}_{suffix}" for key, suffix in ROLLUP_SUFFIXES.items()}
+
+
+def rollups_are_fresh(conn, fingerprint):
+    """ܱҼ¼ݱָ뵱ǰһʱTrue"""
+    try:
+        with conn.cursor(pymysql.cursors.Cursor) as cursor:
+            cursor.execute(f"SHOW TABLES LIKE '{rollup_tables()['meta']}'")
+            if not cursor.fetchone():
+                return False
+            cursor.execute(f"SELECT meta_value FROM {rollup_tables()['meta']} WHERE meta_key = 'fingerprint'")
+            row = cursor.fetchone()
+    except Exception as e:
+        logger.warning(f"ȡܱ״̬ʧ: {str(e)}")
+        return False
+    if not row:
+        return False
+    stored = json.loads(row[0])
+    fresh = stored == fingerprint
+    if not fresh:
+        logger.info("ܱѹڣ mysql-rollup.py ˢ")
+    return fresh
+
+
+### 1.6 ڴ֪ļع滮 (ڴ桢ʵÿֽCPUѡ)
+# ԵڴŴϵ: ԭʼַȡͬʱԭʼ֡ѹ֡
+# ѹ֡ϵԤۺԼʱ
+RAW_LOAD_FACTOR = 2.0
+COMPACT_WORK_FACTOR = 3.0
+# ʽ״̬ÿ(û, )ϵֽϽ
+USER_DAY_BYTES = 16
+
+
+def sample_bytes_per_row(conn, sample_rows=20000):
+    """ȡУʵԭʼ֡ѹ֡ÿֽ(ԭʼ, ѹ)"""
+    query = f"SELECT * FROM {TABLE} LIMIT {int(sample_rows)}"
+    sample = pd.read_sql(query, conn)
+    if sample.empty:
+        return 0.0, 0.0
+    raw_bytes = sample.memory_usage(deep=True).sum() / len(sample)
+    compact_bytes = apply_compact_schema(sample).memory_usage(deep=True).sum() / len(sample)
+    return float(raw_bytes), float(compact_bytes)
+
+
+def plan_load(total_rows, raw_bytes_per_row, compact_bytes_per_row, available_bytes=None, cpu_count=None,
+              memory_fraction=0.6):
+    """ݹģԴѡزԣع滮ֵ
+
+    ɿ쵽ʡΪ:
+        full      һζԭʼ֡ѹзȷִ
+        chunked   ֿȡѹֻѹ֡פڴ棬зȷִ
+        stream    ۵Ϊۺ״̬ȥûòͼƣ水豣
+        aggregate ۺMySQLɣ©
+
+    ȡ߳ȾĬϾΪ1ɲԾȡʽ(Ӷȡ/ֿȡ)
+    suggested_workers/suggested_jobsֻǰCPUĽ飬--workers/--jobsʽ
+    """
+    available = psutil.virtual_memory().available if available_bytes is None else available_bytes
+    cpus = (os.cpu_count() or 1) if cpu_count is None else cpu_count
+    budget = available * memory_fraction
+
+    if total_rows * raw_bytes_per_row * RAW_LOAD_FACTOR <= budget:
+        strategy = 'full'
+    elif total_rows * compact_bytes_per_row * COMPACT_WORK_FACTOR <= budget:
+        strategy = 'chunked'
+    elif total_rows * USER_DAY_BYTES <= budget:
+        strategy = 'stream'
+    else:
+        strategy = 'aggregate'
+
+    # ÿԭʼԼռԤ1/10[1, 100]
+    chunk_size = int(budget / 10 / max(raw_bytes_per_row * RAW_LOAD_FACTOR, 1.0))
+    chunk_size = int(min(max(chunk_size, 10000), 1000000))
+
+    exact = strategy in ('full', 'chunked')
+    plan = {
+        'strategy': strategy,
+        'chunk_size': chunk_size,
+        'workers': 1,
+        'jobs': 1,
+        # жȡ벢ȾĽֵCPUƣֻ־ʾ
+        'suggested_workers': min(cpus, 4) if exact and total_rows > chunk_size else 1,
+        'suggested_jobs': min(cpus, 4),
+        'exact_distinct': exact,
+        'with_retention': strategy != 'aggregate',
+        'with_funnel': exact,
+        'total_rows': total_rows,
+        'raw_bytes_per_row': raw_bytes_per_row,
+        'compact_bytes_per_row': compact_bytes_per_row,
+        'available_bytes': available,
+        'budget_bytes': budget,
+    }
+    return plan
+
+
+def log_load_plan(plan):
+    logger.info(f"ع滮: ={plan['strategy']}, С={plan['chunk_size']:,}, "
+                f"ȡ߳={plan['workers']}, Ⱦ={plan['jobs']}")
+    logger.info(f"   {plan['total_rows']:,}, ÿֽ(ԭʼ/ѹ) {plan['raw_bytes_per_row']:.0f}/"
+                f"{plan['compact_bytes_per_row']:.0f}, ڴ {plan['available_bytes'] / 1024 ** 3:.2f} GB, "
+                f"Ԥ {plan['budget_bytes'] / 1024 ** 3:.2f} GB")
+    logger.info(f"  ȷȥ={plan['exact_distinct']}, ={plan['with_retention']}, ©={plan['with_funnel']}")
+    if plan['suggested_workers'] > plan['workers'] or plan['suggested_jobs'] > plan['jobs']:
+        logger.info(f"   --workers {plan['suggested_workers']} / --jobs {plan['suggested_jobs']} "
+                    f"жȡ벢Ⱦ")
+
+
+def make_load_plan(conn=None, sample_rows=20000, memory_fraction=0.6):
+    """ݿȡɼع滮"""
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_mysql()
+    try:
+        total_rows = table_status(conn)['row_count']
+        raw_bpr, compact_bpr = sample_bytes_per_row(conn, sample_rows)
+        plan = plan_load(total_rows, raw_bpr, compact_bpr, memory_fraction=memory_fraction)
+        log_load_plan(plan)
+        return plan
+    finally:
+        if own_conn:
+            conn.close()
+
+
+class AdaptiveChunkSizer:
+    """ʵڴʱС
+
+    ڴɿʱ𲽷Ŵ飻ڴԤ㡢
+    ڴڱֵ½ʱС顣
+    """
+
+    def __init__(self, initial, min_size=10000, max_size=1000000, memory_budget=None, reserve_bytes=None):
+        self.size = int(min(max(initial, min_size), max_size))
+        self.min_size = min_size
+        self.max_size = max_size
+        available = psutil.virtual_memory().available
+        self.memory_budget = memory_budget or available * 0.6
+        self.reserve_bytes = reserve_bytes or available * 0.1
+        self._best_rate = 0.0
+        self._last_rss = None
+
+    def observe(self, rows, seconds, rss_bytes):
+        """¼һʱ봦ĽRSSһС"""
+        rate = rows / max(seconds, 1e-9)
+        growth = 0 if self._last_rss is None else rss_bytes - self._last_rss
+        self._last_rss = rss_bytes
+        old = self.size
+
+        if psutil.virtual_memory().available < self.reserve_bytes or growth > self.memory_budget / 20:
+            self.size = max(self.min_size, self.size // 2)
+            reason = "ڴ"
+        elif rate >= self._best_rate * 0.95:
+            self.size = min(self.max_size, int(self.size * 1.5))
+            reason = ""
+        elif rate < self._best_rate * 0.8:
+            self.size = max(self.min_size, int(self.size * 0.75))
+            reason = "½"
+        else:
+            reason = None
+        self._best_rate = max(self._best_rate, rate)
+
+        if reason and self.size != old:
+            logger.info(f"С: {old:,} -> {self.size:,} ({reason}, {rate:,.0f} /)")
+        return self.size
+
+
+### 1.7 HBaseԴ (regionɨ裬ɨֱӽΪͻ)
+# migrate.sh / hive-to-hbase.py HBaseΪNoneʱMySQLͬ
+HBASE_CONFIG = {'host': 'localhost', 'port': 9090, 'table': None}
+# ÿɨRPCص(happybasebatch_sizeHBasescanner caching)
+HBASE_SCANNER_CACHING = 5000
+HBASE_COLUMNS = ['id', 'uid', 'item_id', 'behavior_type', 'item_category', 'visit_date', 'province']
+
+
+def plan_hbase_scan_ranges(table, design=None):
+    """region߽ɨ跶Χ[(row_start, row_stop, )]Noneʾ߽
+
+    ֻһregion(δԤ)ҲʹüмʱİͰǰ׺з֣
+    ΧԿɲɨ衣
+    """
+    ranges = [(region.get('start_key') or None, region.get('end_key') or None)
+              for region in sorted(table.regions(), key=lambda r: r.get('start_key') or b'')]
+    if len(ranges) <= 1 and design is not None and design.scheme != 'id' and design.buckets > 1:
+        prefixes = design.bucket_prefixes()
+        ranges = list(zip([None] + prefixes[1:], prefixes[1:] + [None]))
+    if not ranges:
+        ranges = [(None, None)]
+    label = lambda key: key.decode('utf-8', 'replace') if key else '-'
+    return [(start, stop, f"region [{label(start)}, {label(stop)})") for start, stop in ranges]
+
+
+def _row_id(key):
+    """мһΪid(мͬ)"""
+    return int(key.rpartition(b'|')[2])
+
+
+def _decode_packed_frame(ids, records, columns):
+    """packed: ƴӼ¼һfrombufferֱֶתΪͻ"""
+    import hbase_codec
+    records = hbase_codec.decode_packed_records(records)
+    frame = {}
+    for col in columns:
+        if col == 'id':
+            values = np.array(ids, dtype=np.int64)
+        elif col == 'item_category':
+            # MySQLΪֵַȡֵͬתΪַ
+            codes, uniques = pd.factorize(records['item_category'], sort=True)
+            values = pd.Categorical.from_codes(codes, categories=uniques.astype(str))
+        elif col == 'visit_date':
+            values = records['visit_day'].astype('datetime64[D]').astype('datetime64[s]')
+        elif col == 'province':
+            values = pd.Categorical.from_codes(records['province'].astype(np.int16),
+                                               categories=hbase_codec.PROVINCES).remove_unused_categories()
+        else:
+            values = records[col].astype(np.int64)
+        frame[col] = pd.Series(values, name=col)
+    return pd.DataFrame(frame)
+
+
+def _decode_column_rows(ids, rows, columns):
+    """columns(packed޷ɵ): дͻл"""
+    frame = {}
+    for col in columns:
+        buf = _column_buffer(col, len(rows))
+        if col == 'id':
+            buf.extend(ids)
+        else:
+            qualifier = f"f1:{col}".encode()
+            buf.extend([data[qualifier].decode('utf-8') if qualifier in data else None for data in rows])
+        frame[col] = buf.to_series(col)
+    return pd.DataFrame(frame)
+
+
+def _merge_scan_batches(scanner):
+    """scan_batchingʱһеĵԪֶܷηأڵͬϲΪһ"""
+    last_key, last_data = None, None
+    for key, data in scanner:
+        if key == last_key:
+            last_data.update(data)
+            continue
+        if last_key is not None:
+            yield last_key, last_data
+        last_key, last_data = key, data
+    if last_key is not None:
+        yield last_key, last_data
+
+
+def _scan_hbase_range(pool, table_name, row_start, row_stop, columns, scanner_caching, scan_batching):
+    """߳: ɨһregionʶֵԪ񲼾ֲ"""
+    import hbase_codec
+    start_time = time.time()
+    wanted = [c for c in columns if c != 'id']
+    # ͶӰ: packed¼ȫֶΣcolumnsֻȡҪ޶
+    qualifiers = [hbase_codec.PACKED_QUALIFIER] + [f"f1:{c}".encode() for c in wanted] if wanted else None
+    packed_ids, packed_records = [], []
+    row_ids, rows = [], []
+    with pool.connection() as connection:
+        scanner = connection.table(table_name).scan(row_start=row_start, row_stop=row_stop, columns=qualifiers,
+                                                    batch_size=scanner_caching, scan_batching=scan_batching)
+        for key, data in _merge_scan_batches(scanner):
+            record = data.get(hbase_codec.PACKED_QUALIFIER)
+            if record is not None:
+                packed_ids.append(_row_id(key))
+                packed_records.append(record)
+            else:
+                row_ids.append(_row_id(key))
+                rows.append(data)
+    frames = []
+    if packed_records:
+        frames.append(_decode_packed_frame(packed_ids, packed_records, columns))
+    if rows:
+        frames.append(_decode_column_rows(row_ids, rows, columns))
+    return frames, time.time() - start_time, threading.current_thread().name
+
+
+@instrumented("fetch:hbase")
+def get_data_from_hbase(table=HBASE_CONFIG['table'], host=HBASE_CONFIG['host'], port=HBASE_CONFIG['port'],
+                        workers=4, scanner_caching=HBASE_SCANNER_CACHING, scan_batching=None, columns=None,
+                        layout=None):
+    """HBaseȡûΪݣget_data_from_mysqlͬͻDataFrame
+
+    region߽зΪɨ跶Χworkers߳̾happybaseӳزɨ裻
+    scanner_cachingΪÿRPCصscan_batchingÿRPCصĵԪ
+    columnsΪҪ(Ĭȫ)ֻӦ޶packed¼frombuffer
+    һν룬йֵַ䡣layoutΪhbase-splits.pyɵĲļ
+    δԤʱڰͰз֡ȡMySQLʵ
+    """
+    table = table or TABLE
+    logger.info(f"ڴHBaseȡ: {host}:{port}  {table}")
+    try:
+        import happybase
+    except ImportError:
+        logger.error("ȱhappybaseִ: pip install happybase")
+        return None
+    
+    start_mem = psutil.Process().memory_info().rss / (1024 ** 2)
+    start_time = time.time()
+    columns = list(columns or HBASE_COLUMNS)
+    try:
+        design = None
+        if layout:
+            from hbase_keys import RowKeyDesign
+            design = RowKeyDesign.load(layout)
+        pool = happybase.ConnectionPool(size=max(workers, 1), host=host, port=port)
+        with pool.connection() as connection:
+            ranges = plan_hbase_scan_ranges(connection.table(table), design)
+        logger.info(f"regionзΪ {len(ranges)} ɨ跶Χʹ {workers} ̲߳ɨ"
+                    f"(scanner caching={scanner_caching}, ={columns})")
+        
+        frames = [[] for _ in ranges]
+        worker_stats = {}
+        with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='hbase-scanner') as executor:
+            futures = {executor.submit(_scan_hbase_range, pool, table, row_start, row_stop, columns,
+                                       scanner_caching, scan_batching): (i, label)
+                       for i, (row_start, row_stop, label) in enumerate(ranges)}
+            for future in as_completed(futures):
+                i, label = futures[future]
+                parts, elapsed, worker = future.result()
+                frames[i] = parts
+                n = sum(len(part) for part in parts)
+                rows, seconds = worker_stats.get(worker, (0, 0.0))
+                worker_stats[worker] = (rows + n, seconds + elapsed)
+                logger.info(f"[{worker}] {label}: {n:,} , ʱ {elapsed:.2f}, "
+                            f"{n / max(elapsed, 1e-9):,.0f} /")
+        
+        for worker, (rows, seconds) in sorted(worker_stats.items()):
+            logger.info(f"߳ {worker}:  {rows:,} , ɨʱ {seconds:.2f}, "
+                        f"ƽ {rows / max(seconds, 1e-9):,.0f} /")
+        
+        data = concat_typed_frames([part for parts in frames for part in parts])
+        if data.empty:
+            logger.warning(f": HBase {table} ɨΪ")
+            return None
+        data = apply_compact_schema(data)
+        
+        elapsed = time.time() - start_time
+        end_mem = psutil.Process().memory_info().rss / (1024 ** 2)
+        frame_mem = data.memory_usage(deep=True).sum() / (1024 ** 2)
+        logger.info(f"HBaseɨɣ: {len(data):,}, ʱ: {elapsed:.2f}, "
+                    f" {len(data) / max(elapsed, 1e-9):,.0f} /, "
+                    f"ڴ: {end_mem - start_mem:.2f} MB, ռ: {frame_mem:.2f} MB")
+        return data
+    
+    except Exception as e:
+        logger.error(f"HBaseȡ: {str(e)}")
+        logger.error(": 1. HBase ThriftǷ 2. ַǷȷ")
+        logger.error(traceback.format_exc())
+        return None
+
+
+### 2. Ԥ (Żڴʹ)
+@instrumented("preprocess")
+def preprocess_data(data):
+    """ת͡ȡ·ݲֵ"""
+    logger.info("ڽԤ...")
+    start_time = time.time()
+    
+    try:
+        # Ч
+        if data is None or data.empty:
+            logger.error(": Ϊգ޷Ԥ")
+            return None
+        
+        # ¼ԭʼ״
+        original_shape = data.shape
+        
+        # 鲢ֵ
+        null_counts = data.isnull().sum()
+        if null_counts.sum() > 0:
+            null_columns = null_counts[null_counts > 0]
+            logger.warning(f"ݴڿֵпֵ:\n{null_columns}")
+            
+            # ֵ
+            null_percent = (data.isnull().mean() * 100).round(2)
+            high_null_cols = null_percent[null_percent > 30]
+            
+            if not high_null_cols.empty:
+                logger.warning(f": пֵ30%:\n{high_null_cols}")
+                # ɾֵߵ
+                data = data.drop(columns=high_null_cols.index.tolist())
+                logger.info(f"ɾȱʧֵ: {high_null_cols.index.tolist()}")
+            
+            # ɾʣֵ
+            data = data.dropna()
+            logger.info(f"ƳֵƳ: {original_shape[0] - data.shape[0]}")
+        
+        # ؼǷ
+        required_columns = ['behavior_type', 'visit_date', 'uid', 'item_category', 'province']
+        if 'total_actions' in data.columns:  # Ԥۺݲuid
+            required_columns.remove('uid')
+        missing_columns = [col for col in required_columns if col not in data.columns]
+        
+        if missing_columns:
+            logger.error(f": ȱٹؼ: {missing_columns}")
+            return None
+        
+        # תΪΪֵ
+        if 'behavior_type_num' not in data.columns:  # δԤۺʱִ
+            try:
+                data['behavior_type_num'] = pd.to_numeric(data['behavior_type'], errors='coerce')
+                if data['behavior_type_num'].isna().any():
+                    invalid_count = data['behavior_type_num'].isna().sum()
+                    logger.warning(f":  {invalid_count} ЧΪͼ¼")
+                    data = data.dropna(subset=['behavior_type_num'])
+                data['behavior_type_num'] = data['behavior_type_num'].astype(np.int8)
+            except Exception as e:
+                logger.error(f"Ϊת: {str(e)}")
+                return None
+        
+        # ȡ· (ֱֵͣdatetime64)
+        if 'month' not in data.columns:  # δԤۺʱִ
+            try:
+                if not pd.api.types.is_datetime64_any_dtype(data['visit_date'].dtype):
+                    data['visit_date'] = pd.to_datetime(data['visit_date'], errors='coerce')
+                # ֤Ч
+                invalid_dates = data['visit_date'].isna()
+                if invalid_dates.any():
+                    logger.warning(f":  {int(invalid_dates.sum())} Чڼ¼")
+                    data = data[~invalid_dates].copy()
+                data['month'] = data['visit_date'].dt.month.astype(np.int8)
+            except Exception as e:
+                logger.error(f"ڴ: {str(e)}")
+                return None
+        
+        # ȡе
+        if 'day' not in data.columns:  # δԤۺʱִ
+            try:
+                data['day'] = data['visit_date'].dt.day.astype(np.int8)
+            except:
+                logger.warning("ȡֶʧܣܲӰ")
+        
+        # ʱ䱨
+        elapsed = time.time() - start_time
+        logger.info(f"Ԥɣ: {len(data):,}, ʱ: {elapsed:.2f}")
+        return data
+    
+    except Exception as e:
+        logger.error(f"Ԥз: {str(e)}")
+        logger.error(traceback.format_exc())
+        return None
+
+
+### 2.1 ۺ (һαͼľۺϽ)
+def _column_codes(series):
+    """е뼰ӦȡֱֵӸб"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), series.cat.categories
+    codes, uniques = pd.factorize(series, sort=True)
+    return codes, pd.Index(uniques)
+
+
+def _crosstab_counts(row_codes, n_rows, col_codes, n_cols, weights=None):
+    """bincountĶάб x б룩"""
+    flat = row_codes.astype(np.int64) * n_cols + col_codes
+    counts = np.bincount(flat, weights=weights, minlength=n_rows * n_cols)
+    return counts.reshape(n_rows, n_cols)
+
+
+# ֽڲλ(popcount)
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+@instrumented("aggregate:retention")
+def compute_user_retention(user_days, max_days=30):
+    """ϼ30ʣ(, û)
+
+    ûIDӻΪ룬תΪڵ״η
+    np.minimum.atûԼõ(û, ״η)д밴ֶ
+    λͼpopcountÿȥû帴ӶȽӽԣ
+    Ҫgroupby-mergeԭʼУҲȥص(û, )ϡ
+    """
+    # תڸʽ
+    try:
+        visit_date = user_days['visit_date']
+        if not pd.api.types.is_datetime64_any_dtype(visit_date.dtype):
+            visit_date = pd.to_datetime(visit_date)
+    except Exception as e:
+        logger.error(f"ת: {str(e)}")
+        return None, 0
+
+    uid_codes, uids = _column_codes(user_days['uid'])
+    unique_users = len(uids)
+    if unique_users == 0:
+        return pd.Series(dtype=np.float64), 0
+
+    # תΪƫ
+    days = visit_date.to_numpy().astype('datetime64[D]').astype(np.int64)
+    offsets = days - days.min()
+
+    # ÿû״η
+    first_visit = np.full(unique_users, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(first_visit, uid_codes, offsets)
+    date_diff = offsets - first_visit[uid_codes]
+
+    # ɸѡ30
+    keep = date_diff <= max_days
+    date_diff, users = date_diff[keep], uid_codes[keep]
+
+    # λͼ: ÿһΣÿΰֽڶȫû
+    stride = (unique_users + 7) // 8
+    bit_index = users.astype(np.int64)
+    bitmap = np.zeros((max_days + 1) * stride, dtype=np.uint8)
+    np.bitwise_or.at(bitmap, date_diff * stride + (bit_index >> 3),
+                     (1 << (bit_index & 7)).astype(np.uint8))
+    retained = _POPCOUNT_TABLE[bitmap.reshape(max_days + 1, stride)].sum(axis=1, dtype=np.int64)
+
+    present = np.flatnonzero(retained)
+    retention_rates = pd.Series(retained[present] / unique_users * 100,
+                                index=pd.Index(present, name='date_diff'))
+    return retention_rates, unique_users
+
+
+def _dedupe_parts(parts):
+    """ϲȥضƬȥؼ"""
+    parts = [p for p in parts if p is not None and len(p)]
+    if not parts:
+        return None
+    if len(parts) == 1:
+        return parts[0]
+    return pd.concat(parts, ignore_index=True).drop_duplicates(ignore_index=True)
+
+
+@instrumented("aggregate:partial")
+def build_partial_aggregates(data, with_retention=True, exact_distinct=True):
+    """һαɺϲĲ־ۺ״̬
+
+    ״ֻ̬ȥؼHyperLogLogͼۼӺ
+    finalize_aggregatesͼĽͬڷֿʽȡ
+    exact_distinct=Falseʱ澫ȷ(, Ϊ, û)ÿȥû
+    ɲͼƣ״̬Сû޹ء
+    """
+    # ԤۺÿдΪtotal_actionsȨ
+    weights = None
+    if 'total_actions' in data.columns:
+        weights = data['total_actions'].to_numpy(dtype=np.float64)
+
+    # ÿֻһΣͳȫ
+    beh_codes, behaviors = _column_codes(data['behavior_type_num'])
+    cat_codes, categories = _column_codes(data['item_category'])
+    prov_codes, provinces = _column_codes(data['province'])
+    month_codes, months = _column_codes(data['month'])
+    n_beh = len(behaviors)
+
+    def crosstab(codes, labels, name):
+        table = pd.DataFrame(
+            _crosstab_counts(codes, len(labels), beh_codes, n_beh, weights),
+            index=labels, columns=behaviors).astype(np.int64)
+        table.index.name = name
+        return table
+
+    state = {
+        'row_count': len(data) if weights is None else int(weights.sum()),
+        'category_behavior': crosstab(cat_codes, categories, 'item_category'),
+        'province_behavior': crosstab(prov_codes, provinces, 'province'),
+        'month_behavior': crosstab(month_codes, months, 'month'),
+        'daily_user_keys': None,
+        'user_days': None,
+        'user_sketches': None,
+    }
+
+    # ȥûͼ: (, Ϊ)ʡݷ飬ɿϲ
+    if 'uid' in data.columns and 'visit_date' in data.columns:
+        state['user_sketches'] = build_user_sketches(data)
+
+    # ÿոΪȥû: ȥغ(, Ϊ, û)
+    if exact_distinct and 'uid' in data.columns and 'day' in data.columns:
+        day_codes, days = _column_codes(data['day'])
+        uid_codes, uids = _column_codes(data['uid'])
+        n_uid = max(len(uids), 1)
+        keys = pd.unique((day_codes.astype(np.int64) * n_beh + beh_codes) * n_uid + uid_codes)
+        cells, user = np.divmod(keys, n_uid)
+        day, beh = np.divmod(cells, n_beh)
+        state['daily_user_keys'] = pd.DataFrame({
+            'day': days.take(day), 'behavior_type_num': behaviors.take(beh), 'uid': uids.take(user)})
+
+    # ״̬: ȥغ(û, )(ȥ)
+    if with_retention and 'uid' in data.columns and 'visit_date' in data.columns:
+        uid_codes, uids = _column_codes(data['uid'])
+        date_codes, dates = _column_codes(data['visit_date'])
+        n_dates = max(len(dates), 1)
+        user, date = np.divmod(pd.unique(uid_codes.astype(np.int64) * n_dates + date_codes), n_dates)
+        state['user_days'] = pd.DataFrame({'uid': uids.take(user), 'visit_date': dates.take(date)})
+
+    return state
+
+
+def merge_partial_aggregates(state, other):
+    """һݲ־ۺ״̬ϲstate"""
+    if state is None:
+        return other
+    state['row_count'] += other['row_count']
+    for key in ('category_behavior', 'province_behavior', 'month_behavior'):
+        merged = state[key].add(other[key], fill_value=0).fillna(0).astype(np.int64)
+        merged.index.name = state[key].index.name
+        state[key] = merged.sort_index().sort_index(axis=1)
+    state['user_sketches'] = merge_user_sketches(state.get('user_sketches'), other.get('user_sketches'))
+
+    # ȥؼݴƬۼƹģʱȥأ֤ϲܳɱ
+    for key in ('daily_user_keys', 'user_days'):
+        if other[key] is None:
+            continue
+        parts = state.setdefault(f'_{key}_parts', [])
+        parts.append(other[key])
+        pending = sum(len(p) for p in parts)
+        base = 0 if state[key] is None else len(state[key])
+        if pending > max(base, 100000):
+            state[key] = _dedupe_parts([state[key]] + parts)
+            parts.clear()
+    return state
+
+
+@instrumented("aggregate:finalize")
+def finalize_aggregates(state, with_retention=True):
+    """ɲ־ۺ״̬ɻͼʹõľۺϽ
+
+    صֵֻСģľۺϱͼҪԭʼ:
+        behavior_counts     Ϊ͵Ĵ
+        category_purchases  ƷĹ
+        month_behavior      · x Ϊ 
+        province_purchases  ʡݵĹ
+        daily_users          x Ϊ ȥû
+        monthly_users       · x Ϊ ȥû (ͼ)
+        province_users      ʡȥû (ͼ)
+        category_behavior   Ʒ x Ϊ 
+        retention_rates     30(ٷֱ)
+    ûоȷʱÿȥûͬԲͼ(distinct_users_approx=True)
+    """
+    for key in ('daily_user_keys', 'user_days'):
+        parts = state.pop(f'_{key}_parts', [])
+        state[key] = _dedupe_parts([state[key]] + parts)
+
+    category_behavior = state['category_behavior']
+    province_behavior = state['province_behavior']
+
+    # Ϊ(4)ķ/ʡͳֱȡӦ
+    if 4 in category_behavior.columns:
+        category_purchases = category_behavior[4]
+        province_purchases = province_behavior[4]
+    else:
+        category_purchases = pd.Series(dtype=np.int64)
+        province_purchases = pd.Series(dtype=np.int64)
+    category_purchases = category_purchases[category_purchases > 0].sort_values(ascending=False)
+    province_purchases = province_purchases[province_purchases > 0].sort_values(ascending=False)
+
+    daily_users, monthly_users, province_users = None, None, None
+    if state.get('user_sketches'):
+        daily_users, monthly_users, province_users = sketch_user_tables(state['user_sketches'])
+    distinct_users_approx = daily_users is not None
+    if state['daily_user_keys'] is not None:
+        daily_users = (state['daily_user_keys']
+                       .groupby(['day', 'behavior_type_num']).size()
+                       .unstack(fill_value=0).sort_index())
+        distinct_users_approx = False
+
+    retention_rates, retention_users = None, 0
+    if with_retention and state['user_days'] is not None:
+        retention_rates, retention_users = compute_user_retention(state['user_days'])
+
+    return {
+        'row_count': state['row_count'],
+        'behavior_counts': category_behavior.sum(axis=0),
+        'category_purchases': category_purchases,
+        'month_behavior': state['month_behavior'],
+        'province_purchases': province_purchases,
+        'daily_users': daily_users,
+        'monthly_users': monthly_users,
+        'province_users': province_users,
+        'distinct_users_approx': distinct_users_approx,
+        'category_behavior': category_behavior,
+        'retention_rates': retention_rates,
+        'retention_users': retention_users,
+    }
+
+
+@instrumented("aggregate")
+def compute_aggregates(data, with_retention=True):
+    """ڴһαͼҪľۺϽ"""
+    logger.info("ڼ㹲ۺϽ...")
+    start_time = time.time()
+
+    state = build_partial_aggregates(data, with_retention=with_retention)
+    aggregates = finalize_aggregates(state, with_retention=with_retention)
+
+    elapsed = time.time() - start_time
+    logger.info(f"ۺϼɣ: {len(data):,}, ʱ: {elapsed:.2f}")
+    return aggregates
+
+
+### 2.2 HyperLogLogȥûͼ (ɺϲڴн)
+# p: ÿͼ2^pĴ(ֽ)Ա׼Լ1.04/sqrt(2^p)
+#   Python鹹: p=14, 16KB/ͼ, Լ0.81%
+#   MySQL˹:    p=12, 4KB/ͼ, Լ1.63% (ٷصļĴ)
+HLL_PRECISION = 14
+HLL_SQL_PRECISION = 12
+
+
+def _bit_length64(values):
+    """uint64ԪصĶλ(ȷ㣬)"""
+    values = values.copy()
+    length = np.zeros(values.shape, dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        mask = values >= (np.uint64(1) << np.uint64(shift))
+        length[mask] += shift
+        values[mask] >>= np.uint64(shift)
+    return length + (values > 0)
+
+
+def hash_uids(uids):
+    """ûIDӳΪ64λϣIDͳһint64ϣ֤νһ"""
+    values = uids.to_numpy() if isinstance(uids, pd.Series) else np.asarray(uids)
+    if np.issubdtype(values.dtype, np.integer):
+        values = values.astype(np.int64)
+    else:
+        values = values.astype(str).astype(object)
+    return pd.util.hash_array(values)
+
+
+def hll_registers(hashes, group_codes, n_groups, precision=HLL_PRECISION):
+    """鹹HyperLogLogĴ״Ϊ(n_groups, 2^p)uint8"""
+    m = 1 << precision
+    tail_bits = 64 - precision
+    index = (hashes >> np.uint64(tail_bits)).astype(np.int64)
+    tail = hashes & np.uint64((1 << tail_bits) - 1)
+    # rho: ʣλеһ1ֵλ(1ʼ)
+    rho = (tail_bits - _bit_length64(tail) + 1).astype(np.uint8)
+    registers = np.zeros(n_groups * m, dtype=np.uint8)
+    np.maximum.at(registers, group_codes.astype(np.int64) * m + index, rho)
+    return registers.reshape(n_groups, m)
+
+
+def hll_estimate(registers):
+    """һĴĻ(СԼ)"""
+    registers = np.atleast_2d(registers)
+    m = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)), axis=1)
+    zeros = np.count_nonzero(registers == 0, axis=1)
+    small = (raw <= 2.5 * m) & (zeros > 0)
+    raw[small] = m * np.log(m / zeros[small])
+    return raw
+
+
+def build_user_sketches(data, precision=HLL_PRECISION):
+    """Ϊ(, Ϊ)ʡάȷֱ𹹽ȥûͼ"""
+    hashes = hash_uids(data['uid'])
+    sketches = {'date_behavior': {}, 'province': {}}
+
+    date_codes, dates = _column_codes(data['visit_date'])
+    beh_codes, behaviors = _column_codes(data['behavior_type_num'])
+    registers = hll_registers(hashes, date_codes.astype(np.int64) * len(behaviors) + beh_codes,
+                              len(dates) * len(behaviors), precision)
+    for i, date in enumerate(dates):
+        for j, behavior in enumerate(behaviors):
+            row = registers[i * len(behaviors) + j]
+            if row.any():
+                sketches['date_behavior'][(pd.Timestamp(date), int(behavior))] = row
+
+    prov_codes, provinces = _column_codes(data['province'])
+    registers = hll_registers(hashes, prov_codes, len(provinces), precision)
+    for i, province in enumerate(provinces):
+        if registers[i].any():
+            sketches['province'][province] = registers[i]
+    return sketches
+
+
+def merge_user_sketches(sketches, other):
+    """Ĵȡֵϲݲͼ"""
+    if sketches is None:
+        return other
+    if other is None:
+        return sketches
+    for family, groups in other.items():
+        target = sketches.setdefault(family, {})
+        for key, registers in groups.items():
+            if key in target:
+                np.maximum(target[key], registers, out=target[key])
+            else:
+                target[key] = registers.copy()
+    return sketches
+
+
+def estimate_distinct_users(groups, key_func):
+    """key_funcѲͼ·ϲȥû{¼: ֵ}"""
+    merged = {}
+    for key, registers in groups.items():
+        new_key = key_func(key)
+        if new_key in merged:
+            np.maximum(merged[new_key], registers, out=merged[new_key])
+        else:
+            merged[new_key] = registers.copy()
+    if not merged:
+        return {}
+    keys = list(merged)
+    estimates = hll_estimate(np.vstack([merged[k] for k in keys]))
+    return {k: int(round(v)) for k, v in zip(keys, estimates)}
+
+
+def sketch_user_tables(sketches):
+    """ɲͼ xΪxΪ ȥûʡȥû"""
+    date_behavior = sketches.get('date_behavior', {})
+
+    def to_table(counts, index_name):
+        if not counts:
+            return None
+        table = pd.Series(counts).unstack(fill_value=0).sort_index().astype(np.int64)
+        table.index.name = index_name
+        table.columns.name = 'behavior_type_num'
+        return table
+
+    daily = to_table(estimate_distinct_users(date_behavior, lambda k: (k[0].day, k[1])), 'day')
+    monthly = to_table(estimate_distinct_users(date_behavior, lambda k: (k[0].month, k[1])), 'month')
+    province = pd.Series(estimate_distinct_users(sketches.get('province', {}), lambda k: k),
+                         dtype=np.int64).sort_values(ascending=False)
+    province.index.name = 'province'
+    return daily, monthly, province
+
+
+def hll_register_sql(precision=HLL_SQL_PRECISION):
+    """(Ĵʽ, ϣʽ)MySQL˲ͼܱͬһ׼"""
+    tail_bits = 64 - precision
+    tail_mask = (1 << tail_bits) - 1
+    register_expr = f"""
+        h >> {tail_bits} AS reg,
+        CASE WHEN (h & {tail_mask}) = 0 THEN {tail_bits + 1}
+             ELSE {tail_bits + 1} - LENGTH(BIN(h & {tail_mask})) END AS rho"""
+    hashed = "CAST(CONV(SUBSTRING(MD5(uid), 1, 16), 16, 10) AS UNSIGNED) AS h"
+    return register_expr, hashed
+
+
+def _collect_sketch_rows(conn, queries, precision):
+    """ִз(..., reg, rho)ĲѯѼĴдͼ"""
+    m = 1 << precision
+    sketches = {'date_behavior': {}, 'province': {}}
+    for family, query in queries.items():
+        logger.info(f"ִȥûͼѯ: {family}")
+        with conn.cursor(pymysql.cursors.SSCursor) as cursor:
+            cursor.execute(query)
+            while True:
+                rows = cursor.fetchmany(100000)
+                if not rows:
+                    break
+                for row in rows:
+                    if family == 'date_behavior':
+                        key = (pd.Timestamp(row[0]), int(row[1]))
+                    else:
+                        key = row[0]
+                    registers = sketches[family].get(key)
+                    if registers is None:
+                        registers = sketches[family][key] = np.zeros(m, dtype=np.uint8)
+                    registers[int(row[-2])] = max(registers[int(row[-2])], int(row[-1]))
+    return sketches
+
+
+def fetch_user_sketches_from_mysql(conn, precision=HLL_SQL_PRECISION):
+    """MySQL˰HyperLogLogĴֻطĴ
+
+    ϣȡMD5(uid)ǰ64λPython˲ͼʹòͬϣ߲ܻϺϲ
+    """
+    register_expr, hashed = hll_register_sql(precision)
+
+    queries = {
+        'date_behavior': f"""
+            SELECT visit_date, behavior_type, reg, MAX(rho) AS rho FROM (
+                SELECT visit_date, behavior_type, {register_expr}
+                FROM (SELECT visit_date, behavior_type, {hashed} FROM {TABLE}) AS hashed
+            ) AS regs GROUP BY visit_date, behavior_type, reg""",
+        'province': f"""
+            SELECT province, reg, MAX(rho) AS rho FROM (
+                SELECT province, {register_expr}
+                FROM (SELECT province, {hashed} FROM {TABLE}) AS hashed
+            ) AS regs GROUP BY province, reg""",
+    }
+    return _collect_sketch_rows(conn, queries, precision)
+
+
+def fetch_user_sketches_from_rollups(conn, precision=HLL_SQL_PRECISION):
+    """ӻܱȡѰڱĲͼĴʡݲͼȡֵϲ"""
+    queries = {
+        'date_behavior': f"SELECT visit_date, behavior_type, reg, rho FROM {rollup_tables()['date_behavior']}",
+        'province': f"SELECT province, reg, MAX(rho) AS rho FROM {rollup_tables()['province']} GROUP BY province, reg",
+    }
+    return _collect_sketch_rows(conn, queries, precision)
+
+
+### 2.3 ûλͼ (־ûuidֵ + (, Ϊ)ѹλͼ)
+def user_index_dir():
+    return os.path.join(table_cache_dir(), "user_index")
+UID_DICTIONARY_FILE = "uid_dictionary.npy"
+USER_BITMAPS_FILE = "user_bitmaps.npz"
+# ʱݱָ(ģʽˮλ)뵱ǰһµֱʹ
+USER_INDEX_META_FILE = "user_index.json"
+
+
+def _uid_values(series):
+    """uidתΪɳ־û(ֵuidΪint64Ϊַ)ͬʱ޳ֵ"""
+    series = series.dropna()
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return series.to_numpy(dtype=np.int64)
+    return series.astype(str).to_numpy(dtype=str)
+
+
+class UidDictionary:
+    """־û uid ->  ֵ
+
+    뼴uidֵеλãû״γ˳׷ӵĩβ
+    ûıڶм䱣ֲ䣬λͼԿֱӺϲ
+    """
+
+    def __init__(self, uids=None):
+        self.uids = pd.Index(uids if uids is not None else np.empty(0, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.uids)
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        return cls(np.load(path, allow_pickle=False))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, self.uids.to_numpy(), allow_pickle=False)
+        os.replace(tmp_path, path)
+
+    def encode(self, values):
+        """ÿuidĳܱ(int64)δuid±"""
+        codes, uniques = pd.factorize(values)
+        positions = self.uids.get_indexer(uniques) if len(self.uids) else np.full(len(uniques), -1)
+        new = positions < 0
+        if new.any():
+            positions[new] = np.arange(len(self.uids), len(self.uids) + new.sum())
+            self.uids = self.uids.append(pd.Index(uniques[new]))
+        return positions.astype(np.int64)[codes]
+
+
+# ѹλͼûĸ16λֿ飬ÿ65536û
+BITMAP_BLOCK_BITS = 16
+BITMAP_BLOCK_SIZE = 1 << BITMAP_BLOCK_BITS
+# ûֵʱϡ(ÿû2ֽ)ڳλͼ(8KB)óλͼ
+BITMAP_SPARSE_LIMIT = BITMAP_BLOCK_SIZE // 16
+
+
+def _container_values(container):
+    """λĵ16λ(uint16)"""
+    if container.dtype == np.uint16:
+        return container
+    return np.flatnonzero(np.unpackbits(container, bitorder='little')).astype(np.uint16)
+
+
+def _container_dense(container):
+    """ĳλͼ(8KBiλʾڱi)"""
+    if container.dtype == np.uint8:
+        return container
+    bits = np.zeros(BITMAP_BLOCK_SIZE, dtype=bool)
+    bits[container] = True
+    return np.packbits(bits, bitorder='little')
+
+
+def _container_cardinality(container):
+    if container.dtype == np.uint16:
+        return len(container)
+    return int(_POPCOUNT_TABLE[container].sum(dtype=np.int64))
+
+
+def _container_fit(container):
+    """ѡĴ洢ʽտ鷵None"""
+    n = _container_cardinality(container)
+    if n == 0:
+        return None
+    if container.dtype == np.uint8 and n <= BITMAP_SPARSE_LIMIT:
+        return _container_values(container)
+    if container.dtype == np.uint16 and n > BITMAP_SPARSE_LIMIT:
+        return _container_dense(container)
+    return container
+
+
+def _container_contains(dense, values):
+    return ((dense[values >> 3] >> (values & 7)) & 1).astype(bool)
+
+
+def _container_or(a, b):
+    if a.dtype == np.uint16 and b.dtype == np.uint16:
+        return _container_fit(np.union1d(a, b))
+    return _container_fit(_container_dense(a) | _container_dense(b))
+
+
+def _container_and(a, b):
+    if a.dtype == np.uint16 and b.dtype == np.uint16:
+        return _container_fit(np.intersect1d(a, b, assume_unique=True))
+    if a.dtype == np.uint16:
+        return _container_fit(a[_container_contains(b, a)])
+    if b.dtype == np.uint16:
+        return _container_fit(b[_container_contains(a, b)])
+    return _container_fit(a & b)
+
+
+def _container_andnot(a, b):
+    if a.dtype == np.uint16:
+        if b.dtype == np.uint16:
+            return _container_fit(np.setdiff1d(a, b, assume_unique=True))
+        return _container_fit(a[~_container_contains(b, a)])
+    return _container_fit(a & ~_container_dense(b))
+
+
+class CompressedBitmap:
+    """ֿѹûλͼ(Roaring)
+
+    û밴16λֿ飬ÿ鰴ѡ: 4096ûʱ
+    16λ(uint16)8KBĳλͼڴԾûȣ
+    uidֵûɱ: Ƿµλͼ
+    """
+
+    __slots__ = ('blocks',)
+
+    def __init__(self, blocks=None):
+        #  -> տ
+        self.blocks = blocks if blocks is not None else {}
+
+    @classmethod
+    def from_codes(cls, codes):
+        codes = np.unique(np.asarray(codes, dtype=np.int64))
+        high = codes >> BITMAP_BLOCK_BITS
+        bounds = np.flatnonzero(np.diff(high)) + 1
+        return cls({int(high[part[0]]): _container_fit((codes[part] & (BITMAP_BLOCK_SIZE - 1)).astype(np.uint16))
+                    for part in np.split(np.arange(len(codes)), bounds) if len(part)})
+
+    def to_codes(self):
+        """ȫλû(int64)"""
+        if not self.blocks:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([(block << BITMAP_BLOCK_BITS) + _container_values(self.blocks[block]).astype(np.int64)
+                               for block in sorted(self.blocks)])
+
+    def __len__(self):
+        return sum(_container_cardinality(c) for c in self.blocks.values())
+
+    def max(self):
+        """λû(λͼΪ)"""
+        block = max(self.blocks)
+        return (block << BITMAP_BLOCK_BITS) + int(_container_values(self.blocks[block])[-1])
+
+    def __bool__(self):
+        return bool(self.blocks)
+
+    def __or__(self, other):
+        blocks = dict(self.blocks)
+        for block, container in other.blocks.items():
+            blocks[block] = _container_or(blocks[block], container) if block in blocks else container
+        return CompressedBitmap(blocks)
+
+    def __and__(self, other):
+        blocks = {}
+        for block in self.blocks.keys() & other.blocks.keys():
+            container = _container_and(self.blocks[block], other.blocks[block])
+            if container is not None:
+                blocks[block] = container
+        return CompressedBitmap(blocks)
+
+    def __sub__(self, other):
+        """: selfеotherеû"""
+        blocks = {}
+        for block, container in self.blocks.items():
+            if block in other.blocks:
+                container = _container_andnot(container, other.blocks[block])
+            if container is not None:
+                blocks[block] = container
+        return CompressedBitmap(blocks)
+
+    @staticmethod
+    def union_all(bitmaps):
+        return functools.reduce(CompressedBitmap.__or__, bitmaps, CompressedBitmap())
+
+
+class UserBitmapIndex:
+    """(, Ϊ)洢Ծûѹλͼ(CompressedBitmap)
+
+    ȥû桢©ȺصתΪλͼĲ//ͻͳơ
+    дǰλظͬһݲظ
+    """
+
+    def __init__(self, dates=None, behaviors=None, bitmaps=None):
+        self.dates = np.asarray(dates if dates is not None else [], dtype='datetime64[D]')
+        self.behaviors = np.asarray(behaviors if behaviors is not None else [], dtype=np.int8)
+        self.bitmaps = list(bitmaps) if bitmaps is not None else []
+        self._rows = {(d, int(b)): i for i, (d, b) in enumerate(zip(self.dates, self.behaviors))}
+
+    @property
+    def n_users(self):
+        """λͼгֹû+1"""
+        return max((bitmap.max() for bitmap in self.bitmaps if bitmap), default=-1) + 1
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path, allow_pickle=False) as saved:
+            if 'bitmaps' in saved.files:
+                # ɸʽ: ֽڴĵȿλͼ
+                bitmaps = [CompressedBitmap.from_codes(np.flatnonzero(np.unpackbits(row, bitorder='little')))
+                           for row in saved['bitmaps']]
+                return cls(saved['dates'], saved['behaviors'], bitmaps)
+            rows, blocks, lengths = saved['rows'], saved['blocks'], saved['lengths']
+            sparse, dense = saved['sparse'], saved['dense'].reshape(-1, BITMAP_BLOCK_SIZE // 8)
+            bitmaps = [CompressedBitmap() for _ in range(len(saved['dates']))]
+            sparse_offset = dense_row = 0
+            for row, block, length in zip(rows, blocks, lengths):
+                # Ϊ0ʾܿ
+                if length:
+                    container = sparse[sparse_offset:sparse_offset + length]
+                    sparse_offset += length
+                else:
+                    container = dense[dense_row]
+                    dense_row += 1
+                bitmaps[row].blocks[int(block)] = container
+            return cls(saved['dates'], saved['behaviors'], bitmaps)
+
+    def save(self, path):
+        """չ: ÿ¼(, , ϡ賤)ϡݷֱƴ"""
+        rows, blocks, lengths, sparse, dense = [], [], [], [], []
+        for row, bitmap in enumerate(self.bitmaps):
+            for block in sorted(bitmap.blocks):
+                container = bitmap.blocks[block]
+                rows.append(row)
+                blocks.append(block)
+                if container.dtype == np.uint16:
+                    lengths.append(len(container))
+                    sparse.append(container)
+                else:
+                    lengths.append(0)
+                    dense.append(container)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, dates=self.dates, behaviors=self.behaviors,
+                                rows=np.asarray(rows, dtype=np.int64), blocks=np.asarray(blocks, dtype=np.int64),
+                                lengths=np.asarray(lengths, dtype=np.int64),
+                                sparse=np.concatenate(sparse) if sparse else np.empty(0, dtype=np.uint16),
+                                dense=np.concatenate(dense) if dense else np.empty(0, dtype=np.uint8))
+        os.replace(tmp_path, path)
+
+    def add(self, visit_dates, behaviors, user_codes):
+        """(, Ϊ, û)Ԫдλͼ"""
+        dates = np.asarray(visit_dates, dtype='datetime64[D]')
+        behaviors = np.asarray(behaviors, dtype=np.int8)
+        user_codes = np.asarray(user_codes, dtype=np.int64)
+        if len(user_codes) == 0:
+            return self
+
+        # Ϊ³ֵ(, Ϊ)У¼ռһ׷
+        key_codes, key_index = pd.factorize(pd.MultiIndex.from_arrays([dates, behaviors]))
+        rows = np.empty(len(key_index), dtype=np.int64)
+        new_keys = []
+        for i, (d, b) in enumerate(key_index):
+            key = (np.datetime64(d, 'D'), int(b))
+            if key not in self._rows:
+                self._rows[key] = len(self._rows)
+                new_keys.append(key)
+            rows[i] = self._rows[key]
+        if new_keys:
+            self.dates = np.concatenate([self.dates, np.array([k[0] for k in new_keys], dtype='datetime64[D]')])
+            self.behaviors = np.concatenate([self.behaviors, np.array([k[1] for k in new_keys], dtype=np.int8)])
+            self.bitmaps.extend(CompressedBitmap() for _ in new_keys)
+
+        # 飬ÿûϲλͼ
+        order = np.argsort(key_codes, kind='stable')
+        bounds = np.flatnonzero(np.diff(key_codes[order])) + 1
+        for part in np.split(order, bounds):
+            row = rows[key_codes[part[0]]]
+            self.bitmaps[row] = self.bitmaps[row] | CompressedBitmap.from_codes(user_codes[part])
+        return self
+
+    def clear(self):
+        self.__init__()
+
+    @staticmethod
+    def popcount(bitmap):
+        """λͼλû"""
+        return len(bitmap)
+
+    def union(self, dates=None, behaviors=None):
+        """ָΪΧڵĻԾûλͼ()ΪNoneʾ"""
+        mask = np.ones(len(self.dates), dtype=bool)
+        if dates is not None:
+            mask &= np.isin(self.dates, np.asarray(dates, dtype='datetime64[D]'))
+        if behaviors is not None:
+            mask &= np.isin(self.behaviors, np.asarray(behaviors, dtype=np.int8))
+        return CompressedBitmap.union_all(self.bitmaps[i] for i in np.flatnonzero(mask))
+
+    def daily_users(self):
+        """ x Ϊ ȥûfinalize_aggregatesеdaily_usersʽһ"""
+        if len(self.dates) == 0:
+            return None
+        days = pd.DatetimeIndex(self.dates).day.to_numpy(dtype=np.int8)
+        key_codes, keys = pd.factorize(
+            pd.MultiIndex.from_arrays([days, self.behaviors], names=['day', 'behavior_type_num']))
+        counts = np.array([len(CompressedBitmap.union_all(self.bitmaps[j] for j in np.flatnonzero(key_codes == i)))
+                           for i in range(len(keys))], dtype=np.int64)
+        table = pd.Series(counts, index=keys).unstack(fill_value=0).sort_index().sort_index(axis=1)
+        table.index = table.index.astype(np.int8)
+        table.columns = table.columns.astype(np.int8)
+        return table
+
+    def retention(self, max_days=30):
+        """״ηշȺλͼ30ʣ(, û)"""
+        dates = np.unique(self.dates)
+        if len(dates) == 0:
+            return None, 0
+        active = {d: self.union(dates=[d]) for d in dates}
+        seen = CompressedBitmap()
+        retained = np.zeros(max_days + 1, dtype=np.int64)
+        for d in dates:
+            # ״γֵûȺ
+            cohort = active[d] - seen
+            seen = seen | active[d]
+            if not cohort:
+                continue
+            for diff in range(max_days + 1):
+                later = active.get(d + np.timedelta64(diff, 'D'))
+                if later is not None:
+                    retained[diff] += len(cohort & later)
+        users = len(seen)
+        present = np.flatnonzero(retained)
+        rates = pd.Series(retained[present] / users * 100, index=pd.Index(present, name='date_diff'))
+        return rates, users
+
+    def funnel(self, stages=((1,), (2, 3), (4,)), dates=None):
+        """©׶εû: k׶Ϊǰk׶ȫΪû(ҪȺ˳)"""
+        current = None
+        counts = []
+        for stage in stages:
+            stage_users = self.union(dates=dates, behaviors=stage)
+            current = stage_users if current is None else current & stage_users
+            counts.append(len(current))
+        return counts
+
+    def overlap(self, dates_a, dates_b, behaviors=None):
+        """ڷΧڻԾûĽ"""
+        return len(self.union(dates_a, behaviors) & self.union(dates_b, behaviors))
+
+
+@instrumented("user_index:update")
+def update_user_index(data, index, uid_dictionary):
+    """е(, Ϊ, û)дλͼ"""
+    valid = data['uid'].notna() & data['visit_date'].notna()
+    if not valid.all():
+        data = data[valid]
+    codes = uid_dictionary.encode(_uid_values(data['uid']))
+    index.add(data['visit_date'].to_numpy(), data['behavior_type_num'].to_numpy(), codes)
+    return index
+
+
+def load_user_index(index_dir=None, rebuild=False):
+    """ȡ־ûuidֵλͼrebuild=Trueʱؿ"""
+    if rebuild:
+        return UidDictionary(), UserBitmapIndex()
+    index_dir = index_dir or user_index_dir()
+    return (UidDictionary.load(os.path.join(index_dir, UID_DICTIONARY_FILE)),
+            UserBitmapIndex.load(os.path.join(index_dir, USER_BITMAPS_FILE)))
+
+
+def load_user_index_meta(index_dir=None):
+    """ȡӦݱָˮλߣԪݻļȱʧʱؿֵ"""
+    index_dir = index_dir or user_index_dir()
+    paths = [os.path.join(index_dir, name) for name in (USER_INDEX_META_FILE, UID_DICTIONARY_FILE, USER_BITMAPS_FILE)]
+    if not all(os.path.exists(path) for path in paths):
+        return {}
+    try:
+        with open(paths[0], encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"ȡλͼԪʧ: {str(e)}")
+        return {}
+
+
+def save_user_index(uid_dictionary, index, fingerprint, watermark=None, index_dir=None):
+    """uidֵλͼ¼ʱݱָ(ģʽˮλ)"""
+    index_dir = index_dir or user_index_dir()
+    meta_path = os.path.join(index_dir, USER_INDEX_META_FILE)
+    # ɾԪݣд;ʧʱʧЧ
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    uid_dictionary.save(os.path.join(index_dir, UID_DICTIONARY_FILE))
+    index.save(os.path.join(index_dir, USER_BITMAPS_FILE))
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump({'fingerprint': fingerprint, 'watermark': watermark}, f, ensure_ascii=False, indent=2)
+    logger.info(f"λͼѱ: {len(uid_dictionary):,} û, {len(index.dates):,} (, Ϊ)λͼ")
+
+
+def current_table_fingerprint():
+    """ӶȡǰݱָƣУλͼʧʱNone"""
+    conn = None
+    try:
+        conn = connect_mysql(max_retries=1)
+        return get_table_fingerprint(conn)
+    except Exception as e:
+        logger.warning(f"ȡݱָʧ: {str(e)}")
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+
+@instrumented("user_index:query")
+def apply_user_index(aggregates, index):
+    """λͼľȷȥؽ滻ۺϽеĶӦ"""
+    start_time = time.time()
+    aggregates['daily_users'] = index.daily_users()
+    aggregates['distinct_users_approx'] = False
+    aggregates['retention_rates'], aggregates['retention_users'] = index.retention()
+    aggregates['funnel_users'] = index.funnel()
+    logger.info(f"λͼѯɣʱ: {time.time() - start_time:.2f}")
+    logger.info(f"©( / ղػӹ / )û: {aggregates['funnel_users']}")
+    return aggregates
+
+
+### 2.4 ת© (ûһΣɨ)
+FUNNEL_STAGES = ('', 'ղ/ӹ', '')
+
+
+def _group_running_max(values, groups, span):
+    """ķۼֵvalues-1ʾȱʧ
+
+    ѷƽƵλһȫnp.maximum.accumulateǰһ
+    ֵԶСںһ㣬˵ȼڷڵۼֵ
+    """
+    offset = groups.astype(np.int64) * (span + 1)
+    return np.maximum.accumulate(offset + values + 1) - offset - 1
+
+
+@instrumented("aggregate:ordered_funnel")
+def compute_ordered_funnel(data, window_days=7, by=None):
+    """޶ʱ䴰ڵ  -> ղ/ӹ ->  ת©
+
+    ֻͬһʵ(ûָbyʱ(û, ))ڰȺ˳ɡ
+    βwindow_daysΪżΪתͬһڵΪ
+    Ϊ©˳ÿղ/ӹ¼ȡ֮ǰһ
+    ÿ¼ȡ֮ǰղ/ӹһӶжǷ
+    㴰ڵΪȫֻһɴۼֵɨ衣
+
+    ֵ: overallΪ׶ʵbreakdownΪĸ׶ʵ
+    ת(byΪNoneʱΪNone)
+    """
+    start_time = time.time()
+    behavior = data['behavior_type_num'].to_numpy()
+    stage = np.select([behavior == 1, (behavior == 2) | (behavior == 3), behavior == 4], [0, 1, 2], -1)
+    keep = (stage >= 0) & data['uid'].notna().to_numpy() & data['visit_date'].notna().to_numpy()
+
+    uid_codes, uids = _column_codes(data['uid'][keep])
+    days = data['visit_date'][keep].to_numpy().astype('datetime64[D]').astype(np.int64)
+    days -= days.min() if len(days) else 0
+    stage = stage[keep].astype(np.int8)
+    span = int(days.max()) + 1 if len(days) else 1
+
+    # ʵ: û(û, )
+    if by is not None:
+        group_codes, group_labels = _column_codes(data[by][keep])
+        entity, entities = pd.factorize(uid_codes.astype(np.int64) * len(group_labels) + group_codes)
+        entity_group = entities % len(group_labels)
+    else:
+        entity, entities = pd.factorize(uid_codes)
+        group_labels = pd.Index(['ȫ'])
+        entity_group = np.zeros(len(entities), dtype=np.int64)
+
+    # һ: ʵ ->  -> ©׶
+    order = np.lexsort((stage, days, entity))
+    entity, days, stage = entity[order], days[order], stage[order]
+
+    # ÿ¼֮ǰ()һ
+    last_browse = _group_running_max(np.where(stage == 0, days, -1), entity, span)
+    # ղ/ӹ¼: һΪ㣬ڲ㵽ڶ׶
+    chain_start = np.where((stage == 1) & (last_browse >= 0) & (days - last_browse <= window_days),
+                           last_browse, -1)
+    # ¼: ȡǰЧղ/ӹΪ
+    best_start = _group_running_max(chain_start, entity, span)
+    converted = (stage == 2) & (best_start >= 0) & (days - best_start <= window_days)
+
+    n_entities = len(entities)
+    reached = np.zeros((n_entities, len(FUNNEL_STAGES)), dtype=bool)
+    reached[entity[stage == 0], 0] = True
+    reached[entity[chain_start >= 0], 1] = True
+    reached[entity[converted], 2] = True
+
+    counts = np.stack([np.bincount(entity_group, weights=reached[:, k], minlength=len(group_labels))
+                       for k in range(len(FUNNEL_STAGES))], axis=1).astype(np.int64)
+    table = pd.DataFrame(counts, index=group_labels, columns=list(FUNNEL_STAGES))
+    table.index.name = by
+    table = table[table.sum(axis=1) > 0]
+
+    def with_rates(frame):
+        frame = frame.copy()
+        browse = frame[''].where(frame[''] > 0)
+        frame['ӹת(%)'] = (frame['ղ/ӹ'] / browse * 100).fillna(0)
+        frame['ת(%)'] = (frame[''] / browse * 100).fillna(0)
+        return frame
+
+    if by is None:
+        overall, breakdown = table.iloc[0], None
+    else:
+        # ©ûͳ: һɼΪû
+        user_reached = np.zeros((len(uids), len(FUNNEL_STAGES)), dtype=bool)
+        entity_uid = entities // len(group_labels)
+        for k in range(len(FUNNEL_STAGES)):
+            user_reached[entity_uid[reached[:, k]], k] = True
+        overall = pd.Series(user_reached.sum(axis=0), index=list(FUNNEL_STAGES))
+        breakdown = with_rates(table).sort_values('', ascending=False)
+
+    logger.info(f"©( {window_days} , : {by or ''})"
+                f": {int(keep.sum()):,}, ʱ: {time.time() - start_time:.2f}")
+    logger.info(f"©׶: {dict(overall.astype(np.int64))}")
+    return {'overall': overall.astype(np.int64), 'breakdown': breakdown, 'window_days': window_days, 'by': by}
+
+
+### 3. Ϊֲӻֱͼ
+def plot_behavior_distribution(aggs):
+    """ʹmatplotlibΪͷֱֲͼ"""
+    load_plotting()
+    try:
+        if not aggs:
+            logger.error(": ЧڻΪֲͼ")
+            return False
+        
+        logger.info("ڻΪͷֱֲͼ...")
+        
+        # ΪǷЧ
+        behavior_counts = aggs.get('behavior_counts')
+        if behavior_counts is None or behavior_counts.empty:
+            logger.error(": ȱΪ")
+            return False
+        
+        plt.figure(figsize=(10, 6))
+        plt.bar(behavior_counts.index, behavior_counts.values, width=0.8,
+                color='lightblue', edgecolor='gray')
+        plt.title('Consumer Behavior Type Distribution')
+        plt.xlabel('Behavior Type (1=Browse, 4=Purchase)')
+        plt.ylabel('Frequency')
+        plt.xticks([1, 2, 3, 4])
+        plt.grid(True, alpha=0.3)
+        
+        # Ŀ¼
+        os.makedirs("output", exist_ok=True)
+        output_path = os.path.join("output", 'behavior_distribution.png')
+        plt.savefig(output_path, dpi=300)
+        plt.close()
+        logger.info(f"Ϊͷֱֲͼɣѱ: {output_path}")
+        return True
+    
+    except ValueError as ve:
+        logger.error(f"ͼݴ: {str(ve)}")
+        return False
+    
+    except RuntimeError as re:
+        logger.error(f"ͼʱ: {str(re)}")
+        return False
+    
+    except Exception as e:
+        logger.error(f"Ϊֲͼʱδ֪: {str(e)}")
+        logger.error(traceback.format_exc())
+        return False
+
+
+### 4. ǰʮƷࣨ״ͼ
+def plot_top_purchased_categories(aggs):
+    """ʹseabornƹǰʮƷ"""
+    load_plotting()
+    try:
+        if not aggs:
+            logger.error(": ЧڻƷͼ")
+            return False
+        
+        logger.info("ڷƹǰʮƷ...")
+        
+        # Ʒ๺ɾۺͳ
+        category_count = aggs.get('category_purchases')
+        if category_count is None:
+            logger.error(": ۺϽȱƷ๺ͳ")
+            return False
+        
+        # Ƿ㹻Ĺ¼
+        if category_count.empty:
+            logger.warning(": ûй¼ڷ")
+            return False
+        
+        # Ƿ㹻ݵ
+        if len(category_count) < 5:
+            logger.warning(f": ֻ {len(category_count)} Ʒ࣬ڽ10")
+        
+        top_count = min(10, len(category_count))
+        category_count = category_count.nlargest(top_count)
+        
+        plt.figure(figsize=(12, 7))
+        ax = sns.barplot(x=category_count.index.astype(str), y=category_count.values, color='green')
+        plt.title('Top 10 Purchased Categories')
+        plt.xlabel('product category')
+        plt.ylabel('purchase count')
+        plt.xticks(rotation=45, ha='right')
+        plt.grid(True, alpha=0.3)
+        
+        # Ϊÿֵǩ
+        for i, v in enumerate(category_count.values):
+            ax.text(i, v + 0.05 * max(category_count.values), f'{v}', ha='center', fontsize=9)
+        
+        # Ŀ¼
+        os.makedirs("output", exist_ok=True)
+        output_path = os.path.join("output", 'top_categories.png')
+        plt.savefig(output_path, dpi=300)
+        plt.close()
+        logger.info(f"ǰʮƷ״ͼɣѱ: {output_path}")
+        return True
+    
+    except Exception as e:
+        logger.error(f"Ʒͼʱ: {str(e)}")
+        logger.error(traceback.format_exc())
+        return False
+
+
+### 5. ·Ϊֱͼ- ޸
+def plot_monthly_behavior(aggs):
+    """ʹ÷״ͼΪֲ¶ȾۺϽ"""
+    load_plotting()
+    try:
+        if not aggs:
+            logger.error(": Чڻ¶Ϊֲͼ")
+            return False
+        
+        logger.info("ڻƸ·Ϊֱֲͼ...")
+        
+        month_behavior = aggs.get('month_behavior')
+        if month_behavior is None or month_behavior.empty:
+            logger.error(": ۺϽȱ¶Ϊͳ")
+            return False
+        
+        # ·ǷЧ
+        valid_months = month_behavior.index
+        if len(valid_months) < 2:
+            logger.warning(f": ֻ {len(valid_months)} ·ݵݣܲʺϷ")
+        
+        # ÿ3ͼ
+        ncols = min(3, len(valid_months))
+        nrows = int(np.ceil(len(valid_months) / ncols))
+        fig, axes = plt.subplots(nrows, ncols, figsize=(6 * ncols, 5 * nrows),
+                                 sharey=True, squeeze=False)
+        for ax, month in zip(axes.flat, valid_months):
+            counts = month_behavior.loc[month]
+            ax.bar(counts.index, counts.values, width=0.8, color='lightgreen', edgecolor='gray')
+            ax.set_title(f'month = {month}')
+            ax.set_xticks(list(counts.index))
+            ax.set_xlabel("Behavior Type (1=Browse, 4=Purchase)")
+            ax.set_ylabel("Frequency")
+        for ax in list(axes.flat)[len(valid_months):]:
+            ax.set_visible(False)
+        
+        # ܱⲢͼ
+        fig.suptitle('Monthly Consumer Behavior Distribution', y=1.05)
+        plt.tight_layout()
+        
+        # Ŀ¼
+        os.makedirs("output", exist_ok=True)
+        output_path = os.path.join("output", 'monthly_behavior.png')
+        fig.savefig(output_path, dpi=300, bbox_inches='tight')
+        plt.close(fig)
+        logger.info(f"·Ϊֱֲͼɣѱ: {output_path}")
+        return True
+    
+    except Exception as e:
+        logger.error(f"¶Ϊֲͼʱ: {str(e)}")
+        logger.error(traceback.format_exc())
+        return False
+
+
+### 6. ʡݹͼӻ
+def plot_province_purchase(aggs):
+    """ʹpyechartsƸʡݹͼ"""
+    from pyecharts import options as opts
+    from pyecharts.charts import Map
+    from pyecharts.globals import CurrentConfig
+    try:
+        # pyechartsȫ
+        if selected_font:
+            CurrentConfig.GLOBAL_FONT = selected_font
+        
+        # עͼԴհ׵ͼ⣩
+        try:
+            from pyecharts.datasets import register_url
+            # ʹߵͼ
+            register_url("https://echarts-maps.github.io/echarts-china-counties-js/")
+            logger.info("ɹߵͼԴ")
+        except Exception as e:
+            logger.warning(f"޷ߵͼԴ: {str(e)}ʹõͼ")
+        
+        if not aggs:
+            logger.error(": Чڻʡݹͼ")
+            return False
+        
+        logger.info("ڷʡݹƵͼ...")
+        
+        # ʡݹɾۺͳ
+        province_purchases = aggs.get('province_purchases')
+        if province_purchases is None:
+            logger.error(": ۺϽȱʡݹͳ")
+            return False
+        
+        # Ƿ㹻Ĺ¼
+        if province_purchases.empty:
+            logger.warning(": ûй¼ڷ")
+            return False
+        
+        province_count = province_purchases.rename_axis('province').reset_index(name='count')
+        province_count['province'] = province_count['province'].astype(object)
+        
+        # ʡǷЧ
+        if province_count['province'].isna().any():
+            logger.warning(": ڿʡݼ¼ѹ")
+            province_count = province_count.dropna(subset=['province'])
+        
+        # ׼ʡ
+        province_mapping = {
+            '': '', 'Ϻ': 'Ϻ', '': '', '': '',
+            'ӱ': 'ӱʡ', 'ɽ': 'ɽʡ', '': 'ʡ', '': 'ʡ',
+            '': 'ʡ', '': 'ʡ', '㽭': '㽭ʡ', '': 'ʡ',
+            '': 'ʡ', '': 'ʡ', 'ɽ': 'ɽʡ', '': 'ʡ',
+            '': 'ʡ', '': 'ʡ', '㶫': '㶫ʡ', '': 'ʡ',
+            'Ĵ': 'Ĵʡ', '': 'ʡ', '': 'ʡ', '': 'ʡ',
+            '': 'ʡ', 'ຣ': 'ຣʡ', '̨': '̨ʡ',
+            'ɹ': 'ɹ', '': '׳', '': '',
+            '': 'Ļ', '½': '½ά',
+            '': 'ر', '': 'ر'
+        }
+        
+        province_count['province'] = province_count['province'].map(province_mapping).fillna(province_count['province'])
+        
+        # תΪpyechartsҪݸʽ
+        map_data = [[prov, int(count)] for prov, count in zip(province_count['province'], province_count['count'])]
+        
+        # ͼ
+        min_value = int(province_count['count'].min())
+        max_value = int(province_count['count'].max())
+        
+        # ֵΪ0
+        if min_value == max_value == 0:
+            min_value, max_value = 0, 1  # 
+        
+        china_map = (
+            Map()
+            .add("", map_data, "china", is_map_symbol_show=False)
+            .set_global_opts(
+                title_opts=opts.TitleOpts(title="ʡݹֲ"),
+                visualmap_opts=opts.VisualMapOpts(
+                    min_=min_value,
+                    max_=max_value,
+                    range_text=["Low", "High"],
+                    range_color=["lightblue", "red"],
+                    orient="vertical",
+                    pos_right="10%",
+                    pos_top="center"
+                )
+            )
+        )
+        
+        # Ŀ¼
+        os.makedirs("output", exist_ok=True)
+        output_path = os.path.join("output", "province_purchase_map.html")
+        china_map.render(output_path)
+        logger.info(f"ʡݹͼɣѱ: {output_path}")
+        return True
+    
+    except Exception as e:
+        logger.error(f"ʡݹͼʱ: {str(e)}")
+        logger.error(traceback.format_exc())
+        return False
+
+
+### 7. ÿûΪƷͼ
+def plot_daily_behavior_trend(aggs):
+    """ʹmatplotlibÿոΪ"""
+    load_plotting()
+    try:
+        if not aggs:
+            logger.error(": ЧڻÿΪͼ")
+            return False
+        
+        logger.info("ڷÿûΪ...")
+        
+        #  x Ϊ͵ȥûɾۺͳ
+        daily_trend_pivot = aggs.get('daily_users')
+        if daily_trend_pivot is None:
+            logger.error(": ۺϽȱÿȥûͳ")
+            return False
+        
+        # Ƿ㹻ݵ
+        data_points = int((daily_trend_pivot > 0).to_numpy().sum())
+        if data_points < 5:
+            logger.warning(f": ֻ {data_points} ݵ㣬ܲʺƷ")
+        
+        # ǷΪ
+        if daily_trend_pivot.empty:
+            logger.warning(": û㹻ݴͼ")
+            return False
+        
+        plt.figure(figsize=(14, 7))
+        
+        # ȡΪ
+        behavior_types = sorted(daily_trend_pivot.columns)
+        
+        # ΪÿΪͻ
+        for behavior in behavior_types:
+            if behavior in daily_trend_pivot.columns:
+                plt.plot(daily_trend_pivot.index.astype(str), daily_trend_pivot[behavior], 
+                         marker='o', label=f'Behavior {behavior}')
+        
+        plt.title('Daily User Behavior Trend')
+        plt.xlabel('Date')
+        if aggs.get('distinct_users_approx'):
+            plt.ylabel('User Count (Distinct Uid, HyperLogLog estimate)')
+        else:
+            plt.ylabel('User Count (Distinct Uid)')
+        plt.legend(title='Behavior Type')
+        plt.grid(True, alpha=0.3)
+        plt.xticks(rotation=45, ha='right')
+        
+        # Ŀ¼
+        os.makedirs("output", exist_ok=True)
+        output_path = os.path.join("output", 'daily_behavior_trend.png')
+        plt.savefig(output_path, dpi=300)
+        plt.close()
+        logger.info(f"ÿΪƷɣѱ: {output_path}")
+        return True
+    
+    except Exception as e:
+        logger.error(f"ÿΪͼʱ: {str(e)}")
+        logger.error(traceback.format_exc())
+        return False
+
+
+### 8. ƷΪ͹ͼ
+def plot_category_behavior_correlation(aggs):
+    """ʹseabornƷΪ͹ͼ"""
+    load_plotting()
+    try:
+        if not aggs:
+            logger.error(": ЧڻƷͼ")
+            return False
+        
+        logger.info("ڷƷΪ͹...")
+        
+        # Ʒ x Ϊ͵Ľɾۺͳ
+        category_behavior_pivot = aggs.get('category_behavior')
+        if category_behavior_pivot is None:
+            logger.error(": ۺϽȱƷΪͳ")
+            return False
+        
+        # Ƿ㹻ݵ
+        data_points = int((category_behavior_pivot > 0).to_numpy().sum())
+        if data_points < 10:
+            logger.warning(f": ֻ {data_points} ݵ㣬ܲʺͼ")
+        
+        # Ƿ㹻
+        if category_behavior_pivot.empty or category_behavior_pivot.shape[0] < 5:
+            logger.warning(": û㹻ݴͼ")
+            return False
+        
+        # ѡΪǰ20Ʒ
+        top_categories = category_behavior_pivot.sum(axis=1).nlargest(20).index
+        category_behavior_pivot = category_behavior_pivot.loc[top_categories]
+        
+        plt.figure(figsize=(15, 10))
+        sns.heatmap(category_behavior_pivot, annot=True, fmt='g', cmap='YlGnBu', 
+                   cbar_kws={'label': 'Ϊ'}, annot_kws={'size': 8})
+        plt.title('Category and Behavior Type Correlation Heatmap')
+        plt.xlabel('behavior type (1=Browse, 4=Purchase)')
+        plt.ylabel('category id')
+        
+        # Ŀ¼
+        os.makedirs("output", exist_ok=True)
+        output_path = os.path.join("output", 'category_behavior_heatmap.png')
+        plt.savefig(output_path, dpi=300)
+        plt.close()
+        logger.info(f"ƷΪɣѱ: {output_path}")
+        return True
+    
+    except Exception as e:
+        logger.error(f"Ʒͼʱ: {str(e)}")
+        logger.error(traceback.format_exc())
+        return False
+
+
+### 9. û
+def plot_user_retention(aggs):
+    """ûӻ"""
+    load_plotting()
+    try:
+        if not aggs:
+            logger.error(": Чû")
+            return False
+        
+        logger.info("ڽû...")
+        
+        # ɾۺ
+        retention_rates = aggs.get('retention_rates')
+        if retention_rates is None:
+            logger.error(": ۺϽȱ")
+            return False
+        
+        # Ƿ㹻û
+        unique_users = aggs.get('retention_users', 0)
+        if unique_users < 100:
+            logger.warning(f": ֻ {unique_users} ûܲ׼ȷ")
+        
+        # Ƿ㹻ݵ
+        if retention_rates.empty:
+            logger.warning(": û㹻ݼ")
+            return False
+        
+        plt.figure(figsize=(12, 6))
+        plt.plot(retention_rates.index, retention_rates.values, marker='o', color='red')
+        plt.axhline(y=50, color='gray', linestyle='--', alpha=0.5)
+        plt.title('User Retention Rate Over 30 Days')
+        plt.xlabel('Days Since First Visit')
+        plt.ylabel('Retention Rate (%)')
+        plt.grid(True, alpha=0.3)
+        plt.ylim(0, 105)  # ȷٷֱʾ
+        
+        # ǹؼ
+        key_days = [0, 1, 3, 7, 14, 30]
+        for day in key_days:
+            if day in retention_rates.index:
+                plt.text(day, retention_rates[day] + 2, f'{retention_rates[day]:.1f}%', ha='center')
+        
+        # Ŀ¼
+        os.makedirs("output", exist_ok=True)
+        output_path = os.path.join("output", 'user_retention.png')
+        plt.savefig(output_path, dpi=300)
+        plt.close()
+        logger.info(f"ûɣѱ: {output_path}")
+        return True
+    
+    except Exception as e:
+        logger.error(f"ûз: {str(e)}")
+        logger.error(traceback.format_exc())
+        return False
+
+
+### 9.1 ת©
+def plot_ordered_funnel(aggs):
+    """ӻת©ת"""
+    load_plotting()
+    try:
+        funnel = aggs.get('ordered_funnel') if aggs else None
+        if not funnel:
+            logger.error(": ۺϽȱ©")
+            return False
+        
+        logger.info("ڽת©...")
+        overall = funnel['overall']
+        breakdown = funnel['breakdown']
+        if overall.iloc[0] == 0:
+            logger.warning(": ûΪ޷©")
+            return False
+        
+        n_cols = 1 if breakdown is None else 2
+        fig, axes = plt.subplots(1, n_cols, figsize=(8 * n_cols, 6), squeeze=False)
+        
+        # ©: ׶׶εı
+        ax = axes[0][0]
+        stages = ['Browse', 'Fav/Cart', 'Purchase']
+        ax.barh(stages[::-1], overall.values[::-1], color=sns.color_palette('Blues_d', len(stages)))
+        for i, value in enumerate(overall.values[::-1]):
+            ax.text(value, i, f' {value:,} ({value / overall.iloc[0] * 100:.1f}%)', va='center')
+        ax.set_xlim(0, overall.iloc[0] * 1.3)  # Ϊֵעռ
+        ax.set_title(f"Ordered Conversion Funnel (window {funnel['window_days']} days)")
+        ax.set_xlabel('Users')
+        
+        # 鹺ת: ȡǰ15
+        if breakdown is not None:
+            ax = axes[0][1]
+            top = breakdown.head(15)
+            sns.barplot(x=top['ת(%)'].values, y=top.index.astype(str), ax=ax, color='seagreen')
+            ax.set_title(f"Purchase Conversion by {funnel['by']} (top 15 by browse users)")
+            ax.set_xlabel('Conversion Rate (%)')
+            ax.set_ylabel(funnel['by'])
+        
+        plt.tight_layout()
+        
+        # Ŀ¼
+        os.makedirs("output", exist_ok=True)
+        output_path = os.path.join("output", 'ordered_funnel.png')
+        plt.savefig(output_path, dpi=300)
+        plt.close()
+        # δʱд©֤ļ̶(ȾݴȷȻ)
+        table_path = os.path.join("output", 'ordered_funnel.csv')
+        table = breakdown if breakdown is not None else overall.rename('û').to_frame()
+        table.to_csv(table_path, encoding='utf-8-sig')
+        logger.info(f"©ϸѱ: {table_path}")
+        logger.info(f"ת©ɣѱ: {output_path}")
+        return True
+    
+    except Exception as e:
+        logger.error(f"ת©з: {str(e)}")
+        logger.error(traceback.format_exc())
+        return False
+
+
+### 9.2 ѰַͼȾ (ۺͼĹϣ¼output/嵥)
+CHART_MANIFEST_PATH = os.path.join("output", "chart_manifest.json")
+
+# ͼдļȷȾʱȻ
+CHART_OUTPUTS = {
+    'plot_behavior_distribution': ['behavior_distribution.png'],
+    'plot_top_purchased_categories': ['top_categories.png'],
+    'plot_monthly_behavior': ['monthly_behavior.png'],
+    'plot_province_purchase': ['province_purchase_map.html'],
+    'plot_daily_behavior_trend': ['daily_behavior_trend.png'],
+    'plot_category_behavior_correlation': ['category_behavior_heatmap.png'],
+    'plot_user_retention': ['user_retention.png'],
+    'plot_ordered_funnel': ['ordered_funnel.png', 'ordered_funnel.csv'],
+}
+
+
+def _hash_chart_input(value, digest):
+    """ѾۺϽ(DataFrame/Series/ֵ/Ƕ)ȶдϣ"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest.update(type(value).__name__.encode())
+        if isinstance(value, pd.DataFrame):
+            digest.update(repr([(c, str(t)) for c, t in value.dtypes.items()]).encode())
+        else:
+            digest.update(repr((value.name, str(value.dtype))).encode())
+        digest.update(repr(list(value.index.names)).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, dict):
+        digest.update(b'{')
+        for key in sorted(value, key=repr):
+            digest.update(repr(key).encode())
+            _hash_chart_input(value[key], digest)
+        digest.update(b'}')
+    elif isinstance(value, (list, tuple)):
+        digest.update(b'[')
+        for item in value:
+            _hash_chart_input(item, digest)
+        digest.update(b']')
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.dtype.str, value.shape)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    else:
+        digest.update(repr(value).encode())
+
+
+def _chart_code(task_func):
+    """ͼֱӻӵõıģ麯(load_plottingʽõ)
+    ԼȾӽ̵ĳʼ"""
+    found = {}
+    pending = [task_func, _init_render_worker]
+    while pending:
+        func = pending.pop()
+        if func.__qualname__ in found:
+            continue
+        found[func.__qualname__] = func
+        codes = [func.__code__]
+        while codes:
+            code = codes.pop()
+            codes.extend(c for c in code.co_consts if inspect.iscode(c))
+            for name in code.co_names:
+                ref = func.__globals__.get(name)
+                if inspect.isfunction(ref) and ref.__module__ == func.__module__:
+                    pending.append(ref)
+    return [found[name] for name in sorted(found)]
+
+
+def chart_cache_key(task_func, inputs):
+    """ͼݹϣ: ͼõĸԴ(dpiɫͼѡ)ۺ"""
+    digest = hashlib.sha256()
+    for func in _chart_code(task_func):
+        try:
+            digest.update(inspect.getsource(func).encode())
+        except (OSError, TypeError):
+            digest.update(func.__qualname__.encode())
+    _hash_chart_input(inputs, digest)
+    return digest.hexdigest()
+
+
+def chart_is_current(entry, key, task_func):
+    if not entry or entry.get('hash') != key:
+        return False
+    outputs = CHART_OUTPUTS.get(task_func.__name__, [])
+    return all(os.path.exists(os.path.join("output", name)) for name in outputs)
+
+
+def load_chart_manifest(path=CHART_MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"ͼ嵥ȡʧܣȾȫͼ: {str(e)}")
+        return {}
+
+
+def save_chart_manifest(manifest, path=CHART_MANIFEST_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+### 9.3 ͼȾ (ֶ֧̲)
+def _init_render_worker():
+    """Ⱦӽ̳ʼʹ÷ǽʽAgg"""
+    if plt is None:
+        load_plotting(backend='Agg')
+    else:
+        plt.switch_backend('Agg')
+
+
+def _render_chart_task(task_name, task_func, inputs):
+    """ִеͼ񣬷(, ʱ, Ϣ, CPUʱ, ֵRSS, RSS)
+
+    ͼڲ¼󣬷Trueʾд෵ֵΪʧܣ
+    дͼ嵥(ļ½)
+
+    Ⱦӽִʱӽв豣cProfile
+    ֵ̻ܱܽ档
+    """
+    in_worker = multiprocessing.parent_process() is not None
+    profiler = None
+    if METRICS.profile_dir and in_worker:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    # Ⱦӽִ̻жÿ񵥶ֵRSS
+    rss_start = psutil.Process().memory_info().rss / (1024 ** 2)
+    lifetime_peak_start = _peak_rss_mb()
+    rss_window = in_worker and _reset_peak_rss()
+    start_time, cpu_start = time.time(), time.process_time()
+    error = None
+    try:
+        if task_func(inputs) is not True:
+            error = "ͼδ(Ϸ־)"
+    except Exception as e:
+        error = f"{str(e)}\n{traceback.format_exc()}"
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(METRICS.profile_path(f"render:{task_name}"))
+    if rss_window:
+        peak = _window_peak_rss_mb()
+        growth = peak - rss_start
+    else:
+        peak = _peak_rss_mb()
+        growth = peak - lifetime_peak_start
+    return task_name, time.time() - start_time, error, time.process_time() - cpu_start, peak, growth
+
+
+def run_chart_tasks(tasks, jobs=1, force=False, manifest_path=CHART_MANIFEST_PATH):
+    """ִͼбÿֻľۺϽ
+
+    tasksÿΪ(, ͼ, ֵ)jobs>1ʱڽ̳вȾ
+    ʧܲӰͼĹϣ嵥¼һ¡
+    ļʱȾforce=TrueʱȫȾ
+    """
+    manifest = load_chart_manifest(manifest_path)
+    keys = {task_name: chart_cache_key(task_func, inputs) for task_name, task_func, inputs in tasks}
+    if not force:
+        unchanged = [t for t in tasks if chart_is_current(manifest.get(t[0]), keys[t[0]], t[1])]
+        if unchanged:
+            logger.info(f"ͼδ仯Ⱦ: {[t[0] for t in unchanged]}")
+            tasks = [t for t in tasks if t not in unchanged]
+    funcs = {task_name: task_func for task_name, task_func, _ in tasks}
+
+    def report(task_name, elapsed, error):
+        if error is None:
+            logger.info(f"{'='*30} : {task_name} [ʱ: {elapsed:.2f}] {'='*30}")
+            manifest[task_name] = {'hash': keys[task_name],
+                                   'outputs': CHART_OUTPUTS.get(funcs[task_name].__name__, []),
+                                   'rendered_at': datetime.now().isoformat(timespec='seconds')}
+        else:
+            logger.error(f" '{task_name}' ִʧ: {error}")
+            logger.info(f" '{task_name}'ִк")
+            manifest.pop(task_name, None)
+
+    try:
+        _run_chart_tasks(tasks, jobs, report)
+    finally:
+        if tasks:
+            save_chart_manifest(manifest, manifest_path)
+
+
+def _run_chart_tasks(tasks, jobs, report):
+    if jobs <= 1 or len(tasks) <= 1:
+        for task_name, task_func, inputs in tasks:
+            logger.info(f"{'='*30} ʼ: {task_name} {'='*30}")
+            with METRICS.stage(f"render:{task_name}"):
+                result = _render_chart_task(task_name, task_func, inputs)
+            report(*result[:3])
+        return
+
+    # Linuxʹforkӽµű(ظʼ־)
+    method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+    workers = min(jobs, len(tasks))
+    logger.info(f"ʹ {workers} ̲Ⱦ {len(tasks)} ͼ")
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context(method),
+                             initializer=_init_render_worker) as executor:
+        futures = {}
+        for task_name, task_func, inputs in tasks:
+            logger.info(f"{'='*30} ʼ: {task_name} {'='*30}")
+            futures[executor.submit(_render_chart_task, task_name, task_func, inputs)] = task_name
+        for future in as_completed(futures):
+            try:
+                task_name, elapsed, error, cpu, peak_rss, rss_growth = future.result()
+                METRICS.add(f"render:{task_name}", elapsed, cpu, peak_rss_mb=peak_rss, rss_growth_mb=rss_growth)
+                report(task_name, elapsed, error)
+            except Exception as e:
+                # ӽ̱޷ڲĴ
+                report(futures[future], 0.0, str(e))
+
+
+### 10.  (ӴݼŻ)
+def main():
+    # ȼؼ (ֻǷװͼִͼʱŵ)
+    logger.info("ؼ...")
+    missing_modules = [m for m in ('pymysql', 'pandas', 'seaborn', 'pyecharts')
+                       if importlib.util.find_spec(m) is None]
+    if not missing_modules:
+        logger.info("бѰװ")
+    else:
+        missing_module = ", ".join(missing_modules)
+        logger.error(f"ȱٹؼ: {missing_module}")
+        logger.error("ִװ:")
+        logger.error("pip install pymysql pandas seaborn pyecharts psutil")
+        return  # ˳
+
+    parser = argparse.ArgumentParser(description='ûΪݷ')
+    parser.add_argument('--aggregate', action='store_true', help='ʹԤۺϲѯŻݼ')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='ֿȡС(Ĭɼع滮ʽȡʱԶ)')
+    parser.add_argument('--stream', action='store_true', help='ʽۺģʽ۵ݣڴռС޹')
+    parser.add_argument('--typed-fetch', action='store_true', help='ʹ÷αֱӶȡΪͻ(ֵ俪)')
+    parser.add_argument('--refresh', action='store_true', help='Աؿգ´ݿȡ¿')
+    parser.add_argument('--no-cache', action='store_true', help='ȡҲд뱾ؿ')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='жȡ߳/(ĬMySQLΪ1ɼزԾȡʽHBaseΪ4)')
+    parser.add_argument('--partition-by', choices=['id', 'visit_date'], default='id', help='жȡʱķ')
+    parser.add_argument('--range-size', type=int, default=500000,
+                        help='ÿȡΧĴС(idʱΪidvisit_dateʱΪ)')
+    parser.add_argument('--jobs', type=int, default=None, help='ȾͼĽ(Ĭ1)')
+    parser.add_argument('--force-render', action='store_true', help='ͼ嵥Ⱦȫͼ')
+    parser.add_argument('--profile', action='store_true', help='Ϊÿ׶αcProfile(logs/profile_<ʱ>/)')
+    parser.add_argument('--no-tracemalloc', action='store_true', help='¼tracemallocֵ(ڴ俪)')
+    parser.add_argument('--memory-fraction', type=float, default=0.6, help='ع滮ʹõĿڴ(Ĭ0.6)')
+    parser.add_argument('--incremental', action='store_true', help='ģʽֻȡϴˮλ֮(--refreshȫؽ)')
+    parser.add_argument('--pushdown', action='store_true',
+                        help='ۺģʽͼGROUP BYMySQLִУֻؾۺϽ')
+    parser.add_argument('--pushdown-retention', action='store_true',
+                        help='ģʽ»˶ȡ(û, )ϼ(ӽ)')
+    parser.add_argument('--pushdown-funnel', action='store_true',
+                        help='ģʽ»˶ȡԭʼм©(ӽ)')
+    parser.add_argument('--funnel-window', type=int, default=7, help='©ʱ䴰(Ĭ7)')
+    parser.add_argument('--funnel-by', choices=['none', 'category', 'province'], default='category',
+                        help='©ķά(ĬϰƷ)')
+    parser.add_argument('--user-index', action='store_true',
+                        help='ά־ûuidֵ(, Ϊ)ûλͼȥû//©λͼ')
+    parser.add_argument('--source', choices=['mysql', 'hbase'], default='mysql',
+                        help='ϸԴ(hbase: regionɨHBaseռMySQLʵ)')
+    parser.add_argument('--hbase-host', default=HBASE_CONFIG['host'], help='HBase Thriftַ')
+    parser.add_argument('--hbase-port', type=int, default=HBASE_CONFIG['port'], help='HBase Thrift˿')
+    parser.add_argument('--hbase-table', default=HBASE_CONFIG['table'], help='HBase(ĬMySQLͬ)')
+    parser.add_argument('--hbase-layout', default=None, help='hbase-splits.pyɵĲļ(δԤʱͰзɨ)')
+    parser.add_argument('--scanner-caching', type=int, default=HBASE_SCANNER_CACHING,
+                        help=f'HBaseɨÿRPCص(Ĭ{HBASE_SCANNER_CACHING})')
+    parser.add_argument('--scan-batching', type=int, default=None, help='HBaseɨÿRPCصԪ(Ĭϲ)')
+    args = parser.parse_args()
+    
+    logger.info("="*70)
+    logger.info(f"{'ûΪݷ':^70}")
+    logger.info(f"{': ':<20} Դ={args.source}, Ԥۺ={args.aggregate}, ֿС={args.chunk_size}, ʽ={args.stream}")
+    logger.info("="*70)
+    
+    # : ׶ָڳʱд logs/metrics_<ʱ>.json
+    METRICS.enable(trace_memory=not args.no_tracemalloc,
+                   profile_dir=os.path.join("logs", f"profile_{RUN_TIMESTAMP}") if args.profile else None)
+    
+    try:
+        if args.source == 'hbase':
+            # ԤۺϡʽƾMySQL˲ѯHBaseԴֻȫɨ
+            mysql_only = [flag for flag in ('aggregate', 'stream', 'incremental', 'pushdown') if getattr(args, flag)]
+            if mysql_only:
+                logger.warning(f"HBaseԴ֧ {['--' + f for f in mysql_only]}Ѻ")
+                for flag in mysql_only:
+                    setattr(args, flag, False)
+        
+        # 0. ع滮: ݿڴ桢ʵÿֽCPUѡ(ģʽHBaseԴҪ)
+        plan = None
+        if not args.pushdown and args.source == 'mysql':
+            try:
+                plan = make_load_plan(memory_fraction=args.memory_fraction)
+            except Exception as e:
+                logger.warning(f"ɼع滮ʧ({str(e)})ʹĬϲ")
+        chunk_size = args.chunk_size or (plan['chunk_size'] if plan else 100000)
+        # жȡ/Ⱦʽɹ滮ĲԾȡʽ(ӡͻֿȡ)
+        workers = args.workers or (4 if args.source == 'hbase' else plan['workers'] if plan else 1)
+        jobs = args.jobs or (plan['jobs'] if plan else 1)
+        # δʽָСʱʽȡʵڴ
+        adaptive = args.chunk_size is None
+        explicit_mode = args.aggregate or args.stream or args.incremental
+        stream_mode = args.stream or (not explicit_mode and plan is not None and plan['strategy'] == 'stream')
+        
+        # λͼ: ģʽۺ״̬ͬۼӲ棬ģʽ--refreshݱ仯ʱؽ
+        user_index = load_user_index(rebuild=args.refresh) if args.user_index else None
+        index_updated = user_index is not None
+        index_fingerprint = None
+        if user_index is not None and not args.incremental:
+            # ڶȡ֮ǰȡָƣȡڼдʹ´ʱжΪ
+            index_fingerprint = current_table_fingerprint() if args.source == 'mysql' else None
+            if load_user_index_meta().get('fingerprint') != index_fingerprint:
+                if len(user_index[1].dates):
+                    logger.info("λͼ뵱ǰݱһ£ʹѱ")
+                user_index[1].clear()
+        funnel_by = {'none': None, 'category': 'item_category', 'province': 'province'}[args.funnel_by]
+        
+        if args.pushdown:
+            # 1-3. ۺݿɣ©ֻʽʱΪȡ
+            logger.info(">>> 1-3: ۺƵMySQLִ")
+            aggregates = pushdown_aggregates_from_mysql(funnel_window=args.funnel_window, funnel_by=funnel_by,
+                                                        with_retention=args.pushdown_retention,
+                                                        with_funnel=args.pushdown_funnel)
+            if aggregates is None:
+                logger.error("ۺʧܣ˳")
+                return
+            index_updated = False
+        elif args.incremental:
+            # 1-3. ȡУϲ־ûľۺ״̬
+            logger.info(">>> 1-3: ˢ¾ۺϽ")
+            aggregates = incremental_aggregates_from_mysql(chunk_size=chunk_size, rebuild=args.refresh,
+                                                           user_index=user_index, adaptive=adaptive)
+            if aggregates is None:
+                logger.error("ˢʧܣ˳")
+                return
+            # λͼۺ״̬һ
+            index_updated = False
+        elif stream_mode:
+            # 1-3. ʽȡݣ۵ΪۺϽ
+            logger.info(">>> 1-3: ʽȡݲۺϽ")
+            with_retention = plan['with_retention'] if plan and not args.stream else True
+            aggregates = stream_aggregates_from_mysql(chunk_size=chunk_size, with_retention=with_retention,
+                                                      user_index=user_index, adaptive=adaptive)
+            if aggregates is None:
+                logger.error("ʽۺʧܣ˳")
+                return
+        else:
+            # 1. ȡ
+            if args.source == 'hbase':
+                logger.info(">>> 1: HBaseɨ")
+                data = get_data_from_hbase(
+                    table=args.hbase_table,
+                    host=args.hbase_host,
+                    port=args.hbase_port,
+                    workers=workers,
+                    scanner_caching=args.scanner_caching,
+                    scan_batching=args.scan_batching,
+                    layout=args.hbase_layout
+                )
+            else:
+                logger.info(">>> 1: ݿȡ")
+                data = get_data_from_mysql(
+                    use_aggregated_query=args.aggregate, 
+                    chunk_size=chunk_size,
+                    typed_fetch=args.typed_fetch,
+                    use_cache=not args.no_cache,
+                    refresh_cache=args.refresh,
+                    workers=workers,
+                    partition_by=args.partition_by,
+                    range_size=args.range_size,
+                    plan=plan
+                )
+            if data is None or len(data) == 0:
+                logger.error("ݻȡʧܣ˳")
+                return
+            
+            if isinstance(data, dict):
+                # Ԥۺģʽݿ˵õۺϽ (λͼֻʹѱ)
+                aggregates = data
+                index_updated = False
+            else:
+                # 2. Ԥ
+                logger.info(">>> 2: Ԥ")
+                processed_data = preprocess_data(data)
+                if processed_data is None or processed_data.empty:
+                    logger.error("Ԥʧܣ˳")
+                    return
+                
+                # 3. һαͼľۺϽ (ΪԸӶȣݼִͬ)
+                logger.info(">>> 3: 㹲ۺϽ")
+                aggregates = compute_aggregates(processed_data)
+                
+                # ©ҪûΪУֻȫȡʱ
+                aggregates['ordered_funnel'] = compute_ordered_funnel(
+                    processed_data, window_days=args.funnel_window, by=funnel_by)
+                if user_index is not None:
+                    update_user_index(processed_data, user_index[1], user_index[0])
+                # ͼֻۺϽͷԭʼ
+                del data, processed_data
+        
+        if user_index is not None:
+            # ȥû©λͼ
+            if index_updated:
+                save_user_index(*user_index, fingerprint=index_fingerprint)
+            if len(user_index[1].dates):
+                aggregates = apply_user_index(aggregates, user_index[1])
+            else:
+                logger.warning("λͼΪգڷԤۺģʽԽ")
+        
+        # 4. ִиӻ (ݹģ)
+        logger.info(">>> 4: ʼݷӻ")
+        
+        # б: (, ͼ, ۺϽ)
+        analysis_tasks = [
+            ("Ϊͷֲ", plot_behavior_distribution, ['behavior_counts']),
+            ("Ʒ", plot_top_purchased_categories, ['category_purchases']),
+            ("¶Ϊ", plot_monthly_behavior, ['month_behavior']),
+            ("ʡݹ", plot_province_purchase, ['province_purchases']),
+            ("ÿΪ", plot_daily_behavior_trend, ['daily_users', 'distinct_users_approx']),
+            ("ƷΪ", plot_category_behavior_correlation, ['category_behavior']),
+            ("û", plot_user_retention, ['retention_rates', 'retention_users']),
+            ("ת©", plot_ordered_funnel, ['ordered_funnel'])
+        ]
+        
+        # Ԥۺ/ʽģʽûûݣȱ
+        skip_tasks = []
+        if aggregates.get('retention_rates') is None:
+            logger.warning("ǰģʽûݣ")
+            skip_tasks.append("û")
+        if aggregates.get('ordered_funnel') is None:
+            logger.warning("ǰģʽûûΪУ©")
+            skip_tasks.append("ת©")
+        if skip_tasks:
+            analysis_tasks = [t for t in analysis_tasks if t[0] not in skip_tasks]
+            logger.info(f"ִе: {[t[0] for t in analysis_tasks]}")
+        
+        # ִ (ÿֻҪСģۺϽ)
+        run_chart_tasks(
+            [(name, func, {key: aggregates.get(key) for key in keys}) for name, func, keys in analysis_tasks],
+            jobs=jobs,
+            force=args.force_render
+        )
+        
+        logger.info("="*70)
+        logger.info(f"{'ݷ':^70}")
+        logger.info("="*70)
+    
+    except KeyboardInterrupt:
+        logger.warning("ûж")
+    
+    except Exception as e:
+        logger.error(f"δ쳣: {str(e)}")
+        logger.error(traceback.format_exc())
+        logger.error("쳣ֹ")
+    
+    finally:
+        # ǰ
+        if plt is not None:
+            plt.close('all')  # رmatplotlibͼ
+        try:
+            METRICS.write_report(os.path.join("logs", f"metrics_{RUN_TIMESTAMP}.json"))
+        except Exception as e:
+            logger.warning(f"дָ걨ʧ: {str(e)}")
+        logger.info("ִн")
+
+
+def run(table):
+    """: ָݱ"""
+    set_table(table)
+    # ϵͳԴ
+    logger.info(f"ϵͳڴ: {psutil.virtual_memory().total / (1024 ** 3):.2f} GB")
+    logger.info(f"CPU: {psutil.cpu_count()}")
+    logger.info(f"Python汾: {sys.version}")
+    logger.info(f"ݱ: {TABLE}")
+    
+    main()
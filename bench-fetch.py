@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""MySQL读取路径基准测试：pd.read_sql(DictCursor) 对比 服务端游标类型化读取
+
+每种读取方式在独立子进程中运行，分别统计吞吐(行/秒)与进程峰值RSS。
+用法: python3 bench-fetch.py [--table raw_user_action] [--limit N] [--batch-size N]
+"""
+import argparse
+import json
+import multiprocessing as mp
+import resource
+import sys
+import time
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存(MB)，Linux下ru_maxrss单位为KB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_fetch(mode, table, limit, batch_size, result_queue):
+    """子进程入口：执行一次读取并回传统计结果"""
+    import analysis_core as module
+    module.set_table(table)
+    pymysql = module.pymysql
+    query = f"SELECT * FROM {table}" + (f" LIMIT {limit}" if limit else "")
+    baseline_rss = peak_rss_mb()
+
+    conn = module.connect_mysql()
+    try:
+        start = time.perf_counter()
+        if mode == "read_sql":
+            # 现有路径: DictCursor + pd.read_sql
+            data = module.pd.read_sql(query, conn)
+        else:
+            # 新路径: 服务端游标 + 元组行 + 类型化列缓冲区
+            with conn.cursor(pymysql.cursors.SSCursor) as cursor:
+                cursor.execute(query)
+                data = module.fetch_typed_columns(cursor, batch_size=batch_size, capacity=limit)
+        elapsed = time.perf_counter() - start
+    finally:
+        conn.close()
+
+    result_queue.put({
+        "mode": mode,
+        "rows": len(data),
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(len(data) / elapsed, 1) if elapsed > 0 else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "import_rss_mb": round(baseline_rss, 1),
+        "frame_mb": round(data.memory_usage(deep=True).sum() / (1024 ** 2), 1),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MySQL读取路径基准测试")
+    parser.add_argument("--table", default="raw_user_action", help="读取的数据表")
+    parser.add_argument("--limit", type=int, default=0, help="只读取前N行(默认全表)")
+    parser.add_argument("--batch-size", type=int, default=100000, help="fetchmany批大小")
+    parser.add_argument("--repeat", type=int, default=1, help="每种方式重复次数")
+    parser.add_argument("--json", help="将结果写入JSON文件")
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    results = []
+    for _ in range(args.repeat):
+        for mode in ("read_sql", "typed"):
+            queue = ctx.Queue()
+            proc = ctx.Process(target=run_fetch,
+                               args=(mode, args.table, args.limit, args.batch_size, queue))
+            proc.start()
+            proc.join()
+            if proc.exitcode != 0:
+                print(f"[{mode}] 子进程异常退出，退出码: {proc.exitcode}", file=sys.stderr)
+                continue
+            results.append(queue.get())
+
+    print(f"{'模式':<10}{'行数':>12}{'耗时(秒)':>12}{'行/秒':>14}{'峰值RSS(MB)':>14}{'DataFrame(MB)':>15}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['rows']:>12,}{r['seconds']:>12.2f}{r['rows_per_sec']:>14,.0f}"
+              f"{r['peak_rss_mb']:>14.1f}{r['frame_mb']:>15.1f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""HBase加载吞吐基准测试：用本地happybase兼容桩代替HBase集群
+
+桩模块实现happybase的Connection/ConnectionPool/Table/Batch接口，每次批量发送
+按 --latency-ms(每次RPC往返)与 --row-us(服务端每行开销)休眠以模拟网络与
+RegionServer耗时，并把收到的行数记入临时目录，用于核对写入行数。
+依次测试原单连接csv.reader逐行加载方式与hive-to-hbase.py在不同进程数、
+批大小下的吞吐。
+用法:
+  python3 gen-user-action.py --rows 1M --format tsv --output bench/user_action_1M.tsv
+  python3 bench-hbase-load.py --input bench/user_action_1M.tsv --workers 1,2,4 --batch-sizes 1000,5000
+"""
+import argparse
+import csv
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+
+STUB_SOURCE = '''
+"""happybase兼容桩(由bench-hbase-load.py生成)"""
+import contextlib
+import os
+import queue
+import threading
+import time
+
+LATENCY = float(os.environ.get("HAPPYBASE_STUB_LATENCY_MS", "0")) / 1000
+ROW_COST = float(os.environ.get("HAPPYBASE_STUB_ROW_US", "0")) / 1e6
+LOG_DIR = os.environ.get("HAPPYBASE_STUB_DIR")
+_lock = threading.Lock()
+
+
+def _record(table, rows):
+    time.sleep(LATENCY + ROW_COST * rows)
+    if LOG_DIR:
+        with _lock, open(os.path.join(LOG_DIR, f"{os.getpid()}.log"), "a") as f:
+            f.write(f"{table}\\t{rows}\\n")
+
+
+class Batch:
+    def __init__(self, table, batch_size=None, timestamp=None, transaction=False, wal=True):
+        self.table = table
+        self.batch_size = batch_size
+        self.timestamp = timestamp
+        self.mutations = []
+
+    def put(self, row, data, wal=None):
+        self.mutations.append((row, data))
+        if self.batch_size and len(self.mutations) >= self.batch_size:
+            self.send()
+
+    def delete(self, row, columns=None, wal=None):
+        self.mutations.append((row, None))
+        if self.batch_size and len(self.mutations) >= self.batch_size:
+            self.send()
+
+    def send(self):
+        if self.mutations:
+            _record(self.table.name, len(self.mutations))
+        self.mutations = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.send()
+
+
+class Table:
+    def __init__(self, name, connection):
+        self.name = name
+        self.connection = connection
+
+    def batch(self, **kwargs):
+        return Batch(self, **kwargs)
+
+    def put(self, row, data, timestamp=None, wal=True):
+        _record(self.name, 1)
+
+
+class Connection:
+    def __init__(self, host="localhost", port=9090, autoconnect=True, **kwargs):
+        self.host = host
+        self.port = port
+
+    def table(self, name, use_prefix=True):
+        return Table(name, self)
+
+    def tables(self):
+        return []
+
+    def create_table(self, name, families):
+        pass
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ConnectionPool:
+    def __init__(self, size, **kwargs):
+        self._queue = queue.LifoQueue(maxsize=size)
+        for _ in range(size):
+            self._queue.put(Connection(**kwargs))
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        connection = self._queue.get(timeout=timeout)
+        try:
+            yield connection
+        finally:
+            self._queue.put(connection)
+'''
+
+
+def load_loader_module(script):
+    """按文件路径加载加载器脚本（文件名含'-'，无法直接import）"""
+    spec = importlib.util.spec_from_file_location("hbase_loader", script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def legacy_load(path, table_name):
+    """原hive-to-hbase.py的加载方式：单连接、csv.reader逐行构造字典、batch_size=1000"""
+    import happybase
+    connection = happybase.Connection("localhost")
+    table = connection.table(table_name)
+    start = time.perf_counter()
+    rows = 0
+    with open(path, "r", encoding="utf-8") as f:
+        reader = csv.reader(f, delimiter="\t")
+        batch = table.batch(batch_size=1000)
+        for row in reader:
+            batch.put(row[0], {
+                "f1:uid": row[1],
+                "f1:item_id": row[2],
+                "f1:behavior_type": row[3],
+                "f1:item_category": row[4],
+                "f1:visit_date": row[5],
+                "f1:province": row[6],
+            })
+            rows += 1
+        batch.send()
+    connection.close()
+    elapsed = time.perf_counter() - start
+    return {"rows": rows, "seconds": elapsed, "rows_per_sec": rows / elapsed, "errors": []}
+
+
+def stub_rows(log_dir, table="user_action"):
+    """汇总桩在主表上收到的行数(不含索引表)并清空记录"""
+    total = 0
+    for name in os.listdir(log_dir):
+        path = os.path.join(log_dir, name)
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    table_name, rows = line.split("\t")
+                    total += int(rows) if table_name == table else 0
+        os.remove(path)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HBase加载吞吐基准测试(happybase桩)")
+    parser.add_argument("--input", required=True, help="gen-user-action.py --format tsv 生成的TSV文件")
+    parser.add_argument("--script", default="hive-to-hbase.py", help="要测试的加载器脚本")
+    parser.add_argument("--workers", default="1,2,4", help="逗号分隔的进程数列表")
+    parser.add_argument("--batch-sizes", default="1000,5000", help="逗号分隔的批大小列表")
+    parser.add_argument("--connections", type=int, default=2, help="每个进程的连接池大小")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="模拟每次批量写入的RPC往返耗时(毫秒)")
+    parser.add_argument("--row-us", type=float, default=2.0, help="模拟服务端每行写入耗时(微秒)")
+    parser.add_argument("--layout", help="hbase-splits.py生成的布局文件(默认使用id行键)")
+    parser.add_argument("--encoding", choices=["columns", "packed"], default="columns", help="单元格编码")
+    parser.add_argument("--index", default="", help="逗号分隔的二级索引(如 uid,category)")
+    parser.add_argument("--skip-legacy", action="store_true", help="不测试原单连接加载方式")
+    parser.add_argument("--json", help="将结果写入JSON文件")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        parser.error(f"输入文件不存在: {args.input}，请先运行 gen-user-action.py --format tsv 生成")
+
+    # 桩模块写入临时目录并放在导入路径最前，spawn启动的子进程同样能导入
+    stub_dir = tempfile.mkdtemp(prefix="happybase-stub-")
+    log_dir = os.path.join(stub_dir, "log")
+    os.makedirs(log_dir)
+    with open(os.path.join(stub_dir, "happybase.py"), "w", encoding="utf-8") as f:
+        f.write(STUB_SOURCE)
+    sys.path.insert(0, stub_dir)
+    os.environ.update({"HAPPYBASE_STUB_LATENCY_MS": str(args.latency_ms),
+                       "HAPPYBASE_STUB_ROW_US": str(args.row_us),
+                       "HAPPYBASE_STUB_DIR": log_dir})
+    loader = load_loader_module(os.path.abspath(args.script))
+    design = loader.RowKeyDesign.load(args.layout) if args.layout else None
+
+    results = []
+    if not args.skip_legacy:
+        print("=== 原加载方式(单连接, csv.reader, batch_size=1000) ===")
+        stats = legacy_load(args.input, "user_action")
+        stats.update(mode="legacy", workers=1, batch_size=1000, received=stub_rows(log_dir))
+        results.append(stats)
+    for workers in [int(w) for w in args.workers.split(",")]:
+        for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+            print(f"=== hive-to-hbase.py: {workers} 个进程, 批大小 {batch_size} ===")
+            stats = loader.load_tsv(args.input, workers=workers, batch_size=batch_size,
+                                    connections=args.connections, design=design, encoding=args.encoding,
+                                    indexes=[i for i in args.index.split(",") if i])
+            stats.update(mode="parallel", workers=workers, batch_size=batch_size, received=stub_rows(log_dir))
+            results.append(stats)
+
+    print(f"\n{'方式':<10}{'进程数':>6}{'批大小':>8}{'写入行数':>12}{'耗时(秒)':>10}{'行/秒':>12}  核对")
+    failed = False
+    for r in results:
+        ok = r["received"] == r["rows"] and not r["errors"]
+        failed = failed or not ok
+        print(f"{r['mode']:<10}{r['workers']:>6}{r['batch_size']:>8}{r['rows']:>12,}{r['seconds']:>10.2f}"
+              f"{r['rows_per_sec']:>12,.0f}  {'一致' if ok else '不一致(桩收到 %d 行)' % r['received']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"input": os.path.basename(args.input), "latency_ms": args.latency_ms,
+                       "row_us": args.row_us, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入: {args.json}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""分析流水线端到端基准测试：以SQLite数据库代替MySQL逐阶段运行并与基线比较
+
+数据库由gen-user-action.py生成。每次重复在独立的spawn子进程中运行全部阶段，
+借助analysis_core的StageMetrics记录各阶段耗时、吞吐与内存峰值；多次重复取吞吐
+中位数与内存最大值。内存按阶段比较tracemalloc峰值与RSS增长(阶段峰值RSS减去阶段
+开始时的RSS)，前面阶段留下的内存不计入后面的阶段。与基线比较时，任一阶段吞吐
+下降或内存上升超过阈值即以非零状态退出，便于在定时任务或CI中发现性能回退。
+用法:
+  python3 gen-user-action.py --rows 1M --output bench/user_action_1M.db
+  python3 bench-pipeline.py --db bench/user_action_1M.db --save-baseline
+  python3 bench-pipeline.py --db bench/user_action_1M.db --threshold 0.2
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import re
+import sqlite3
+import statistics
+import sys
+import tempfile
+import traceback
+import zlib
+
+STAGES = ["fetch_read_sql", "fetch_typed", "preprocess", "aggregate", "retention", "ordered_funnel",
+          "user_index", "stream", "pushdown", "render"]
+
+
+class SQLiteCursor:
+    """提供分析脚本用到的pymysql游标接口，并把MySQL方言改写为SQLite"""
+
+    REWRITES = [
+        (re.compile(r"CAST\((\w+) AS UNSIGNED\)"), r"CAST(\1 AS INTEGER)"),
+        (re.compile(r"SHOW TABLES LIKE '(\w+)'"), r"SELECT name FROM sqlite_master WHERE type='table' AND name='\1'"),
+        # SQLite没有information_schema: 行数改为COUNT(*)，创建/更新时间为空
+        (re.compile(r"SET SESSION information_schema_stats_expiry = 0"), "SELECT 1"),
+        (re.compile(r"SELECT TABLE_ROWS AS row_count, .*? FROM information_schema\.TABLES "
+                    r"WHERE TABLE_SCHEMA = DATABASE\(\) AND TABLE_NAME = '(\w+)'"),
+         r"SELECT COUNT(*) AS row_count, NULL AS created, NULL AS updated FROM \1"),
+        (re.compile(r"SHOW INDEX FROM (\w+) WHERE Key_name = %s"),
+         r"SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='\1' AND name=%s"),
+    ]
+
+    def __init__(self, cursor, as_dict=False):
+        self._cursor = cursor
+        self._as_dict = as_dict
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, query, params=None):
+        for pattern, replacement in self.REWRITES:
+            query = pattern.sub(replacement, query)
+        query = query.replace("%s", "?")
+        if params is not None:
+            query = query.replace("%%", "%")  # 与pymysql一致: 只有带参数时才转义%
+        self._cursor.execute(query, params or ())
+        return self
+
+    def _row(self, row):
+        if row is None or not self._as_dict:
+            return row
+        return {desc[0]: value for desc, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size):
+        return [self._row(r) for r in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(r) for r in self._cursor.fetchall()]
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """以SQLite数据库代替MySQL连接(只读基准测试使用)"""
+
+    def __init__(self, path, dict_cursorclass=None):
+        self.raw = sqlite3.connect(path, check_same_thread=False)
+        # MySQL日期函数
+        self.raw.create_function("MONTH", 1, lambda s: int(s[5:7]) if s else None)
+        self.raw.create_function("DAY", 1, lambda s: int(s[8:10]) if s else None)
+        self.raw.create_function("CRC32", 1, lambda s: zlib.crc32(str(s).encode()) if s is not None else None)
+        self._dict_cursorclass = dict_cursorclass
+
+    def cursor(self, cursorclass=None):
+        return SQLiteCursor(self.raw.cursor(), as_dict=cursorclass is not None
+                            and cursorclass is self._dict_cursorclass)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.raw.close()
+
+
+def run_stages(table, db_path, stages, chunk_size, result_queue):
+    """子进程入口：依次运行各阶段，回传StageMetrics报告；失败时回传异常信息"""
+    try:
+        result_queue.put(_run_stages(table, db_path, stages, chunk_size))
+    except Exception:
+        result_queue.put({"error": traceback.format_exc()})
+
+
+def _run_stages(table, db_path, stages, chunk_size):
+    workdir = tempfile.mkdtemp(prefix="bench-pipeline-")
+    os.chdir(workdir)  # 日志、缓存与图表输出写入临时目录
+    import analysis_core as ba
+    ba.set_table(table)
+    ba.METRICS.enable(trace_memory=True)
+    dict_cursor = ba.pymysql.cursors.DictCursor
+    ba.connect_mysql = lambda *args, **kwargs: SQLiteConnection(db_path, dict_cursor)
+    conn = SQLiteConnection(db_path, dict_cursor)
+    pd = ba.pd
+
+    data = processed = aggregates = None
+    for name in stages:
+        with ba.METRICS.stage(f"bench:{name}") as record:
+            if name == "fetch_read_sql":
+                data = ba.apply_compact_schema(pd.read_sql(f"SELECT * FROM {table}", conn.raw))
+                record["rows_out"] = len(data)
+            elif name == "fetch_typed":
+                with conn.cursor() as cursor:
+                    cursor.execute(f"SELECT * FROM {table}")
+                    data = ba.apply_compact_schema(ba.fetch_typed_columns(cursor, batch_size=chunk_size))
+                record["rows_out"] = len(data)
+            elif name == "preprocess":
+                record["rows_in"] = len(data)
+                processed = ba.preprocess_data(data)
+                record["rows_out"] = len(processed)
+            elif name == "aggregate":
+                record["rows_in"] = len(processed)
+                aggregates = ba.compute_aggregates(processed)
+            elif name == "retention":
+                record["rows_in"] = len(processed)
+                ba.compute_user_retention(processed)
+            elif name == "ordered_funnel":
+                record["rows_in"] = len(processed)
+                aggregates["ordered_funnel"] = ba.compute_ordered_funnel(processed, by="item_category")
+            elif name == "user_index":
+                record["rows_in"] = len(processed)
+                ba.update_user_index(processed, ba.UserBitmapIndex(), ba.UidDictionary())
+            elif name == "stream":
+                state, rows, _ = ba.fold_query_into_state(conn, f"SELECT * FROM {table}",
+                                                          chunk_size=chunk_size)
+                ba.finalize_aggregates(state)
+                record["rows_in"] = rows
+            elif name == "pushdown":
+                result = ba.pushdown_aggregates_from_mysql(conn=conn, funnel_by="item_category")
+                if result is None:
+                    raise RuntimeError("聚合下推失败，详见日志")
+                record["rows_in"] = int(result["behavior_counts"].sum())
+            elif name == "render":
+                chart_tasks = [
+                    ("行为类型分布", ba.plot_behavior_distribution, ["behavior_counts"]),
+                    ("商品分类分析", ba.plot_top_purchased_categories, ["category_purchases"]),
+                    ("月度行为分析", ba.plot_monthly_behavior, ["month_behavior"]),
+                    ("省份购买分析", ba.plot_province_purchase, ["province_purchases"]),
+                    ("每日行为趋势", ba.plot_daily_behavior_trend, ["daily_users", "distinct_users_approx"]),
+                    ("商品行为关联", ba.plot_category_behavior_correlation, ["category_behavior"]),
+                    ("用户留存分析", ba.plot_user_retention, ["retention_rates", "retention_users"]),
+                    ("有序转化漏斗", ba.plot_ordered_funnel, ["ordered_funnel"]),
+                ]
+                # 未运行的阶段没有对应输入，跳过这些图表
+                tasks = [(task, func, {key: aggregates.get(key) for key in keys})
+                         for task, func, keys in chart_tasks if aggregates.get(keys[0]) is not None]
+                ba.load_plotting(backend="Agg")
+                ba.run_chart_tasks(tasks, jobs=1, force=True)  # 始终实际渲染，不走图表缓存
+                record["rows_out"] = len(tasks)
+        if name == "preprocess":
+            data = None  # 原始数据不再需要，及早释放
+    conn.close()
+    return ba.METRICS.report()
+
+
+def summarize(reports):
+    """多次重复: 吞吐与耗时取中位数，内存取最大值"""
+    summary = {}
+    names = [n for n in reports[0]["stages"] if n.startswith("bench:")]
+    for name in names:
+        runs = [r["stages"][name] for r in reports if name in r["stages"]]
+        rates = [s["rows_per_sec"] for s in runs if s["rows_per_sec"]]
+        summary[name[len("bench:"):]] = {
+            "wall_seconds": round(statistics.median(s["wall_seconds"] for s in runs), 3),
+            "cpu_seconds": round(statistics.median(s["cpu_seconds"] for s in runs), 3),
+            "rows_per_sec": round(statistics.median(rates), 1) if rates else None,
+            "tracemalloc_peak_mb": max((s["tracemalloc_peak_mb"] or 0) for s in runs),
+            "peak_rss_mb": max(s["peak_rss_mb"] for s in runs),
+            "rss_growth_mb": max((s.get("rss_growth_mb") or 0) for s in runs),
+        }
+    return summary
+
+
+def compare(summary, baseline, threshold):
+    """返回回退列表: (阶段, 指标, 基线值, 当前值)"""
+    regressions = []
+    for stage, current in summary.items():
+        base = baseline.get(stage)
+        if not base:
+            continue
+        if base.get("rows_per_sec") and current["rows_per_sec"] is not None \
+                and current["rows_per_sec"] < base["rows_per_sec"] * (1 - threshold):
+            regressions.append((stage, "rows_per_sec", base["rows_per_sec"], current["rows_per_sec"]))
+        # 峰值RSS包含前面阶段仍持有的内存，只比较阶段自身的RSS增长
+        for metric in ("tracemalloc_peak_mb", "rss_growth_mb"):
+            # 1MB以下的波动不计
+            if base.get(metric) and current[metric] > max(base[metric] * (1 + threshold), base[metric] + 1):
+                regressions.append((stage, metric, base[metric], current[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分析流水线端到端基准测试")
+    parser.add_argument("--db", required=True, help="gen-user-action.py生成的SQLite数据库")
+    parser.add_argument("--table", default="raw_user_action", help="数据库中的数据表")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"逗号分隔的阶段列表(可选: {','.join(STAGES)})")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="分块读取大小")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数(取中位数)")
+    parser.add_argument("--baseline", default="bench_baseline.json", help="基线文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--threshold", type=float, default=0.2, help="允许的回退比例(默认0.2，即20%%)")
+    parser.add_argument("--json", help="将本次结果写入JSON文件")
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"未知阶段: {sorted(unknown)}")
+    db_path = os.path.abspath(args.db)
+    if not os.path.exists(db_path):
+        parser.error(f"数据库不存在: {db_path}，请先运行 gen-user-action.py 生成")
+
+    ctx = mp.get_context("spawn")
+    reports = []
+    for i in range(args.repeat):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=run_stages, args=(args.table, db_path, stages, args.chunk_size, queue))
+        proc.start()
+        report = queue.get()
+        proc.join()
+        if "error" in report:
+            print(f"第 {i + 1} 次运行失败:\n{report['error']}", file=sys.stderr)
+            sys.exit(1)
+        reports.append(report)
+
+    summary = summarize(reports)
+    print(f"{'阶段':<16}{'耗时(秒)':>10}{'CPU(秒)':>10}{'行/秒':>14}{'tracemalloc(MB)':>17}{'峰值RSS(MB)':>13}"
+          f"{'RSS增长(MB)':>13}")
+    for stage, s in summary.items():
+        rate = f"{s['rows_per_sec']:,.0f}" if s["rows_per_sec"] else "-"
+        print(f"{stage:<16}{s['wall_seconds']:>10.2f}{s['cpu_seconds']:>10.2f}{rate:>14}"
+              f"{s['tracemalloc_peak_mb']:>17.1f}{s['peak_rss_mb']:>13.1f}{s['rss_growth_mb']:>13.1f}")
+
+    result = {"db": os.path.basename(db_path), "repeat": args.repeat, "stages": summary}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入: {args.json}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"未找到基线 {args.baseline}，跳过比较(使用 --save-baseline 生成)")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("db") != result["db"]:
+        print(f"警告: 基线数据库({baseline.get('db')})与本次({result['db']})不同")
+    regressions = compare(summary, baseline["stages"], args.threshold)
+    if regressions:
+        print(f"检测到性能回退(阈值 {args.threshold:.0%}):", file=sys.stderr)
+        for stage, metric, base, current in regressions:
+            print(f"  {stage}.{metric}: 基线 {base:,.1f} -> 本次 {current:,.1f}", file=sys.stderr)
+        sys.exit(1)
+    print(f"与基线相比无超过 {args.threshold:.0%} 的回退")
+
+
+if __name__ == "__main__":
+    main()
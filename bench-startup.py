@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""分析脚本启动耗时基准测试
+
+在全新的Python子进程中多次导入分析模块(analysis_core)，统计:
+  - 进程总耗时(解释器启动 + 模块导入)
+  - 模块导入耗时，以及导入阶段是否已加载绘图库
+  - 首次加载绘图库(含字体解析/缓存)耗时
+并用 -X importtime 列出导入最慢的模块。超过 --max-import-seconds 时以非零状态退出，
+便于在定时任务或CI中发现启动性能回退。
+用法: python3 bench-startup.py [--module analysis_core] [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ("matplotlib", "seaborn", "pyecharts")
+
+PROBE = """
+import importlib, json, sys, time
+t0 = time.perf_counter()
+module = importlib.import_module(sys.argv[1])
+t1 = time.perf_counter()
+heavy = [m for m in {heavy!r} if m in sys.modules]
+module.load_plotting(backend='Agg')
+t2 = time.perf_counter()
+print(json.dumps({{'import': t1 - t0, 'plotting': t2 - t1, 'heavy_at_import': heavy}}))
+""".format(heavy=HEAVY_MODULES)
+
+
+def run_probe(module, workdir):
+    """在子进程中导入一次模块，返回各阶段耗时"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", PROBE, module], cwd=workdir,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    wall = time.perf_counter() - start
+    stats = json.loads(result.stdout.strip().splitlines()[-1])
+    stats["wall"] = wall
+    return stats
+
+
+def slowest_imports(module, workdir, top=10):
+    """解析 -X importtime 输出，返回累计耗时最高的模块"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE, module], cwd=workdir,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        # 格式: "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        rows.append((int(parts[1]), parts[2].strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分析脚本启动耗时基准测试")
+    parser.add_argument("--module", default="analysis_core", help="要测试的分析模块")
+    parser.add_argument("--runs", type=int, default=5, help="重复次数(取中位数)")
+    parser.add_argument("--max-import-seconds", type=float, default=None,
+                        help="模块导入耗时中位数超过该值时返回非零状态")
+    parser.add_argument("--json", help="将结果写入JSON文件")
+    args = parser.parse_args()
+
+    workdir = os.path.dirname(os.path.abspath(__file__))
+
+    # 第一次运行会生成字体缓存，单独统计
+    cold = run_probe(args.module, workdir)
+    runs = [run_probe(args.module, workdir) for _ in range(args.runs)]
+
+    summary = {
+        "module": args.module,
+        "runs": args.runs,
+        "first_run": cold,
+        "median_wall": statistics.median(r["wall"] for r in runs),
+        "median_import": statistics.median(r["import"] for r in runs),
+        "median_plotting": statistics.median(r["plotting"] for r in runs),
+        "heavy_at_import": sorted({m for r in runs for m in r["heavy_at_import"]}),
+        "slowest_imports": [{"module": name, "cumulative_ms": us / 1000}
+                            for us, name in slowest_imports(args.module, workdir)],
+    }
+
+    print(f"首次运行: 总耗时 {cold['wall']:.3f}秒, 导入 {cold['import']:.3f}秒, 绘图库加载 {cold['plotting']:.3f}秒")
+    print(f"中位数({args.runs}次): 总耗时 {summary['median_wall']:.3f}秒, "
+          f"导入 {summary['median_import']:.3f}秒, 绘图库加载 {summary['median_plotting']:.3f}秒")
+    if summary["heavy_at_import"]:
+        print(f"警告: 导入阶段已加载绘图库: {summary['heavy_at_import']}")
+    print("导入最慢的模块:")
+    for row in summary["slowest_imports"]:
+        print(f"  {row['cumulative_ms']:>10.1f} ms  {row['module']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入: {args.json}")
+
+    if args.max_import_seconds is not None and summary["median_import"] > args.max_import_seconds:
+        print(f"导入耗时 {summary['median_import']:.3f}秒 超过阈值 {args.max_import_seconds}秒", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,876 +1,7 @@
 #!/usr/bin/env python3
-import pymysql
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from pyecharts import options as opts
-from pyecharts.charts import Map
-import numpy as np
-import traceback
-import logging
-import os
-import sys
-from datetime import datetime
-import psutil
-import time
-import argparse
-import matplotlib as mpl
-
-# ־ϵͳ
-def setup_logging():
-    """־¼ϵͳ"""
-    log_dir = "logs"
-    os.makedirs(log_dir, exist_ok=True)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_filename = os.path.join(log_dir, f"user_behavior_analysis_{timestamp}.log")
-    
-    # ɫĿ̨־ʽ
-    class ColorFormatter(logging.Formatter):
-        COLORS = {
-            logging.INFO: '\033[92m',  # ɫ
-            logging.WARNING: '\033[93m',  # ɫ
-            logging.ERROR: '\033[91m',  # ɫ
-            logging.CRITICAL: '\033[91m\033[1m'  # ɫӴ
-        }
-        RESET = '\033[0m'
-        
-        def format(self, record):
-            color = self.COLORS.get(record.levelno, '')
-            message = super().format(record)
-            return f"{color}{message}{self.RESET}" if color else message
-    
-    logger = logging.getLogger('user_behavior_analysis')
-    logger.setLevel(logging.INFO)
-    
-    # ļ
-    file_handler = logging.FileHandler(log_filename)
-    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-    
-    # ̨
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(ColorFormatter('%(asctime)s - %(levelname)s - %(message)s'))
-    
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
-    return logger
-
-logger = setup_logging()
-
-# ȷʾ (Ubuntu 18.04)
-try:
-    # ѡ
-    chinese_fonts = [
-        "SimHei", 
-        "Microsoft YaHei",
-        "WenQuanYi Micro Hei",
-        "WenQuanYi Zen Hei",
-        "Noto Sans CJK SC",
-        "Source Han Sans SC",
-        "Droid Sans Fallback",
-        "sans-serif"
-    ]
-    
-    # ȡϵͳ
-    available_fonts = [f.name.lower() for f in mpl.font_manager.fontManager.ttflist]
-    logger.info(f": {len(available_fonts)}")
-    
-    # ҵһõ
-    selected_font = None
-    for font in chinese_fonts:
-        # ƻ
-        if font.lower() in available_fonts:
-            selected_font = font
-            break
-        # ļǷڣɿķ
-        try:
-            font_files = mpl.font_manager.findfont(font, fallback_to_default=False)
-            if font_files and font_files != mpl.font_manager.get_default_font():
-                selected_font = font
-                break
-        except ValueError:
-            continue  # 岻ڣһ
-
-    if selected_font:
-        # ȫ壨MatplotlibЧ
-        plt.rcParams['font.family'] = selected_font
-        # Seaborn壨Ҫã
-        sns.set(font=selected_font)
-        # pyechartsȫѡ
-        from pyecharts.globals import CurrentConfig
-        CurrentConfig.GLOBAL_FONT = selected_font
-        
-        logger.info(f"ɹ: {selected_font}")
-    else:
-        logger.warning("δҵʵ壬ʹĬ")
-        # ǿû˷
-        plt.rcParams['font.family'] = ['sans-serif']
-        plt.rcParams['font.sans-serif'] = ['DejaVu Sans', 'Arial Unicode MS', 'sans-serif']
-    
-    plt.rcParams['axes.unicode_minus'] = False
-    logger.info("ʾ")
-    
-    # 建棨Ҫ
-    mpl.font_manager._rebuild()
-except Exception as e:
-    logger.error(f"ô: {str(e)}")
-    logger.error(traceback.format_exc())
-
-
-### 1. MySQLݿⲢȡ (ַֿ֧ȡ)
-def get_data_from_mysql(use_aggregated_query=False, chunk_size=100000):
-    """MySQLȡûΪݣַֿ֧ȡԤۺ"""
-    logger.info("ݿⲢȡ...")
-    
-    # ¼ڴʹ
-    start_mem = psutil.virtual_memory().used / (1024 ** 2)  # MB
-    
-    conn = None
-    max_retries = 3
-    retry_delay = 5  # 
-    
-    try:
-        for attempt in range(max_retries):
-            try:
-                conn = pymysql.connect(
-                    host='127.0.0.1',
-                    port=3306,
-                    user='root',
-                    password='root',
-                    database='dblab',
-                    connect_timeout=30,
-                    charset='utf8mb4',
-                    cursorclass=pymysql.cursors.DictCursor
-                )
-                logger.info("ݿӳɹ")
-                break
-            except pymysql.OperationalError as oe:
-                if attempt < max_retries - 1:
-                    logger.warning(f"ݿʧ({str(oe)}){retry_delay}... ( {attempt+1}/{max_retries})")
-                    time.sleep(retry_delay)
-                else:
-                    raise Exception(f"ݿʧ: {str(oe)}")
-        
-        # Ƿ
-        with conn.cursor() as cursor:
-            cursor.execute("SHOW TABLES LIKE 'raw_user_action'")
-            if not cursor.fetchone():
-                logger.error(": ݿûΪ 'raw_user_action' ı")
-                return None
-        
-        # ݼСѡѯʽ
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT COUNT(*) FROM raw_user_action")
-            total_rows = cursor.fetchone()['COUNT(*)']
-            logger.info(f"ݱ: {total_rows:,}")
-            
-            # ݼʹԤۺϲѯ
-            if total_rows > 5000000 or use_aggregated_query:  # 500ʹþۺ
-                logger.info("⵽ݼʹԤۺϲѯ...")
-                query = """
-                SELECT 
-                    behavior_type,
-                    DATE_FORMAT(visit_date, '%%Y-%%m') AS month,
-                    DATE_FORMAT(visit_date, '%%d') AS day,
-                    item_category,
-                    province,
-                    COUNT(DISTINCT uid) AS user_count,
-                    COUNT(*) AS total_actions
-                FROM raw_user_action
-                GROUP BY behavior_type, month, day, item_category, province
-                """
-                logger.info("ִоۺϲѯ...")
-                data = pd.read_sql(query, conn)
-                data['behavior_type_num'] = pd.to_numeric(data['behavior_type'], errors='coerce')
-            else:
-                logger.info("ʹݲѯ...")
-                query = "SELECT * FROM raw_user_action"
-                
-                # ݼֿȡ
-                if total_rows > 1000000:
-                    logger.info(f"ݼϴ({total_rows:,})÷ֿȡ(chunk_size={chunk_size})")
-                    chunks = []
-                    for i, chunk in enumerate(pd.read_sql(query, conn, chunksize=chunk_size)):
-                        chunks.append(chunk)
-                        logger.info(f"Ѷȡ #{i+1}, ۼ: {len(pd.concat(chunks, ignore_index=True)):,}")
-                    data = pd.concat(chunks, ignore_index=True)
-                else:
-                    data = pd.read_sql(query, conn)
-        
-        # ǷΪ
-        if data.empty:
-            logger.warning(": ݿѯؿս")
-            return None
-        
-        # ڴʹñ
-        end_mem = psutil.virtual_memory().used / (1024 ** 2)
-        logger.info(f"ɹȡݣ: {len(data):,}, ڴʹ: {end_mem - start_mem:.2f} MB")
-        return data
-    
-    except pymysql.OperationalError as oe:
-        logger.error(f"ݿӴ: {str(oe)}")
-        logger.error(": 1. MySQLǷ 2. ݿǷȷ")
-        return None
-    
-    except Exception as e:
-        logger.error(f"ݿ: {str(e)}")
-        logger.error(traceback.format_exc())
-        return None
-    
-    finally:
-        if conn:
-            conn.close()
-            logger.info("ݿѹر")
-
-
-### 2. Ԥ (Żڴʹ)
-def preprocess_data(data):
-    """ת͡ȡ·ݲֵ"""
-    logger.info("ڽԤ...")
-    start_time = time.time()
-    
-    try:
-        # Ч
-        if data is None or data.empty:
-            logger.error(": Ϊգ޷Ԥ")
-            return None
-        
-        # ¼ԭʼ״
-        original_shape = data.shape
-        
-        # 鲢ֵ
-        null_counts = data.isnull().sum()
-        if null_counts.sum() > 0:
-            null_columns = null_counts[null_counts > 0]
-            logger.warning(f"ݴڿֵпֵ:\n{null_columns}")
-            
-            # ֵ
-            null_percent = (data.isnull().mean() * 100).round(2)
-            high_null_cols = null_percent[null_percent > 30]
-            
-            if not high_null_cols.empty:
-                logger.warning(f": пֵ30%:\n{high_null_cols}")
-                # ɾֵߵ
-                data = data.drop(columns=high_null_cols.index.tolist())
-                logger.info(f"ɾȱʧֵ: {high_null_cols.index.tolist()}")
-            
-            # ɾʣֵ
-            data = data.dropna()
-            logger.info(f"ƳֵƳ: {original_shape[0] - data.shape[0]}")
-        
-        # ؼǷ
-        required_columns = ['behavior_type', 'visit_date', 'uid', 'item_category', 'province']
-        missing_columns = [col for col in required_columns if col not in data.columns]
-        
-        if missing_columns:
-            logger.error(f": ȱٹؼ: {missing_columns}")
-            return None
-        
-        # תΪΪֵ
-        if 'behavior_type_num' not in data.columns:  # δԤۺʱִ
-            try:
-                data['behavior_type_num'] = pd.to_numeric(data['behavior_type'], errors='coerce')
-                if data['behavior_type_num'].isna().any():
-                    invalid_count = data['behavior_type_num'].isna().sum()
-                    logger.warning(f":  {invalid_count} ЧΪͼ¼")
-                    data = data.dropna(subset=['behavior_type_num'])
-                data['behavior_type_num'] = data['behavior_type_num'].astype(int)
-            except Exception as e:
-                logger.error(f"Ϊת: {str(e)}")
-                return None
-        
-        # ȡ·
-        if 'month' not in data.columns:  # δԤۺʱִ
-            try:
-                data['month'] = data['visit_date'].astype(str).str[5:7]
-                # ֤·ݸʽ
-                invalid_months = data[~data['month'].str.match(r'^\d{2}$')]
-                if not invalid_months.empty:
-                    logger.warning(f":  {len(invalid_months)} Чڼ¼")
-                    data = data.drop(invalid_months.index)
-            except Exception as e:
-                logger.error(f"ڴ: {str(e)}")
-                return None
-        
-        # ȡе
-        if 'day' not in data.columns:  # δԤۺʱִ
-            try:
-                data['day'] = data['visit_date'].astype(str).str[8:10]
-            except:
-                logger.warning("ȡֶʧܣܲӰ")
-        
-        # ʱ䱨
-        elapsed = time.time() - start_time
-        logger.info(f"Ԥɣ: {len(data):,}, ʱ: {elapsed:.2f}")
-        return data
-    
-    except Exception as e:
-        logger.error(f"Ԥз: {str(e)}")
-        logger.error(traceback.format_exc())
-        return None
-
-
-### 3. Ϊֲӻֱͼ
-def plot_behavior_distribution(data):
-    """ʹmatplotlibΪͷֱֲͼ"""
-    try:
-        if data is None or data.empty:
-            logger.error(": ЧڻΪֲͼ")
-            return
-        
-        logger.info("ڻΪͷֱֲͼ...")
-        
-        # ΪǷЧ
-        if 'behavior_type_num' not in data.columns:
-            logger.error(": ȱΪ")
-            return
-        
-        plt.figure(figsize=(10, 6))
-        sns.histplot(data['behavior_type_num'], kde=False, bins=4, color='lightblue')
-        plt.title('Consumer Behavior Type Distribution')
-        plt.xlabel('Behavior Type (1=Browse, 4=Purchase)')
-        plt.ylabel('Frequency')
-        plt.xticks([1, 2, 3, 4])
-        plt.grid(True, alpha=0.3)
-        
-        # Ŀ¼
-        os.makedirs("output", exist_ok=True)
-        output_path = os.path.join("output", 'behavior_distribution.png')
-        plt.savefig(output_path, dpi=300)
-        plt.close()
-        logger.info(f"Ϊͷֱֲͼɣѱ: {output_path}")
-    
-    except ValueError as ve:
-        logger.error(f"ͼݴ: {str(ve)}")
-    
-    except RuntimeError as re:
-        logger.error(f"ͼʱ: {str(re)}")
-    
-    except Exception as e:
-        logger.error(f"Ϊֲͼʱδ֪: {str(e)}")
-        logger.error(traceback.format_exc())
-
-
-### 4. ǰʮƷࣨ״ͼ
-def plot_top_purchased_categories(data):
-    """ʹseabornƹǰʮƷ"""
-    try:
-        if data is None or data.empty:
-            logger.error(": ЧڻƷͼ")
-            return
-        
-        logger.info("ڷƹǰʮƷ...")
-        
-        # ҪǷ
-        required_cols = ['behavior_type_num', 'item_category']
-        missing_cols = [col for col in required_cols if col not in data.columns]
-        if missing_cols:
-            logger.error(f": ȱٹؼ: {missing_cols}")
-            return
-        
-        # ɸѡΪ
-        if 4 not in data['behavior_type_num'].values:
-            logger.warning(": ûйΪ¼")
-            return
-        
-        buy_data = data[data['behavior_type_num'] == 4].copy()
-        
-        # Ƿ㹻Ĺ¼
-        if buy_data.empty:
-            logger.warning(": ûй¼ڷ")
-            return
-        
-        # ͳƷ๺
-        category_count = buy_data['item_category'].value_counts()
-        
-        # Ƿ㹻ݵ
-        if len(category_count) < 5:
-            logger.warning(f": ֻ {len(category_count)} Ʒ࣬ڽ10")
-        
-        top_count = min(10, len(category_count))
-        category_count = category_count.nlargest(top_count)
-        
-        plt.figure(figsize=(12, 7))
-        ax = sns.barplot(x=category_count.index, y=category_count.values, color='green')
-        plt.title('Top 10 Purchased Categories')
-        plt.xlabel('product category')
-        plt.ylabel('purchase count')
-        plt.xticks(rotation=45, ha='right')
-        plt.grid(True, alpha=0.3)
-        
-        # Ϊÿֵǩ
-        for i, v in enumerate(category_count.values):
-            ax.text(i, v + 0.05 * max(category_count.values), f'{v}', ha='center', fontsize=9)
-        
-        # Ŀ¼
-        os.makedirs("output", exist_ok=True)
-        output_path = os.path.join("output", 'top_categories.png')
-        plt.savefig(output_path, dpi=300)
-        plt.close()
-        logger.info(f"ǰʮƷ״ͼɣѱ: {output_path}")
-    
-    except Exception as e:
-        logger.error(f"Ʒͼʱ: {str(e)}")
-        logger.error(traceback.format_exc())
-
-
-### 5. ·Ϊֱͼ- ޸
-def plot_monthly_behavior(data):
-    """ʹseabornֱͼΪֲ޸棩"""
-    try:
-        if data is None or data.empty:
-            logger.error(": Чڻ¶Ϊֲͼ")
-            return
-        
-        logger.info("ڻƸ·Ϊֱֲͼ...")
-        
-        # ҪǷ
-        required_cols = ['behavior_type_num', 'month']
-        missing_cols = [col for col in required_cols if col not in data.columns]
-        if missing_cols:
-            logger.error(f": ȱٹؼ: {missing_cols}")
-            return
-        
-        # ·ǷЧ
-        valid_months = data['month'].unique()
-        if len(valid_months) < 2:
-            logger.warning(f": ֻ {len(valid_months)} ·ݵݣܲʺϷ")
-        
-        # ʹdisplothistplotַ֧
-        g = sns.displot(
-            data=data,
-            x='behavior_type_num',
-            col='month',
-            bins=4,
-            kde=False,
-            color='lightgreen',
-            height=5,  # ÿͼĸ߶
-            aspect=1.2,  # ͼ߱
-            col_wrap=min(3, len(valid_months)))  # ÿ3ͼ
-        
-        # ܱǩ
-        g.fig.suptitle('Monthly Consumer Behavior Distribution', y=1.05)
-        g.set_axis_labels("Behavior Type (1=Browse, 4=Purchase)", "Frequency")
-        
-        # ͼ
-        plt.tight_layout()
-        
-        # Ŀ¼
-        os.makedirs("output", exist_ok=True)
-        output_path = os.path.join("output", 'monthly_behavior.png')
-        g.savefig(output_path, dpi=300)
-        plt.close()
-        logger.info(f"·Ϊֱֲͼɣѱ: {output_path}")
-    
-    except Exception as e:
-        logger.error(f"¶Ϊֲͼʱ: {str(e)}")
-        logger.error(traceback.format_exc())
-
-
-### 6. ʡݹͼӻ
-def plot_province_purchase(data):
-    """ʹpyechartsƸʡݹͼ"""
-    try:
-        # עͼԴհ׵ͼ⣩
-        try:
-            from pyecharts.datasets import register_url
-            # ʹߵͼ
-            register_url("https://echarts-maps.github.io/echarts-china-counties-js/")
-            logger.info("ɹߵͼԴ")
-        except Exception as e:
-            logger.warning(f"޷ߵͼԴ: {str(e)}ʹõͼ")
-        
-        if data is None or data.empty:
-            logger.error(": Чڻʡݹͼ")
-            return
-        
-        logger.info("ڷʡݹƵͼ...")
-        
-        # ҪǷ
-        required_cols = ['behavior_type_num', 'province']
-        missing_cols = [col for col in required_cols if col not in data.columns]
-        if missing_cols:
-            logger.error(f": ȱٹؼ: {missing_cols}")
-            return
-        
-        # ɸѡΪ
-        if 4 not in data['behavior_type_num'].values:
-            logger.warning(": ûйΪ¼")
-            return
-        
-        buy_data = data[data['behavior_type_num'] == 4].copy()
-        
-        # Ƿ㹻Ĺ¼
-        if buy_data.empty:
-            logger.warning(": ûй¼ڷ")
-            return
-        
-        # ͳʡݹ
-        province_count = buy_data['province'].value_counts().reset_index()
-        province_count.columns = ['province', 'count']
-        
-        # ʡǷЧ
-        if province_count['province'].isna().any():
-            logger.warning(": ڿʡݼ¼ѹ")
-            province_count = province_count.dropna(subset=['province'])
-        
-        # ׼ʡ
-        province_mapping = {
-            '': '', 'Ϻ': 'Ϻ', '': '', '': '',
-            'ӱ': 'ӱʡ', 'ɽ': 'ɽʡ', '': 'ʡ', '': 'ʡ',
-            '': 'ʡ', '': 'ʡ', '㽭': '㽭ʡ', '': 'ʡ',
-            '': 'ʡ', '': 'ʡ', 'ɽ': 'ɽʡ', '': 'ʡ',
-            '': 'ʡ', '': 'ʡ', '㶫': '㶫ʡ', '': 'ʡ',
-            'Ĵ': 'Ĵʡ', '': 'ʡ', '': 'ʡ', '': 'ʡ',
-            '': 'ʡ', 'ຣ': 'ຣʡ', '̨': '̨ʡ',
-            'ɹ': 'ɹ', '': '׳', '': '',
-            '': 'Ļ', '½': '½ά',
-            '': 'ر', '': 'ر'
-        }
-        
-        province_count['province'] = province_count['province'].map(province_mapping).fillna(province_count['province'])
-        
-        # תΪpyechartsҪݸʽ
-        map_data = [[prov, count] for prov, count in zip(province_count['province'], province_count['count'])]
-        
-        # ͼ
-        min_value = province_count['count'].min()
-        max_value = province_count['count'].max()
-        
-        # ֵΪ0
-        if min_value == max_value == 0:
-            min_value, max_value = 0, 1  # 
-        
-        china_map = (
-            Map()
-            .add("", map_data, "china", is_map_symbol_show=False)
-            .set_global_opts(
-                title_opts=opts.TitleOpts(title="ʡݹֲ"),
-                visualmap_opts=opts.VisualMapOpts(
-                    min_=min_value,
-                    max_=max_value,
-                    range_text=["Low", "High"],
-                    range_color=["lightblue", "red"],
-                    orient="vertical",
-                    pos_right="10%",
-                    pos_top="center"
-                )
-            )
-        )
-        
-        # Ŀ¼
-        os.makedirs("output", exist_ok=True)
-        output_path = os.path.join("output", "province_purchase_map.html")
-        china_map.render(output_path)
-        logger.info(f"ʡݹͼɣѱ: {output_path}")
-    
-    except Exception as e:
-        logger.error(f"ʡݹͼʱ: {str(e)}")
-        logger.error(traceback.format_exc())
-
-
-### 7. ÿûΪƷͼ
-def plot_daily_behavior_trend(data):
-    """ʹmatplotlibÿոΪ"""
-    try:
-        if data is None or data.empty:
-            logger.error(": ЧڻÿΪͼ")
-            return
-        
-        logger.info("ڷÿûΪ...")
-        
-        # ҪǷ
-        required_cols = ['day', 'behavior_type_num', 'uid']
-        missing_cols = [col for col in required_cols if col not in data.columns]
-        if missing_cols:
-            logger.error(f": ȱٹؼ: {missing_cols}")
-            return
-        
-        # ںΪͷͳ
-        daily_trend = data.groupby(['day', 'behavior_type_num'])['uid'].nunique().reset_index()
-        
-        # Ƿ㹻ݵ
-        if len(daily_trend) < 5:
-            logger.warning(f": ֻ {len(daily_trend)} ݵ㣬ܲʺƷ")
-        
-        # תݸʽ
-        daily_trend_pivot = daily_trend.pivot(index='day', columns='behavior_type_num', values='uid').fillna(0)
-        
-        # ǷΪ
-        if daily_trend_pivot.empty:
-            logger.warning(": û㹻ݴͼ")
-            return
-        
-        plt.figure(figsize=(14, 7))
-        
-        # ȡΪ
-        behavior_types = sorted(daily_trend['behavior_type_num'].unique())
-        
-        # ΪÿΪͻ
-        for behavior in behavior_types:
-            if behavior in daily_trend_pivot.columns:
-                plt.plot(daily_trend_pivot.index, daily_trend_pivot[behavior], 
-                         marker='o', label=f'Behavior {behavior}')
-        
-        plt.title('Daily User Behavior Trend')
-        plt.xlabel('Date')
-        plt.ylabel('User Count (Distinct Uid)')
-        plt.legend(title='Behavior Type')
-        plt.grid(True, alpha=0.3)
-        plt.xticks(rotation=45, ha='right')
-        
-        # Ŀ¼
-        os.makedirs("output", exist_ok=True)
-        output_path = os.path.join("output", 'daily_behavior_trend.png')
-        plt.savefig(output_path, dpi=300)
-        plt.close()
-        logger.info(f"ÿΪƷɣѱ: {output_path}")
-    
-    except Exception as e:
-        logger.error(f"ÿΪͼʱ: {str(e)}")
-        logger.error(traceback.format_exc())
-
-
-### 8. ƷΪ͹ͼ
-def plot_category_behavior_correlation(data):
-    """ʹseabornƷΪ͹ͼ"""
-    try:
-        if data is None or data.empty:
-            logger.error(": ЧڻƷͼ")
-            return
-        
-        logger.info("ڷƷΪ͹...")
-        
-        # ҪǷ
-        required_cols = ['item_category', 'behavior_type_num']
-        missing_cols = [col for col in required_cols if col not in data.columns]
-        if missing_cols:
-            logger.error(f": ȱٹؼ: {missing_cols}")
-            return
-        
-        # ͳÿƷ¸Ϊ͵
-        category_behavior = data.groupby(['item_category', 'behavior_type_num'])['uid'].count().reset_index()
-        
-        # Ƿ㹻ݵ
-        if len(category_behavior) < 10:
-            logger.warning(f": ֻ {len(category_behavior)} ݵ㣬ܲʺͼ")
-        
-        # תΪ
-        category_behavior_pivot = category_behavior.pivot(
-            index='item_category', 
-            columns='behavior_type_num', 
-            values='uid'
-        ).fillna(0)
-        
-        # Ƿ㹻
-        if category_behavior_pivot.empty or category_behavior_pivot.shape[0] < 5:
-            logger.warning(": û㹻ݴͼ")
-            return
-        
-        # ѡΪǰ20Ʒ
-        top_categories = category_behavior_pivot.sum(axis=1).nlargest(20).index
-        category_behavior_pivot = category_behavior_pivot.loc[top_categories]
-        
-        plt.figure(figsize=(15, 10))
-        sns.heatmap(category_behavior_pivot, annot=True, fmt='g', cmap='YlGnBu', 
-                   cbar_kws={'label': 'Ϊ'}, annot_kws={'size': 8})
-        plt.title('Category and Behavior Type Correlation Heatmap')
-        plt.xlabel('behavior type (1=Browse, 4=Purchase)')
-        plt.ylabel('category id')
-        
-        # Ŀ¼
-        os.makedirs("output", exist_ok=True)
-        output_path = os.path.join("output", 'category_behavior_heatmap.png')
-        plt.savefig(output_path, dpi=300)
-        plt.close()
-        logger.info(f"ƷΪɣѱ: {output_path}")
-    
-    except Exception as e:
-        logger.error(f"Ʒͼʱ: {str(e)}")
-        logger.error(traceback.format_exc())
-
-
-### 9. û
-def plot_user_retention(data):
-    """ûӻ"""
-    try:
-        if data is None or data.empty:
-            logger.error(": Чû")
-            return
-        
-        logger.info("ڽû...")
-        
-        # ҪǷ
-        required_cols = ['uid', 'visit_date']
-        missing_cols = [col for col in required_cols if col not in data.columns]
-        if missing_cols:
-            logger.error(f": ȱٹؼ: {missing_cols}")
-            return
-        
-        # ݸԱ޸ԭʼ
-        retention_data = data[['uid', 'visit_date']].copy()
-        
-        # תڸʽ
-        try:
-            retention_data['visit_date'] = pd.to_datetime(retention_data['visit_date'])
-        except Exception as e:
-            logger.error(f"ת: {str(e)}")
-            return
-        
-        # û״η
-        first_visit = retention_data.groupby('uid')['visit_date'].min().reset_index()
-        first_visit.columns = ['uid', 'first_visit']
-        
-        # ϲ״η
-        retention_data = pd.merge(retention_data, first_visit, on='uid')
-        
-        # ʱ
-        retention_data['date_diff'] = (retention_data['visit_date'] - retention_data['first_visit']).dt.days
-        
-        # ɸѡ30
-        retention_data = retention_data[retention_data['date_diff'] <= 30]
-        
-        # Ƿ㹻û
-        unique_users = retention_data['uid'].nunique()
-        if unique_users < 100:
-            logger.warning(f": ֻ {unique_users} ûܲ׼ȷ")
-        
-        # 
-        retention_rates = retention_data.groupby('date_diff')['uid'].nunique() / unique_users * 100
-        
-        # Ƿ㹻ݵ
-        if retention_rates.empty:
-            logger.warning(": û㹻ݼ")
-            return
-        
-        plt.figure(figsize=(12, 6))
-        plt.plot(retention_rates.index, retention_rates.values, marker='o', color='red')
-        plt.axhline(y=50, color='gray', linestyle='--', alpha=0.5)
-        plt.title('User Retention Rate Over 30 Days')
-        plt.xlabel('Days Since First Visit')
-        plt.ylabel('Retention Rate (%)')
-        plt.grid(True, alpha=0.3)
-        plt.ylim(0, 105)  # ȷٷֱʾ
-        
-        # ǹؼ
-        key_days = [0, 1, 3, 7, 14, 30]
-        for day in key_days:
-            if day in retention_rates.index:
-                plt.text(day, retention_rates[day] + 2, f'{retention_rates[day]:.1f}%', ha='center')
-        
-        # Ŀ¼
-        os.makedirs("output", exist_ok=True)
-        output_path = os.path.join("output", 'user_retention.png')
-        plt.savefig(output_path, dpi=300)
-        plt.close()
-        logger.info(f"ûɣѱ: {output_path}")
-    
-    except Exception as e:
-        logger.error(f"ûз: {str(e)}")
-        logger.error(traceback.format_exc())
-
-
-### 10.  (ӴݼŻ)
-def main():
-    # ȼؼ
-    logger.info("ؼ...")
-    try:
-        import pymysql, pandas, seaborn, pyecharts
-        logger.info("бѰװ")
-    except ImportError as e:
-        missing_module = str(e).split(" ")[-1]
-        logger.error(f"ȱٹؼ: {missing_module}")
-        logger.error("ִװ:")
-        logger.error("pip install pymysql pandas seaborn pyecharts psutil")
-        return  # ˳
-
-    parser = argparse.ArgumentParser(description='ûΪݷ')
-    parser.add_argument('--aggregate', action='store_true', help='ʹԤۺϲѯŻݼ')
-    parser.add_argument('--chunk-size', type=int, default=100000, help='ֿȡС(Ĭ100,000)')
-    args = parser.parse_args()
-    
-    logger.info("="*70)
-    logger.info(f"{'ûΪݷ':^70}")
-    logger.info(f"{': ':<20} Ԥۺ={args.aggregate}, ֿС={args.chunk_size}")
-    logger.info("="*70)
-    
-    try:
-        # 1. ȡ
-        logger.info(">>> 1: ݿȡ")
-        data = get_data_from_mysql(
-            use_aggregated_query=args.aggregate, 
-            chunk_size=args.chunk_size
-        )
-        if data is None or data.empty:
-            logger.error("ݻȡʧܣ˳")
-            return
-        
-        # 2. Ԥ
-        logger.info(">>> 2: Ԥ")
-        processed_data = preprocess_data(data)
-        if processed_data is None or processed_data.empty:
-            logger.error("Ԥʧܣ˳")
-            return
-        
-        # 3. ִиӻ (ݹģ)
-        logger.info(">>> 3: ʼݷӻ")
-        
-        # б
-        analysis_tasks = [
-            ("Ϊͷֲ", plot_behavior_distribution),
-            ("Ʒ", plot_top_purchased_categories),
-            ("¶Ϊ", plot_monthly_behavior),
-            ("ʡݹ", plot_province_purchase),
-            ("ÿΪ", plot_daily_behavior_trend),
-            ("ƷΪ", plot_category_behavior_correlation),
-            ("û", plot_user_retention)
-        ]
-        
-        # ݼ߳ɱ
-        if len(processed_data) > 5000000:  # 500
-            logger.warning("⵽ݼ߳ɱ")
-            skip_tasks = ["ƷΪ", "û"]
-            analysis_tasks = [t for t in analysis_tasks if t[0] not in skip_tasks]
-            logger.info(f"ִе: {[t[0] for t in analysis_tasks]}")
-        
-        # ִ
-        for task_name, task_func in analysis_tasks:
-            try:
-                logger.info(f"{'='*30} ʼ: {task_name} {'='*30}")
-                start_time = time.time()
-                
-                task_func(processed_data)
-                
-                elapsed = time.time() - start_time
-                logger.info(f"{'='*30} : {task_name} [ʱ: {elapsed:.2f}] {'='*30}")
-            except Exception as e:
-                logger.error(f" '{task_name}' ִʧ: {str(e)}")
-                logger.error(traceback.format_exc())
-                logger.info(f" '{task_name}'ִк")
-        
-        logger.info("="*70)
-        logger.info(f"{'ݷ':^70}")
-        logger.info("="*70)
-    
-    except KeyboardInterrupt:
-        logger.warning("ûж")
-    
-    except Exception as e:
-        logger.error(f"δ쳣: {str(e)}")
-        logger.error(traceback.format_exc())
-        logger.error("쳣ֹ")
-    
-    finally:
-        # ǰ
-        plt.close('all')  # رmatplotlibͼ
-        logger.info("ִн")
-
+# -*- coding: gbk -*-
+"""ûΪݷ: MySQL raw_user_action (ʵּanalysis_core.py)"""
+import analysis_core
 
 if __name__ == "__main__":
-    # ϵͳԴ
-    logger.info(f"ϵͳڴ: {psutil.virtual_memory().total / (1024 ** 3):.2f} GB")
-    logger.info(f"CPU: {psutil.cpu_count()}")
-    logger.info(f"Python汾: {sys.version}")
-    
-    main()
\ No newline at end of file
+    analysis_core.run('raw_user_action')
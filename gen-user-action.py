@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""生成raw_user_action结构的确定性合成数据，用于没有课程数据集/MySQL时的性能测试
+
+分布尽量贴近课程数据集的偏斜特征:
+  - 用户活跃度、商品分类热度、商品热度服从Zipf分布(少数头部贡献大部分行为)
+  - 省份按人口规模加权
+  - 日期覆盖2014-11-18起的31天，周末略高，12-12大促当天显著放量
+  - 行为类型以浏览为主，收藏/加购/购买依次递减
+相同的--rows与--seed总是生成完全相同的数据(按固定大小分块、逐块派生随机种子)。
+输出为SQLite数据库(表raw_user_action，列均为TEXT，与MySQL表结构一致)或
+无表头TSV(字段顺序同hive-to-hbase.py读取的user_action.tsv)。
+用法: python3 gen-user-action.py --rows 10M --format sqlite --output bench/user_action_10M.db
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ["id", "uid", "item_id", "behavior_type", "item_category", "visit_date", "province"]
+
+# 分块大小固定，保证同一种子下输出与机器内存无关
+CHUNK_ROWS = 1000000
+
+# 行为类型: 1浏览 2收藏 3加购物车 4购买
+BEHAVIOR_WEIGHTS = {"1": 0.94, "2": 0.018, "3": 0.028, "4": 0.014}
+
+# 省份权重(约为人口规模，单位百万)
+PROVINCE_WEIGHTS = {
+    "广东": 104, "山东": 96, "河南": 94, "四川": 80, "江苏": 79, "河北": 72, "湖南": 66, "安徽": 60,
+    "湖北": 57, "浙江": 54, "广西": 46, "云南": 46, "江西": 45, "辽宁": 44, "黑龙江": 38, "陕西": 37,
+    "山西": 36, "福建": 37, "贵州": 35, "重庆": 29, "吉林": 27, "甘肃": 26, "内蒙古": 25, "上海": 23,
+    "台湾": 23, "新疆": 22, "北京": 20, "天津": 13, "海南": 9, "香港": 7, "宁夏": 6, "青海": 6,
+    "西藏": 3, "澳门": 1,
+}
+
+START_DATE = "2014-11-18"
+N_DAYS = 31
+
+
+def parse_rows(text):
+    """解析行数，支持1M/10M/100M/500K等写法"""
+    text = text.strip().upper()
+    scale = {"K": 10 ** 3, "M": 10 ** 6, "B": 10 ** 9}.get(text[-1:], 1)
+    number = text[:-1] if text[-1:] in ("K", "M", "B") else text
+    return int(float(number) * scale)
+
+
+def zipf_cdf(n, exponent):
+    """按排名的Zipf累积分布，配合searchsorted做逆变换采样"""
+    weights = 1.0 / np.arange(1, n + 1, dtype=np.float64) ** exponent
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+def date_weights():
+    dates = pd.date_range(START_DATE, periods=N_DAYS)
+    weights = np.where(dates.dayofweek >= 5, 1.1, 1.0)
+    weights[dates == pd.Timestamp("2014-12-12")] *= 2.5
+    return dates.strftime("%Y-%m-%d").to_numpy(), weights / weights.sum()
+
+
+class UserActionGenerator:
+    """按块生成合成数据；维度规模随总行数增长(约每50行一个用户)"""
+
+    def __init__(self, total_rows, seed=2014):
+        self.total_rows = total_rows
+        self.seed = seed
+        rng = np.random.default_rng([seed, 0])
+        self.n_users = max(total_rows // 50, 100)
+        self.n_items = max(total_rows // 25, 1000)
+        self.n_categories = 9000
+        self.user_cdf = zipf_cdf(self.n_users, 1.05)
+        self.item_cdf = zipf_cdf(self.n_items, 1.0)
+        self.category_cdf = zipf_cdf(self.n_categories, 1.2)
+        # 排名到ID的随机映射，避免ID大小与活跃度相关
+        self.user_ids = (10000000 + rng.permutation(self.n_users)).astype(str)
+        self.item_ids = (100000000 + rng.permutation(self.n_items)).astype(str)
+        self.category_ids = (1 + rng.permutation(self.n_categories)).astype(str)
+        self.dates, self.date_p = date_weights()
+        self.provinces = np.array(list(PROVINCE_WEIGHTS))
+        province_p = np.array(list(PROVINCE_WEIGHTS.values()), dtype=np.float64)
+        self.province_p = province_p / province_p.sum()
+        self.province_cdf = np.cumsum(self.province_p)
+        self.province_cdf[-1] = 1.0
+        self.behaviors = np.array(list(BEHAVIOR_WEIGHTS))
+        self.behavior_p = np.array(list(BEHAVIOR_WEIGHTS.values()))
+        self.behavior_p = self.behavior_p / self.behavior_p.sum()
+
+    def chunk(self, index):
+        start = index * CHUNK_ROWS
+        n = min(CHUNK_ROWS, self.total_rows - start)
+        rng = np.random.default_rng([self.seed, index + 1])
+        users = np.searchsorted(self.user_cdf, rng.random(n))
+        return pd.DataFrame({
+            "id": np.arange(start + 1, start + n + 1).astype(str),
+            "uid": self.user_ids[users],
+            "item_id": self.item_ids[np.searchsorted(self.item_cdf, rng.random(n))],
+            "behavior_type": rng.choice(self.behaviors, n, p=self.behavior_p),
+            "item_category": self.category_ids[np.searchsorted(self.category_cdf, rng.random(n))],
+            "visit_date": rng.choice(self.dates, n, p=self.date_p),
+            # 同一用户固定常驻省份，少量行随机漂移
+            "province": np.where(rng.random(n) < 0.95,
+                                 self.provinces[np.searchsorted(self.province_cdf, (users * 0.6180339887) % 1.0)],
+                                 rng.choice(self.provinces, n, p=self.province_p)),
+        }, columns=COLUMNS)
+
+    def chunks(self):
+        for index in range((self.total_rows + CHUNK_ROWS - 1) // CHUNK_ROWS):
+            yield self.chunk(index)
+
+
+def write_sqlite(generator, path):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("CREATE TABLE raw_user_action (" + ", ".join(f"{c} TEXT" for c in COLUMNS) + ")")
+        insert = f"INSERT INTO raw_user_action VALUES ({', '.join(['?'] * len(COLUMNS))})"
+        for frame in generator.chunks():
+            conn.executemany(insert, zip(*(frame[c].tolist() for c in COLUMNS)))
+            conn.commit()
+            yield len(frame)
+        # 与migrate.sh在MySQL表上建立的索引一致
+        conn.execute("CREATE INDEX idx_id_num ON raw_user_action (CAST(id AS INTEGER))")
+        conn.execute("CREATE INDEX idx_visit_date ON raw_user_action (visit_date)")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def write_tsv(generator, path):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for frame in generator.chunks():
+            frame.to_csv(f, sep="\t", header=False, index=False)
+            yield len(frame)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成raw_user_action结构的合成数据")
+    parser.add_argument("--rows", default="1M", help="行数，如 1M / 10M / 100M")
+    parser.add_argument("--format", choices=["sqlite", "tsv"], default="sqlite", help="输出格式")
+    parser.add_argument("--output", help="输出文件路径(默认 bench/user_action_<行数>.<db|tsv>)")
+    parser.add_argument("--seed", type=int, default=2014, help="随机种子")
+    args = parser.parse_args()
+
+    total_rows = parse_rows(args.rows)
+    output = args.output or os.path.join(
+        "bench", f"user_action_{args.rows.upper()}.{'db' if args.format == 'sqlite' else 'tsv'}")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+
+    generator = UserActionGenerator(total_rows, seed=args.seed)
+    print(f"生成 {total_rows:,} 行 -> {output} (用户 {generator.n_users:,}, 商品 {generator.n_items:,}, "
+          f"分类 {generator.n_categories:,}, seed={args.seed})")
+    writer = write_sqlite if args.format == "sqlite" else write_tsv
+    start = time.perf_counter()
+    written = 0
+    for rows in writer(generator, output):
+        written += rows
+        elapsed = time.perf_counter() - start
+        print(f"  已写入 {written:,} / {total_rows:,} 行, {written / elapsed:,.0f} 行/秒")
+    print(f"完成，耗时 {time.perf_counter() - start:.1f}秒")
+
+
+if __name__ == "__main__":
+    main()
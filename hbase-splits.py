@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""抽样输入数据，按行键分布计算HBase region切分点并保存布局文件
+
+在各输入文件中按文件大小比例随机选取字节位置，读取其后的完整一行作为样本
+(无需扫描整个文件)，用hbase_keys.RowKeyDesign计算样本行键，再按分位数得到
+均衡的切分点。布局文件供migrate.sh建表与hive-to-hbase.py加载共用。
+用法:
+  python3 hbase-splits.py --input user_action.tsv --scheme salted --buckets 16 --regions 16 --layout hbase_layout.json
+  python3 hbase-splits.py --layout hbase_layout.json --print hbase-splits   # 输出建表用的SPLITS
+  python3 hbase-splits.py --layout hbase_layout.json --print mysql-key      # 输出MySQL导出用的行键表达式
+"""
+import argparse
+import collections
+import os
+import random
+import sys
+
+from hbase_keys import SCHEMES, RowKeyDesign, compute_splits
+
+
+def sample_lines(paths, sample_size, seed=2014):
+    """在各文件中随机抽取约sample_size行(按文件大小分配)"""
+    rng = random.Random(seed)
+    sizes = {path: os.path.getsize(path) for path in paths}
+    total = sum(sizes.values())
+    lines = []
+    for path, size in sizes.items():
+        if size == 0:
+            continue
+        count = max(1, round(sample_size * size / total))
+        with open(path, "rb") as f:
+            for offset in sorted(rng.randrange(size) for _ in range(count)):
+                f.seek(offset)
+                if offset > 0:
+                    f.readline()  # 丢弃落点所在的不完整行
+                line = f.readline()
+                if line.strip():
+                    lines.append(line)
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="计算HBase region切分点")
+    parser.add_argument("--input", nargs="+", help="输入数据文件(第0列id，第1列uid)")
+    parser.add_argument("--delimiter", default="\t", help="字段分隔符(Hive导出目录为',')")
+    parser.add_argument("--scheme", choices=SCHEMES, default="salted", help="行键方案")
+    parser.add_argument("--buckets", type=int, default=16, help="加盐桶数")
+    parser.add_argument("--id-width", type=int, default=10, help="id补零宽度")
+    parser.add_argument("--regions", type=int, default=16, help="预分区的region数")
+    parser.add_argument("--sample-size", type=int, default=100000, help="抽样行数")
+    parser.add_argument("--seed", type=int, default=2014, help="抽样随机种子")
+    parser.add_argument("--layout", default="hbase_layout.json", help="布局文件路径")
+    parser.add_argument("--print", dest="print_what", choices=["hbase-splits", "mysql-key", "mysql-filter"],
+                        help="只读取已有布局文件并输出指定内容")
+    args = parser.parse_args()
+
+    if args.print_what:
+        design = RowKeyDesign.load(args.layout)
+        print({"hbase-splits": design.hbase_shell_splits, "mysql-key": design.mysql_key_expr,
+               "mysql-filter": design.mysql_filter}[args.print_what]())
+        return
+    if not args.input:
+        parser.error("计算切分点需要 --input")
+
+    design = RowKeyDesign(args.scheme, args.buckets, args.id_width)
+    delimiter = args.delimiter.encode()
+    keys = []
+    too_long = 0
+    for line in sample_lines(args.input, args.sample_size, args.seed):
+        fields = line.rstrip(b"\r\n").split(delimiter)
+        if len(fields) >= 2 and fields[0]:
+            try:
+                keys.append(design.row_key(fields))
+            except ValueError:
+                too_long += 1
+    if too_long:
+        print(f"警告: {too_long:,} 个样本行的id超过 --id-width {args.id_width}，已跳过(加载时同样会被拒绝)",
+              file=sys.stderr)
+    if not keys:
+        print("未抽到有效样本行", file=sys.stderr)
+        sys.exit(1)
+    design.splits = compute_splits(keys, args.regions)
+    design.save(args.layout)
+
+    # 按切分点统计样本在各region中的分布，检查是否均衡
+    counts = collections.Counter(sum(key >= split for split in design.splits) for key in keys)
+    expected = len(keys) / (len(design.splits) + 1)
+    print(f"样本 {len(keys):,} 行, 方案 {design.scheme}, 桶数 {design.buckets}, "
+          f"切分点 {len(design.splits)} 个 -> {args.layout}")
+    print(f"各region样本占比: 最大 {max(counts.values()) / expected:.2f} 倍均值, "
+          f"最小 {min(counts.get(i, 0) for i in range(len(design.splits) + 1)) / expected:.2f} 倍均值")
+    print(f"SPLITS => {design.hbase_shell_splits()}")
+
+
+if __name__ == "__main__":
+    main()
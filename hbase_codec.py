@@ -0,0 +1,112 @@
+"""HBase user_action行的单元格编码
+
+两种布局:
+  columns  每个字段一个限定符(f1:uid、f1:item_id ...)，值为原始字符串
+  packed   一个单元格f1:r保存定长二进制记录(17字节，小端):
+             版本(B) uid(I) item_id(I) behavior_type(B) item_category(I) 日期天数(H) 省份编码(B)
+           日期为1970-01-01起的天数，省份按PROVINCES的固定下标编码
+HBase每个单元格都要重复行键、列族、限定符与时间戳，packed布局每行只有一个
+单元格，存储与扫描字节数都大幅减少。无法装入定长记录的行(非数字字段、
+未知省份等)自动退回columns布局，解码时按行识别两种布局。
+"""
+import datetime
+import functools
+import struct
+
+import numpy as np
+
+FAMILY = b"f1"
+COLUMN_QUALIFIERS = [b"f1:uid", b"f1:item_id", b"f1:behavior_type", b"f1:item_category", b"f1:visit_date",
+                     b"f1:province"]
+PACKED_QUALIFIER = b"f1:r"
+ENCODINGS = ("columns", "packed")
+
+RECORD_VERSION = 1
+RECORD = struct.Struct("<BIIBIHB")
+RECORD_DTYPE = np.dtype([("version", "u1"), ("uid", "<u4"), ("item_id", "<u4"), ("behavior_type", "u1"),
+                         ("item_category", "<u4"), ("visit_day", "<u2"), ("province", "u1")])
+assert RECORD_DTYPE.itemsize == RECORD.size
+
+# 省份字典只能在末尾追加，已写入的编码不可改变
+PROVINCES = ["北京", "天津", "河北", "山西", "内蒙古", "辽宁", "吉林", "黑龙江", "上海", "江苏", "浙江", "安徽",
+             "福建", "江西", "山东", "河南", "湖北", "湖南", "广东", "广西", "海南", "重庆", "四川", "贵州",
+             "云南", "西藏", "陕西", "甘肃", "青海", "宁夏", "新疆", "香港", "澳门", "台湾"]
+PROVINCE_CODES = {name.encode(): code for code, name in enumerate(PROVINCES)}
+
+EPOCH = datetime.date(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+
+def encode_columns(fields):
+    """columns布局：TSV字段(bytes)第1~6列逐列写入"""
+    return dict(zip(COLUMN_QUALIFIERS, fields[1:7]))
+
+
+def _canonical_int(field):
+    """只接受解码后能原样还原的十进制整数(如'007'会被拒绝)"""
+    if not field.isdigit() or (field[:1] == b"0" and len(field) > 1):
+        raise ValueError(field)
+    return int(field)
+
+
+@functools.lru_cache(maxsize=4096)
+def _visit_day(field):
+    """日期字符串转为天数；日期取值很少，结果缓存"""
+    date = datetime.date.fromisoformat(field.decode())
+    if date.isoformat().encode() != field:
+        raise ValueError(field)
+    return date.toordinal() - EPOCH_ORDINAL
+
+
+def encode_packed(fields):
+    """packed布局；字段无法无损装入定长记录时返回None"""
+    try:
+        return {PACKED_QUALIFIER: RECORD.pack(RECORD_VERSION, _canonical_int(fields[1]), _canonical_int(fields[2]),
+                                              _canonical_int(fields[3]), _canonical_int(fields[4]),
+                                              _visit_day(fields[5]), PROVINCE_CODES[fields[6]])}
+    except (ValueError, KeyError, struct.error):
+        return None
+
+
+def encoder(encoding):
+    """返回把TSV字段编码为{限定符: 值}的函数"""
+    if encoding == "columns":
+        return encode_columns
+    if encoding != "packed":
+        raise ValueError(f"未知的编码: {encoding}，可选: {ENCODINGS}")
+
+    def encode(fields):
+        return encode_packed(fields) or encode_columns(fields)
+    return encode
+
+
+def decode_row(data):
+    """把一行的单元格字典解码为字段字典(值均为str，与MySQL表一致)"""
+    record = data.get(PACKED_QUALIFIER)
+    if record is None:
+        return {q.split(b":", 1)[1].decode(): data[q].decode() for q in COLUMN_QUALIFIERS if q in data}
+    _, uid, item_id, behavior_type, item_category, day, province = RECORD.unpack(record)
+    return {"uid": str(uid), "item_id": str(item_id), "behavior_type": str(behavior_type),
+            "item_category": str(item_category), "visit_date": (EPOCH + datetime.timedelta(days=day)).isoformat(),
+            "province": PROVINCES[province]}
+
+
+def decode_packed_records(records):
+    """把多个packed记录一次解码为numpy结构化数组(不逐行解析)"""
+    return np.frombuffer(b"".join(records), dtype=RECORD_DTYPE)
+
+
+def province_names():
+    return np.array(PROVINCES, dtype=object)
+
+
+def estimate_cell_bytes(row_key, data):
+    """估算一行写入HBase的KeyValue字节数
+
+    每个单元格: 键长(4) + 值长(4) + 行键长(2) + 行键 + 列族长(1) + 列族 + 限定符
+    + 时间戳(8) + 类型(1) + 值；data的键为"列族:限定符"，减去冒号即列族与限定符的长度
+    """
+    total = 0
+    for qualifier, value in data.items():
+        total += 20 + len(row_key) + len(qualifier) - 1 + len(value)
+    return total
@@ -0,0 +1,112 @@
+"""HBase user_action表的行键设计
+
+支持三种行键:
+  id      补零到固定宽度的id (与原表一致，顺序写入集中在最后一个region)
+  salted  CRC32(id) % buckets 的桶号前缀 + '|' + 补零id，写入均匀分散到各桶
+  uid     CRC32(uid) % buckets 的桶号前缀 + '|' + uid + '|' + 补零id，同一用户的行相邻
+桶号用十进制补零，CRC32与MySQL的CRC32()一致，因此MySQL导出(mysql_key_expr)、
+hive-to-hbase.py与hbase-splits.py计算出的行键完全相同。长度超过补零宽度的id
+会破坏行键的顺序(MySQL的LPAD还会截断)，两边都拒绝: Python端抛出ValueError，
+MySQL导出用mysql_filter过滤。布局(方案、桶数、
+region切分点)保存为JSON，建表与加载共用同一份布局文件。
+"""
+import json
+import zlib
+
+SCHEMES = ("id", "salted", "uid")
+SEPARATOR = b"|"
+
+
+def pad_id(row_id, width):
+    """id左侧补零到固定宽度；超过宽度时抛出ValueError(不截断)"""
+    if len(row_id) > width:
+        raise ValueError(f"id长度超过行键补零宽度{width}: {row_id!r}")
+    return row_id.rjust(width, b"0")
+
+
+class RowKeyDesign:
+    """行键方案；splits为建表时使用的region切分点(由hbase-splits.py按样本计算)"""
+
+    def __init__(self, scheme="salted", buckets=16, id_width=10, splits=None):
+        if scheme not in SCHEMES:
+            raise ValueError(f"未知的行键方案: {scheme}，可选: {SCHEMES}")
+        if buckets < 1:
+            raise ValueError("桶数必须大于0")
+        self.scheme = scheme
+        self.buckets = buckets
+        self.id_width = id_width
+        self.splits = list(splits or [])
+        self.bucket_width = len(str(buckets - 1))
+
+    def bucket(self, value):
+        return zlib.crc32(value) % self.buckets
+
+    def prefix(self, bucket):
+        return str(bucket).zfill(self.bucket_width).encode()
+
+    def bucket_prefixes(self):
+        return [self.prefix(b) for b in range(self.buckets)]
+
+    def row_key(self, fields):
+        """由TSV字段(bytes，第0列id、第1列uid)构造行键"""
+        row_id = pad_id(fields[0], self.id_width)
+        if self.scheme == "id":
+            return row_id
+        if self.scheme == "salted":
+            return self.prefix(self.bucket(fields[0])) + SEPARATOR + row_id
+        return self.prefix(self.bucket(fields[1])) + SEPARATOR + fields[1] + SEPARATOR + row_id
+
+    def parse_key(self, key):
+        """从行键还原(id, uid)，id方案和salted方案的uid为None"""
+        parts = key.split(SEPARATOR)
+        row_id = parts[-1].lstrip(b"0") or b"0"
+        return row_id, (parts[1] if self.scheme == "uid" else None)
+
+    def mysql_key_expr(self, id_column="id", uid_column="uid"):
+        """在MySQL导出时计算同样行键的SQL表达式(需配合mysql_filter，LPAD会截断超长id)"""
+        row_id = f"LPAD({id_column}, {self.id_width}, '0')"
+        if self.scheme == "id":
+            return row_id
+        if self.scheme == "salted":
+            bucket = f"LPAD(CRC32({id_column}) % {self.buckets}, {self.bucket_width}, '0')"
+            return f"CONCAT({bucket}, '|', {row_id})"
+        bucket = f"LPAD(CRC32({uid_column}) % {self.buckets}, {self.bucket_width}, '0')"
+        return f"CONCAT({bucket}, '|', {uid_column}, '|', {row_id})"
+
+    def mysql_filter(self, id_column="id"):
+        """MySQL导出的WHERE条件: 只导出能无截断补零的id，与row_key的校验一致"""
+        return f"CHAR_LENGTH({id_column}) <= {self.id_width}"
+
+    def hbase_shell_splits(self):
+        """HBase shell建表语句中SPLITS的取值"""
+        return "[" + ", ".join("'" + s.decode() + "'" for s in self.splits) + "]"
+
+    def to_dict(self):
+        return {"scheme": self.scheme, "buckets": self.buckets, "id_width": self.id_width,
+                "splits": [s.decode() for s in self.splits]}
+
+    @classmethod
+    def from_dict(cls, spec):
+        return cls(spec["scheme"], spec["buckets"], spec["id_width"], [s.encode() for s in spec.get("splits", [])])
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def compute_splits(keys, regions):
+    """按样本行键的分位数计算regions-1个切分点(去重、保持升序)"""
+    keys = sorted(keys)
+    splits = []
+    for i in range(1, regions):
+        if not keys:
+            break
+        split = keys[len(keys) * i // regions]
+        if not splits or split > splits[-1]:
+            splits.append(split)
+    return splits
@@ -1,28 +1,327 @@
-#!/usr/bin/env python
-import happybase
-import csv
-
-# HBase
-connection = happybase.Connection('localhost')
-table = connection.table('user_action')
-
-# ȡTSVļ
-with open('user_action.tsv', 'r') as f:
-    reader = csv.reader(f, delimiter='\t')
-    batch = table.batch(batch_size=1000)
-    
-    for row in reader:
-        row_key = row[0]
-        data = {
-            'f1:uid': row[1],
-            'f1:item_id': row[2],
-            'f1:behavior_type': row[3],
-            'f1:item_category': row[4],
-            'f1:visit_date': row[5],
-            'f1:province': row[6]
-        }
-        batch.put(row_key, data)
-    
-    batch.send()
-
-connection.close()
\ No newline at end of file
+#!/usr/bin/env python3
+# -*- coding: gbk -*-
+"""Hiveuser_action.tsvдHBase
+
+ļֽڷΧз(߽뵽)ÿΧһӽ̽ӽڵ
+߳ͨhappybase.ConnectionPoolӰд룬緢صС
+̻ܸӽ̵Ľȣʵʱдٶȡ
+мhbase_keys.RowKeyDesignɣ--layoutָhbase-splits.pyɵĲļʱ
+뽨Ԥһ¡--encoding packedʱÿдһƵԪ
+(hbase_codec.py)洢ɨֽ١--index uid,categoryʱͬһ
+д(hbase_index.py)
+
+ÿдɹ󣬼ļ¼ֽڷΧȷϵļƫ
+(ΰύ˳ȷϣƫ֮ǰжд)жϺ--resumeӼ
+дʹüй̶ʱطŵиΪȫͬĵԪ
+汾
+÷: python3 hive-to-hbase.py --input user_action.tsv --table user_action --workers 4 --batch-size 5000 \
+          --layout hbase_layout.json [--encoding packed] [--index uid,category] [--resume]
+"""
+import argparse
+import collections
+import json
+import multiprocessing as mp
+import os
+import queue
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import fcntl
+except ImportError:  # Windowsûfcntlģ飬
+    fcntl = None
+
+import hbase_codec
+import hbase_index
+from hbase_keys import SCHEMES, RowKeyDesign
+
+
+def split_byte_ranges(path, parts):
+    """ļзΪpartsֽڷΧÿ߽綼뵽"""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as f:
+        for i in range(1, parts):
+            # Ŀλõǰһֽڶβǡڱ߽ϵвᱻ
+            f.seek(max(size * i // parts - 1, 0))
+            f.readline()
+            pos = f.tell()
+            if bounds[-1] < pos < size:
+                bounds.append(pos)
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if start < end]
+
+
+def iter_batches(path, start, end, batch_size, design, encode=hbase_codec.encode_columns, indexes=()):
+    """н[start, end)Χbatch_size(б, дб, , νļƫ)"""
+    # TSVֶ˳: id uid item_id behavior_type item_category visit_date province
+    rows, index_rows = [], []
+    skipped = 0
+    offset = start
+    with open(path, "rb") as f:
+        f.seek(start)
+        for line in f:
+            offset += len(line)
+            fields = line.rstrip(b"\r\n").split(b"\t")
+            try:
+                # ֶβidмȵм
+                row_key = design.row_key(fields) if len(fields) >= 7 and fields[0] else None
+            except ValueError:
+                row_key = None
+            if row_key is None:
+                skipped += 1
+            else:
+                rows.append((row_key, encode(fields)))
+                if indexes:
+                    index_rows.extend(hbase_index.index_mutations(fields, row_key, indexes, design.id_width))
+                if len(rows) >= batch_size:
+                    yield rows, index_rows, skipped, offset
+                    rows, index_rows, skipped = [], [], 0
+            if offset >= end:
+                break
+    if rows or skipped:
+        yield rows, index_rows, skipped, offset
+
+
+def send_batch(pool, table_name, rows, timestamp, index_rows=()):
+    """ӳȡһӣһмΪд뷢()"""
+    with pool.connection() as connection:
+        batch = connection.table(table_name).batch(timestamp=timestamp)
+        for key, data in rows:
+            batch.put(key, data)
+        batch.send()
+        index_batches = {}
+        for index, key, data in index_rows:
+            if index not in index_batches:
+                index_batches[index] = connection.table(
+                    hbase_index.index_table_name(table_name, index)).batch(timestamp=timestamp)
+            index_batches[index].put(key, data)
+        for index_batch in index_batches.values():
+            index_batch.send()
+    return len(rows)
+
+
+def acknowledge(pending, progress, worker_id, block=False):
+    """ύ˳ȷɵΣ(ƫ, , )"""
+    while pending and (block or pending[0][0] is None or pending[0][0].done()):
+        future, offset, rows, skipped = pending.popleft()
+        if future is not None:
+            future.result()  # дʧʱ׳쳣ͣڴ֮ǰ
+        progress.put((worker_id, "ack", (offset, rows, skipped)))
+
+
+def load_range(worker_id, path, start, end, options, progress):
+    """ӽڣһֽڷΧͨӳطͣдprogress"""
+    try:
+        import happybase
+        design = RowKeyDesign.from_dict(options["layout"])
+        encode = hbase_codec.encoder(options["encoding"])
+        pool = happybase.ConnectionPool(size=options["connections"], host=options["host"], port=options["port"])
+        # ;ޣٶȿڷʱȴڴռн
+        max_pending = options["connections"] * 2
+        pending = collections.deque()
+        with ThreadPoolExecutor(max_workers=options["connections"]) as executor:
+            for rows, index_rows, skipped, offset in iter_batches(path, start, end, options["batch_size"], design,
+                                                                  encode, options["indexes"]):
+                if len(pending) >= max_pending:
+                    pending[0][0].result()
+                future = executor.submit(send_batch, pool, options["table"], rows, options["timestamp"],
+                                         index_rows) if rows else None
+                pending.append((future, offset, len(rows), skipped))
+                acknowledge(pending, progress, worker_id)
+            acknowledge(pending, progress, worker_id, block=True)
+        progress.put((worker_id, "done", None))
+    except Exception:
+        progress.put((worker_id, "error", traceback.format_exc()))
+
+
+def save_checkpoint(path, checkpoint):
+    """дʱļfsyncԭ滻̱ʱ㲻"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def lock_checkpoint(path):
+    """Լֹؽͬʱƽͬһ"""
+    lock_file = open(path + ".lock", "w")
+    if fcntl is not None:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise RuntimeError(f" {path} һؽʹ")
+    return lock_file
+
+
+def load_checkpoint(path, input_path, table, design, encoding, indexes):
+    """ȡ㲢ȷ뱾μصļм֡Ԫһ"""
+    with open(path, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    expected = {"input": os.path.abspath(input_path), "size": os.path.getsize(input_path), "table": table,
+                "layout": design.to_dict(), "encoding": encoding, "indexes": list(indexes)}
+    mismatched = [key for key, value in expected.items() if checkpoint.get(key) != value]
+    if mismatched:
+        raise ValueError(f" {path} 뱾μزһ: {mismatched}")
+    return checkpoint
+
+
+def load_tsv(path, table="user_action", host="localhost", port=9090, workers=None, batch_size=1000,
+             connections=2, report_interval=2.0, design=None, checkpoint_path=None, resume=False,
+             encoding="columns", indexes=()):
+    """мTSVļͳϢֵ䣻designΪNoneʱidм
+
+    checkpoint_pathΪNoneʱ¼㣻resume=Trueʱм
+    ֽڷΧдʱüеļ¼
+    """
+    design = design or RowKeyDesign("id")
+    lock_file = lock_checkpoint(checkpoint_path) if checkpoint_path else None
+    try:
+        return _load_tsv(path, table, host, port, workers, batch_size, connections, report_interval, design,
+                         checkpoint_path, resume, encoding, indexes)
+    finally:
+        if lock_file is not None:
+            lock_file.close()
+
+
+def _load_tsv(path, table, host, port, workers, batch_size, connections, report_interval, design,
+              checkpoint_path, resume, encoding, indexes):
+    if resume and checkpoint_path and os.path.exists(checkpoint_path):
+        checkpoint = load_checkpoint(checkpoint_path, path, table, design, encoding, indexes)
+        done_rows = sum(r["rows"] for r in checkpoint["ranges"])
+        print(f"Ӽ: ȷ {done_rows:,} , ʱ {checkpoint['timestamp']}")
+    else:
+        if resume:
+            print(f"δҵ {checkpoint_path}ͷʼ")
+        ranges = split_byte_ranges(path, workers or os.cpu_count() or 1)
+        checkpoint = {"input": os.path.abspath(path), "size": os.path.getsize(path), "table": table,
+                      "layout": design.to_dict(), "encoding": encoding, "indexes": list(indexes),
+                      "timestamp": int(time.time() * 1000),
+                      "completed": False,
+                      "ranges": [{"start": start, "end": end, "offset": start, "rows": 0, "skipped": 0}
+                                 for start, end in ranges]}
+        if checkpoint_path:
+            save_checkpoint(checkpoint_path, checkpoint)
+    ranges = checkpoint["ranges"]
+    options = {"table": table, "host": host, "port": port, "batch_size": batch_size, "connections": connections,
+               "layout": design.to_dict(), "encoding": encoding, "indexes": list(indexes),
+               "timestamp": checkpoint["timestamp"]}
+    if indexes:
+        import happybase
+        connection = happybase.Connection(host=host, port=port)
+        try:
+            hbase_index.ensure_index_tables(connection, table, indexes)
+        finally:
+            connection.close()
+    ctx = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+    progress = ctx.Queue()
+    procs = {i: ctx.Process(target=load_range, args=(i, path, r["offset"], r["end"], options, progress))
+             for i, r in enumerate(ranges) if r["offset"] < r["end"]}
+    print(f" {path} ({os.path.getsize(path) / 1024 ** 2:,.1f} MB)  {len(ranges)} Χ, "
+          f"μ {len(procs)} , ÿ {connections} , С {batch_size}, м {design.scheme},  {encoding}"
+          + (f",  {','.join(indexes)}" if indexes else ""))
+
+    start_time = time.perf_counter()
+    rows = skipped = 0
+    finished, errors = set(), []
+    last_time, last_rows = start_time, 0
+    try:
+        for proc in procs.values():
+            proc.start()
+        while len(finished) < len(procs):
+            try:
+                worker_id, kind, value = progress.get(timeout=0.5)
+                if kind == "ack":
+                    offset, acked_rows, acked_skipped = value
+                    rows += acked_rows
+                    skipped += acked_skipped
+                    entry = ranges[worker_id]
+                    entry["offset"] = offset
+                    entry["rows"] += acked_rows
+                    entry["skipped"] += acked_skipped
+                    if checkpoint_path:
+                        save_checkpoint(checkpoint_path, checkpoint)
+                else:
+                    finished.add(worker_id)
+                    if kind == "error":
+                        errors.append(value)
+            except queue.Empty:
+                # ӽ̱ǿֹʱᷢͽϢ
+                for i, proc in procs.items():
+                    if i not in finished and not proc.is_alive():
+                        finished.add(i)
+                        errors.append(f"ӽ {i} 쳣˳˳: {proc.exitcode}")
+            now = time.perf_counter()
+            if now - last_time >= report_interval:
+                print(f"  д {rows:,} , ǰ {(rows - last_rows) / (now - last_time):,.0f} /, "
+                      f"ƽ {rows / (now - start_time):,.0f} /")
+                last_time, last_rows = now, rows
+    finally:
+        # 쳣˳ӽʧʱдӽ
+        for proc in procs.values():
+            if proc.is_alive() and (errors or len(finished) < len(procs)):
+                proc.terminate()
+            proc.join()
+
+    if not errors:
+        checkpoint["completed"] = True
+        if checkpoint_path:
+            save_checkpoint(checkpoint_path, checkpoint)
+    elapsed = time.perf_counter() - start_time
+    stats = {"rows": rows, "skipped": skipped, "seconds": elapsed,
+             "rows_per_sec": rows / elapsed if elapsed > 0 else 0.0, "errors": errors,
+             "total_rows": sum(r["rows"] for r in ranges)}
+    print(f": д {rows:,} ,  {skipped:,} , ۼ {stats['total_rows']:,} , "
+          f"ʱ {elapsed:.1f}, ƽ {stats['rows_per_sec']:,.0f} /")
+    if errors and checkpoint_path:
+        print(f"δɣѱ {checkpoint_path}ʹ --resume ", file=sys.stderr)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="user_action.tsvдHBase")
+    parser.add_argument("--input", default="user_action.tsv", help="HiveTSVļ")
+    parser.add_argument("--table", default="user_action", help="HBase")
+    parser.add_argument("--host", default="localhost", help="HBase Thriftַ")
+    parser.add_argument("--port", type=int, default=9090, help="HBase Thrift˿")
+    parser.add_argument("--workers", type=int, default=None, help="(ĬCPU)")
+    parser.add_argument("--connections", type=int, default=2, help="ÿ̵ӳشС(߳)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="ÿд")
+    parser.add_argument("--report-interval", type=float, default=2.0, help="()")
+    parser.add_argument("--layout", help="hbase-splits.pyɵĲļ(뽨Ԥһ)")
+    parser.add_argument("--key-scheme", choices=SCHEMES, default="id", help="δָ--layoutʱм")
+    parser.add_argument("--salt-buckets", type=int, default=16, help="δָ--layoutʱļͰ")
+    parser.add_argument("--encoding", choices=hbase_codec.ENCODINGS, default="columns",
+                        help="Ԫ: columnsÿһԪpackedÿһƵԪ")
+    parser.add_argument("--index", default="", help=f"ŷָĶ(ѡ: {','.join(hbase_index.INDEXES)})")
+    parser.add_argument("--checkpoint", help="ļ(Ĭ <ļ>.checkpoint.json)")
+    parser.add_argument("--resume", action="store_true", help="Ӽϴδɵļ")
+    args = parser.parse_args()
+
+    design = RowKeyDesign.load(args.layout) if args.layout else RowKeyDesign(args.key_scheme, args.salt_buckets)
+    indexes = [name.strip() for name in args.index.split(",") if name.strip()]
+    unknown = set(indexes) - set(hbase_index.INDEXES)
+    if unknown:
+        parser.error(f"δ֪: {sorted(unknown)}")
+
+    try:
+        stats = load_tsv(args.input, table=args.table, host=args.host, port=args.port, workers=args.workers,
+                         batch_size=args.batch_size, connections=args.connections,
+                         report_interval=args.report_interval, design=design,
+                         checkpoint_path=args.checkpoint or args.input + ".checkpoint.json", resume=args.resume,
+                         encoding=args.encoding, indexes=indexes)
+    except (ValueError, RuntimeError) as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    if stats["errors"]:
+        for error in stats["errors"]:
+            print(error, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,13 @@ HDFS_OUTPUT_DIR="/user/hbase/bigdata_output_hfile"
 BLOCK_SIZE=500000  # MySQLÿ50
 HIVE_REDUCERS=20   # ݼȺģ
 
+# HBaseм(hbase_keys.py)мͰԤ
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+KEY_SCHEME="salted"  # id / salted / uid
+SALT_BUCKETS=16
+HBASE_REGIONS=16
+LAYOUT_FILE="${OUTPUT_DIR}/hbase_layout.json"  # hive-to-hbase.py --layout ʹͬһļ
+
 # ===== ʼ =====
 echo "===== ʼ ====="
 # Ŀ¼ҪsudoȨޣ
@@ -171,6 +178,26 @@ SET unique_checks=1;
 SET foreign_key_checks=1;
 "
 
+# ɺһԽ(ȵʱά)ͬʱ:
+#   idx_id_num      CAST(id AS UNSIGNED)ĺ(MySQL 8.0.13+)idΪVARCHARűid
+#                   Χжȡˢµˮλ߶ʹͬһʽΧֻȡе
+#   idx_visit_date  ڷΧжȡmysql-rollup.pyڷؽܱ
+echo "---  ---"
+add_index() {
+    local exists=$(mysql -u hive --password=${MYSQL_PWD} -sN -e "
+    SELECT COUNT(*) FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = 'dblab' AND TABLE_NAME = 'raw_user_action' AND INDEX_NAME = '$1';")
+    if [ "${exists}" = "0" ]; then
+        mysql -u hive --password=${MYSQL_PWD} -e "USE dblab; ALTER TABLE raw_user_action ADD INDEX $1 ($2);"
+        if [ $? -ne 0 ]; then
+            echo "!!!  $1 ʧ"
+            exit 1
+        fi
+    fi
+}
+add_index idx_id_num "(CAST(id AS UNSIGNED))"
+add_index idx_visit_date "visit_date"
+
 # ֤
 echo "--- MySQLͳ ---"
 mysql -u hive --password=${MYSQL_PWD} -e "
@@ -203,18 +230,46 @@ hdfs dfs -chmod 777 /user/hadoop
 hdfs dfs -mkdir -p /user/hbase
 hdfs dfs -chmod 777 /user/hbase
 
-# MySQLݵأֿ鴦
+# Hiveļмregionзֵ㣬MySQL뽨ͬһ
+echo "--- HBaseмԤ ---"
+python3 ${SCRIPT_DIR}/hbase-splits.py --input ${OUTPUT_DIR}/00* --delimiter , \
+  --scheme ${KEY_SCHEME} --buckets ${SALT_BUCKETS} --regions ${HBASE_REGIONS} --layout ${LAYOUT_FILE}
+if [ $? -ne 0 ]; then
+    echo "!!! Ԥʧ"
+    exit 1
+fi
+ROW_KEY_EXPR=$(python3 ${SCRIPT_DIR}/hbase-splits.py --layout ${LAYOUT_FILE} --print mysql-key)
+# LPADضϳȵidЩв(hive-to-hbase.pyУһ)
+ROW_KEY_FILTER=$(python3 ${SCRIPT_DIR}/hbase-splits.py --layout ${LAYOUT_FILE} --print mysql-filter)
+HBASE_SPLITS=$(python3 ${SCRIPT_DIR}/hbase-splits.py --layout ${LAYOUT_FILE} --print hbase-splits)
+
+# MySQLݵأֿ鴦һΪּм-Nͷ
 echo "--- MySQLֿ鵼 ---"
-total_rows=$(mysql -u hive --password=${MYSQL_PWD} -sN -e "USE dblab; SELECT COUNT(*) FROM raw_user_action;")
+total_rows=$(mysql -u hive --password=${MYSQL_PWD} -sN -e "USE dblab; SELECT COUNT(*) FROM raw_user_action WHERE ${ROW_KEY_FILTER};")
+if [ $? -ne 0 ] || [ -z "${total_rows}" ]; then
+    echo "!!! ͳƴʧ"
+    exit 1
+fi
+# ѯʧʱܵ0д򳬿idᱻĬ
+rejected_rows=$(mysql -u hive --password=${MYSQL_PWD} -sN -e "USE dblab; SELECT COUNT(*) FROM raw_user_action WHERE NOT (${ROW_KEY_FILTER});")
+if [ $? -ne 0 ] || [ -z "${rejected_rows}" ]; then
+    echo "!!! ͳƳмȵʧ"
+    exit 1
+fi
+if [ "${rejected_rows}" -gt 0 ]; then
+    echo "!!! : ${rejected_rows} еidмȣHBase(hbase-splits.py --id-widthӴ)"
+fi
 blocks=$(( (total_rows + BLOCK_SIZE - 1) / BLOCK_SIZE ))
 
 for ((i=0; i<blocks; i++)); do
     offset=$((i * BLOCK_SIZE))
     echo " [$((i+1))/$blocks]:  $offset - $((offset + BLOCK_SIZE))"
     
-    mysql -u hive --password=${MYSQL_PWD} -e "
+    mysql -u hive --password=${MYSQL_PWD} -N -e "
     USE dblab;
-    SELECT * FROM raw_user_action 
+    SELECT ${ROW_KEY_EXPR}, uid, item_id, behavior_type, item_category, visit_date, province
+    FROM raw_user_action 
+    WHERE ${ROW_KEY_FILTER}
     LIMIT ${BLOCK_SIZE} OFFSET ${offset}
     " > ${OUTPUT_DIR}/raw_user_action_${i}.tsv
 done
@@ -223,14 +278,14 @@ done
 echo "--- ϴݵHDFS ---"
 hdfs dfs -put ${OUTPUT_DIR}/raw_user_action_*.tsv ${HDFS_INPUT_DIR}/
 
-# HBaseдԤ
+# HBaseдļзֵԤΪ¼ֻдģֻ1汾
 echo "--- HBaseд ---"
 ${HBASE_HOME}/bin/hbase shell <<EOF
 disable 'raw_user_action'
 drop 'raw_user_action'
 create 'raw_user_action', 
-  {NAME => 'f1', VERSIONS => 5}, 
-  {SPLITS => ['1000000', '3000000', '5000000', '7000000', '9000000']}
+  {NAME => 'f1', VERSIONS => 1}, 
+  {SPLITS => ${HBASE_SPLITS}}
 EOF
 
 # HFile
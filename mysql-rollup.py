@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""在dblab中创建并增量维护数据表(默认raw_user_action)的汇总表
+
+汇总表(表名为 rollup_<数据表>_<后缀>，各数据表互不覆盖):
+  rollup_<表>_daily_actions         日 x 行为 x 分类 x 省份 的行为次数
+  rollup_<表>_user_sketch_daily     日 x 行为 的去重用户HyperLogLog寄存器
+  rollup_<表>_user_sketch_province  日 x 省份 的去重用户HyperLogLog寄存器
+  rollup_<表>_partitions            每个日期分区的签名(行数、最大id、CRC32校验和)
+  rollup_<表>_meta                  最近一次刷新时的数据表指纹
+
+每次运行用一次GROUP BY visit_date计算各日期分区的签名，只重建签名变化
+的日期分区，并删除已不存在的日期。每批日期只扫描一次数据表(经migrate.sh
+建立的idx_visit_date索引按日期范围读取)，三张汇总表都由这次扫描的中间结果生成。刷新完成后写入数据表指纹，分析脚本
+(get_data_from_mysql的预聚合模式、--pushdown模式)在指纹一致时直接读取汇总表。
+用法: python3 mysql-rollup.py [--table raw_user_action] [--full] [--batch-dates 7]
+"""
+import argparse
+import json
+import time
+
+import analysis_core as ba
+
+DDL = {
+    "actions": """
+        CREATE TABLE IF NOT EXISTS {table} (
+            visit_date DATE NOT NULL,
+            behavior_type VARCHAR(50) NOT NULL,
+            item_category VARCHAR(50) NOT NULL,
+            province VARCHAR(50) NOT NULL,
+            total_actions BIGINT NOT NULL,
+            PRIMARY KEY (visit_date, behavior_type, item_category, province)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8""",
+    "date_behavior": """
+        CREATE TABLE IF NOT EXISTS {table} (
+            visit_date DATE NOT NULL,
+            behavior_type VARCHAR(50) NOT NULL,
+            reg SMALLINT UNSIGNED NOT NULL,
+            rho TINYINT UNSIGNED NOT NULL,
+            PRIMARY KEY (visit_date, behavior_type, reg)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8""",
+    "province": """
+        CREATE TABLE IF NOT EXISTS {table} (
+            visit_date DATE NOT NULL,
+            province VARCHAR(50) NOT NULL,
+            reg SMALLINT UNSIGNED NOT NULL,
+            rho TINYINT UNSIGNED NOT NULL,
+            PRIMARY KEY (visit_date, province, reg)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8""",
+    "partitions": """
+        CREATE TABLE IF NOT EXISTS {table} (
+            visit_date DATE NOT NULL PRIMARY KEY,
+            row_count BIGINT NOT NULL,
+            max_id BIGINT UNSIGNED NOT NULL,
+            checksum BIGINT UNSIGNED NOT NULL,
+            refreshed_at DATETIME NOT NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8""",
+    "meta": """
+        CREATE TABLE IF NOT EXISTS {table} (
+            meta_key VARCHAR(50) NOT NULL PRIMARY KEY,
+            meta_value TEXT NOT NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8""",
+}
+
+# 分区签名: 行数、最大id以及逐行CRC32之和，任一行增删改都会改变签名
+SIGNATURE_QUERY = """
+    SELECT visit_date,
+           COUNT(*),
+           COALESCE(MAX(CAST(id AS UNSIGNED)), 0),
+           COALESCE(SUM(CRC32(CONCAT_WS('|', id, uid, item_id, behavior_type, item_category, province))), 0)
+    FROM {table}
+    WHERE visit_date IS NOT NULL
+    GROUP BY visit_date"""
+
+
+def ensure_tables(cursor, tables):
+    for key, ddl in DDL.items():
+        cursor.execute(ddl.format(table=tables[key]))
+
+
+def partition_signatures(cursor):
+    cursor.execute(SIGNATURE_QUERY.format(table=ba.TABLE))
+    return {str(row[0]): tuple(int(v) for v in row[1:]) for row in cursor.fetchall()}
+
+
+def stored_signatures(cursor, tables):
+    cursor.execute(f"SELECT visit_date, row_count, max_id, checksum FROM {tables['partitions']}")
+    return {str(row[0]): tuple(int(v) for v in row[1:]) for row in cursor.fetchall()}
+
+
+BATCH_SCAN_TABLE = "rollup_batch_scan"
+
+
+def refresh_dates(cursor, tables, dates, signatures):
+    """在一个事务内删除并重建指定日期分区的全部汇总行
+
+    数据表只扫描一次: 按(日期, 行为, 分类, 省份, 寄存器)分组得到行数与最大rho，
+    写入临时表；行为次数按前四列求和，两类草图按各自分组取rho最大值，
+    都只读取这张行数远小于原表的临时表。
+    """
+    placeholders = ", ".join(["%s"] * len(dates))
+    for key in ("actions", "date_behavior", "province"):
+        cursor.execute(f"DELETE FROM {tables[key]} WHERE visit_date IN ({placeholders})", dates)
+
+    # 与分析脚本的预处理一致，关键列为空的行不计入
+    where = f"{ba.PUSHDOWN_BASE_FILTER} AND visit_date IN ({placeholders})"
+    register_expr, hashed = ba.hll_register_sql(ba.HLL_SQL_PRECISION)
+    cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {BATCH_SCAN_TABLE}")
+    cursor.execute(f"""
+        CREATE TEMPORARY TABLE {BATCH_SCAN_TABLE} AS
+        SELECT visit_date, behavior_type, item_category, province, reg, COUNT(*) AS actions, MAX(rho) AS rho FROM (
+            SELECT visit_date, behavior_type, item_category, province, {register_expr}
+            FROM (SELECT visit_date, behavior_type, item_category, province, {hashed}
+                  FROM {ba.TABLE} WHERE {where}) AS hashed
+        ) AS regs GROUP BY visit_date, behavior_type, item_category, province, reg""", dates)
+
+    cursor.execute(f"""
+        INSERT INTO {tables['actions']} (visit_date, behavior_type, item_category, province, total_actions)
+        SELECT visit_date, behavior_type, item_category, province, SUM(actions)
+        FROM {BATCH_SCAN_TABLE}
+        GROUP BY visit_date, behavior_type, item_category, province""")
+    cursor.execute(f"""
+        INSERT INTO {tables['date_behavior']} (visit_date, behavior_type, reg, rho)
+        SELECT visit_date, behavior_type, reg, MAX(rho) FROM {BATCH_SCAN_TABLE}
+        GROUP BY visit_date, behavior_type, reg""")
+    cursor.execute(f"""
+        INSERT INTO {tables['province']} (visit_date, province, reg, rho)
+        SELECT visit_date, province, reg, MAX(rho) FROM {BATCH_SCAN_TABLE}
+        GROUP BY visit_date, province, reg""")
+    cursor.execute(f"DROP TEMPORARY TABLE {BATCH_SCAN_TABLE}")
+
+    cursor.executemany(
+        f"REPLACE INTO {tables['partitions']} (visit_date, row_count, max_id, checksum, refreshed_at) "
+        f"VALUES (%s, %s, %s, %s, NOW())",
+        [(d,) + signatures[d] for d in dates])
+
+
+def drop_dates(cursor, tables, dates):
+    placeholders = ", ".join(["%s"] * len(dates))
+    for key in ("actions", "date_behavior", "province", "partitions"):
+        cursor.execute(f"DELETE FROM {tables[key]} WHERE visit_date IN ({placeholders})", dates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="维护数据表的MySQL汇总表")
+    parser.add_argument("--table", default="raw_user_action", help="要汇总的数据表")
+    parser.add_argument("--full", action="store_true", help="忽略已有分区签名，重建全部日期分区")
+    parser.add_argument("--batch-dates", type=int, default=7, help="每个事务重建的日期分区数")
+    parser.add_argument("--dry-run", action="store_true", help="只列出需要刷新的日期分区")
+    args = parser.parse_args()
+
+    ba.set_table(args.table)
+    tables = ba.rollup_tables()
+    conn = ba.connect_mysql(cursorclass=ba.pymysql.cursors.Cursor)
+    start = time.perf_counter()
+    try:
+        # 先取指纹: 刷新期间若有新写入，下次比较指纹时会判定为过期
+        fingerprint = ba.get_table_fingerprint(conn)
+        with conn.cursor() as cursor:
+            ensure_tables(cursor, tables)
+            current = partition_signatures(cursor)
+            stored = {} if args.full else stored_signatures(cursor, tables)
+        conn.commit()
+
+        changed = sorted(d for d, sig in current.items() if stored.get(d) != sig)
+        removed = sorted(set(stored) - set(current))
+        print(f"日期分区: {len(current)} 个, 需要重建: {len(changed)} 个, 需要删除: {len(removed)} 个")
+        if args.dry_run:
+            for d in changed:
+                print(f"  重建 {d}")
+            for d in removed:
+                print(f"  删除 {d}")
+            return
+
+        if args.full:
+            with conn.cursor() as cursor:
+                for key in ("actions", "date_behavior", "province", "partitions"):
+                    cursor.execute(f"DELETE FROM {tables[key]}")
+            conn.commit()
+
+        step = max(args.batch_dates, 1)
+        for i in range(0, len(changed), step):
+            batch = changed[i:i + step]
+            batch_start = time.perf_counter()
+            with conn.cursor() as cursor:
+                refresh_dates(cursor, tables, batch, current)
+            conn.commit()
+            rows = sum(current[d][0] for d in batch)
+            print(f"已重建 {batch[0]} ~ {batch[-1]} ({len(batch)} 个分区, {rows:,} 行), "
+                  f"耗时 {time.perf_counter() - batch_start:.2f}秒")
+
+        with conn.cursor() as cursor:
+            if removed:
+                drop_dates(cursor, tables, removed)
+            cursor.execute(f"REPLACE INTO {tables['meta']} (meta_key, meta_value) VALUES ('fingerprint', %s)",
+                           (json.dumps(fingerprint),))
+        conn.commit()
+        print(f"汇总表刷新完成，总耗时 {time.perf_counter() - start:.2f}秒")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def ba(tmp_path_factory):
+    """导入analysis_core；导入时会在当前目录创建logs/，因此在临时目录中导入"""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("analysis"))
+    try:
+        import analysis_core
+    finally:
+        os.chdir(cwd)
+    return analysis_core
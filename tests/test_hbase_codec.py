@@ -0,0 +1,46 @@
+import pytest
+
+import hbase_codec
+
+FIELDS = [b"1", b"10001082", b"285259775", b"1", b"4076", b"2014-12-08", "广东".encode()]
+
+
+def test_packed_round_trip():
+    data = hbase_codec.encode_packed(FIELDS)
+    assert list(data) == [hbase_codec.PACKED_QUALIFIER]
+    assert len(data[hbase_codec.PACKED_QUALIFIER]) == hbase_codec.RECORD.size
+    assert hbase_codec.decode_row(data) == {
+        "uid": "10001082", "item_id": "285259775", "behavior_type": "1", "item_category": "4076",
+        "visit_date": "2014-12-08", "province": "广东"}
+
+
+def test_columns_round_trip():
+    data = hbase_codec.encode_columns(FIELDS)
+    assert hbase_codec.decode_row(data)["visit_date"] == "2014-12-08"
+    assert hbase_codec.decode_row(data)["province"] == "广东"
+
+
+@pytest.mark.parametrize("index, value", [
+    (1, b"007"),            # 解码后无法原样还原
+    (2, b"abc"),
+    (2, b"4294967296"),     # 超出uint32
+    (5, b"2014-12-8"),
+    (6, "火星".encode()),
+])
+def test_values_that_cannot_be_packed_fall_back_to_columns(index, value):
+    fields = list(FIELDS)
+    fields[index] = value
+    assert hbase_codec.encode_packed(fields) is None
+    assert hbase_codec.encoder("packed")(fields) == hbase_codec.encode_columns(fields)
+
+
+def test_decode_packed_records_in_bulk():
+    records = [hbase_codec.encode_packed(FIELDS)[hbase_codec.PACKED_QUALIFIER]] * 3
+    decoded = hbase_codec.decode_packed_records(records)
+    assert decoded["uid"].tolist() == [10001082] * 3
+    assert hbase_codec.province_names()[decoded["province"][0]] == "广东"
+
+
+def test_unknown_encoding():
+    with pytest.raises(ValueError):
+        hbase_codec.encoder("avro")
@@ -0,0 +1,64 @@
+import zlib
+
+import pytest
+
+from hbase_keys import RowKeyDesign, compute_splits, pad_id
+
+FIELDS = [b"1234", b"10001082"]
+
+
+def test_row_keys_per_scheme():
+    assert RowKeyDesign("id", id_width=8).row_key(FIELDS) == b"00001234"
+    salted = RowKeyDesign("salted", buckets=16, id_width=8)
+    bucket = str(zlib.crc32(b"1234") % 16).zfill(2).encode()
+    assert salted.row_key(FIELDS) == bucket + b"|00001234"
+    by_uid = RowKeyDesign("uid", buckets=4, id_width=8)
+    assert by_uid.row_key(FIELDS) == str(zlib.crc32(b"10001082") % 4).encode() + b"|10001082|00001234"
+
+
+@pytest.mark.parametrize("scheme", ["id", "salted", "uid"])
+def test_parse_key_restores_fields(scheme):
+    design = RowKeyDesign(scheme, buckets=8, id_width=10)
+    row_id, uid = design.parse_key(design.row_key(FIELDS))
+    assert row_id == b"1234"
+    assert uid == (b"10001082" if scheme == "uid" else None)
+
+
+def test_over_long_id_is_rejected():
+    assert pad_id(b"1234567890", 10) == b"1234567890"
+    with pytest.raises(ValueError):
+        pad_id(b"12345678901", 10)
+    with pytest.raises(ValueError):
+        RowKeyDesign("salted", id_width=4).row_key([b"12345", b"1"])
+    assert RowKeyDesign("salted", id_width=4).mysql_filter() == "CHAR_LENGTH(id) <= 4"
+
+
+def test_padded_keys_sort_numerically():
+    design = RowKeyDesign("id", id_width=6)
+    ids = [b"9", b"10", b"100", b"11"]
+    assert sorted(ids, key=lambda i: design.row_key([i, b""])) == [b"9", b"10", b"11", b"100"]
+
+
+def test_mysql_expression_uses_same_layout():
+    expr = RowKeyDesign("salted", buckets=16, id_width=10).mysql_key_expr()
+    assert expr == "CONCAT(LPAD(CRC32(id) % 16, 2, '0'), '|', LPAD(id, 10, '0'))"
+
+
+def test_invalid_design():
+    with pytest.raises(ValueError):
+        RowKeyDesign("hash")
+    with pytest.raises(ValueError):
+        RowKeyDesign("salted", buckets=0)
+
+
+def test_compute_splits_and_layout_round_trip(tmp_path):
+    keys = [str(i).zfill(4).encode() for i in range(100)]
+    splits = compute_splits(keys, 4)
+    assert splits == [b"0025", b"0050", b"0075"]
+    assert compute_splits([b"a"] * 10, 4) == [b"a"]
+    design = RowKeyDesign("salted", buckets=16, id_width=10, splits=splits)
+    path = str(tmp_path / "layout.json")
+    design.save(path)
+    loaded = RowKeyDesign.load(path)
+    assert loaded.to_dict() == design.to_dict()
+    assert loaded.hbase_shell_splits() == "['0025', '0050', '0075']"
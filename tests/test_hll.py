@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+
+def estimate(ba, uids, precision):
+    hashes = ba.hash_uids(pd.Series(uids))
+    registers = ba.hll_registers(hashes, np.zeros(len(hashes), dtype=np.int64), 1, precision)
+    return float(ba.hll_estimate(registers)[0]), registers
+
+
+def test_estimate_within_error_bound(ba):
+    for n in (1000, 200000):
+        value, _ = estimate(ba, np.arange(n), ba.HLL_PRECISION)
+        # 3倍相对标准误差
+        assert abs(value - n) / n < 3 * 1.04 / np.sqrt(1 << ba.HLL_PRECISION)
+
+
+def test_small_cardinality_uses_linear_counting(ba):
+    value, _ = estimate(ba, [1, 2, 3, 2, 1], ba.HLL_PRECISION)
+    assert round(value) == 3
+
+
+def test_duplicates_do_not_change_registers(ba):
+    _, once = estimate(ba, np.arange(5000), 12)
+    _, twice = estimate(ba, np.concatenate([np.arange(5000), np.arange(5000)]), 12)
+    assert np.array_equal(once, twice)
+
+
+def test_merge_equals_sketch_of_union(ba):
+    _, a = estimate(ba, np.arange(0, 6000), 12)
+    _, b = estimate(ba, np.arange(4000, 10000), 12)
+    _, union = estimate(ba, np.arange(0, 10000), 12)
+    assert np.array_equal(np.maximum(a, b), union)
+
+
+def test_integer_uids_hash_the_same_across_dtypes(ba):
+    uids = np.array([10001082, 10001083, 2 ** 31 - 1])
+    assert np.array_equal(ba.hash_uids(uids.astype(np.int32)), ba.hash_uids(uids.astype(np.int64)))
+
+
+def test_grouped_registers_are_independent(ba):
+    hashes = ba.hash_uids(pd.Series(np.arange(3000)))
+    groups = np.repeat([0, 1, 2], 1000)
+    registers = ba.hll_registers(hashes, groups, 3, 12)
+    for g in range(3):
+        _, alone = estimate(ba, np.arange(g * 1000, (g + 1) * 1000), 12)
+        assert np.array_equal(registers[g], alone[0])
+
+
+def test_merge_user_sketches_takes_register_max(ba):
+    a = {'province': {'广东': np.array([1, 0, 3], dtype=np.uint8)}}
+    b = {'province': {'广东': np.array([2, 2, 0], dtype=np.uint8), '北京': np.array([1, 1, 1], dtype=np.uint8)}}
+    merged = ba.merge_user_sketches(a, b)
+    assert merged['province']['广东'].tolist() == [2, 2, 3]
+    assert merged['province']['北京'].tolist() == [1, 1, 1]
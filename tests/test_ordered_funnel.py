@@ -0,0 +1,58 @@
+import pandas as pd
+
+
+def events(rows):
+    """rows: (uid, 日期, 行为, 分类)"""
+    frame = pd.DataFrame(rows, columns=['uid', 'visit_date', 'behavior_type_num', 'item_category'])
+    frame['visit_date'] = pd.to_datetime(frame['visit_date'])
+    return frame
+
+
+def test_chain_must_follow_funnel_order(ba):
+    data = events([
+        (1, '2014-12-01', 1, 'a'), (1, '2014-12-02', 3, 'a'), (1, '2014-12-03', 4, 'a'),
+        # 先购买后浏览，不算转化
+        (2, '2014-12-01', 4, 'a'), (2, '2014-12-02', 2, 'a'), (2, '2014-12-03', 1, 'a'),
+        # 只有浏览
+        (3, '2014-12-05', 1, 'a'),
+    ])
+    result = ba.compute_ordered_funnel(data, window_days=7)
+    assert result['overall'].tolist() == [3, 1, 1]
+    assert result['breakdown'] is None
+
+
+def test_same_day_events_count_in_funnel_order(ba):
+    data = events([(1, '2014-12-01', 4, 'a'), (1, '2014-12-01', 2, 'a'), (1, '2014-12-01', 1, 'a')])
+    assert ba.compute_ordered_funnel(data)['overall'].tolist() == [1, 1, 1]
+
+
+def test_window_limits_chain_span(ba):
+    data = events([
+        (1, '2014-12-01', 1, 'a'), (1, '2014-12-05', 2, 'a'), (1, '2014-12-10', 4, 'a'),
+        # 加购距浏览超过窗口
+        (2, '2014-12-01', 1, 'a'), (2, '2014-12-09', 3, 'a'), (2, '2014-12-09', 4, 'a'),
+    ])
+    assert ba.compute_ordered_funnel(data, window_days=7)['overall'].tolist() == [2, 1, 0]
+    assert ba.compute_ordered_funnel(data, window_days=10)['overall'].tolist() == [2, 2, 2]
+
+
+def test_later_browse_restarts_the_window(ba):
+    data = events([(1, '2014-12-01', 1, 'a'), (1, '2014-12-20', 1, 'a'),
+                   (1, '2014-12-21', 2, 'a'), (1, '2014-12-22', 4, 'a')])
+    assert ba.compute_ordered_funnel(data, window_days=3)['overall'].tolist() == [1, 1, 1]
+
+
+def test_breakdown_by_group(ba):
+    data = events([
+        (1, '2014-12-01', 1, 'a'), (1, '2014-12-02', 2, 'a'), (1, '2014-12-03', 4, 'a'),
+        # 分类b只有浏览和购买，不经过加购阶段
+        (1, '2014-12-01', 1, 'b'), (1, '2014-12-02', 4, 'b'),
+        (2, '2014-12-01', 1, 'b'),
+    ])
+    result = ba.compute_ordered_funnel(data, window_days=7, by='item_category')
+    breakdown = result['breakdown']
+    assert breakdown.loc['a', ['浏览', '收藏/加购', '购买']].tolist() == [1, 1, 1]
+    assert breakdown.loc['b', ['浏览', '收藏/加购', '购买']].tolist() == [2, 0, 0]
+    assert breakdown.loc['a', '购买转化率(%)'] == 100
+    # 整体按用户统计: 用户1在分类a完成了整条链
+    assert result['overall'].tolist() == [2, 1, 1]
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def data(ba):
+    rng = np.random.default_rng(11)
+    n = 6000
+    dates = pd.date_range('2014-11-18', '2014-12-18').strftime('%Y-%m-%d')
+    raw = pd.DataFrame({
+        'id': np.arange(n),
+        'uid': rng.integers(0, 400, n),
+        'item_id': rng.integers(0, 1000, n),
+        'behavior_type': rng.choice(['1', '2', '3', '4'], n, p=[0.7, 0.1, 0.1, 0.1]),
+        'item_category': rng.choice([f'c{i}' for i in range(20)], n),
+        'visit_date': rng.choice(dates, n),
+        'province': rng.choice(['北京', '上海', '广东', '四川'], n),
+    })
+    return ba.preprocess_data(ba.apply_compact_schema(raw))
+
+
+def assert_same(expected, actual):
+    assert expected.keys() == actual.keys()
+    for key, value in expected.items():
+        if isinstance(value, pd.DataFrame):
+            pd.testing.assert_frame_equal(value, actual[key], check_dtype=False)
+        elif isinstance(value, pd.Series):
+            pd.testing.assert_series_equal(value, actual[key], check_dtype=False)
+        else:
+            assert value == actual[key], key
+
+
+def test_merged_chunks_equal_single_pass(ba, data):
+    expected = ba.compute_aggregates(data)
+    state = None
+    for chunk in np.array_split(np.arange(len(data)), 4):
+        state = ba.merge_partial_aggregates(state, ba.build_partial_aggregates(data.iloc[chunk]))
+    assert_same(expected, ba.finalize_aggregates(state))
+
+
+def test_merge_order_does_not_matter(ba, data):
+    half = len(data) // 2
+    first, second = data.iloc[:half], data.iloc[half:]
+    forward = ba.merge_partial_aggregates(ba.build_partial_aggregates(first), ba.build_partial_aggregates(second))
+    backward = ba.merge_partial_aggregates(ba.build_partial_aggregates(second), ba.build_partial_aggregates(first))
+    assert_same(ba.finalize_aggregates(forward), ba.finalize_aggregates(backward))
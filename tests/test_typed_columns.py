@@ -0,0 +1,45 @@
+import sqlite3
+
+import pandas as pd
+
+
+ROWS = [
+    (1, '10', 5, '1', 'c', '2014-12-01', '北京'),
+    (2, '10', 6, 'x', 'c', '2014-13-45', '上海'),
+    (3, 'abc', 7, '2', 'd', None, '北京'),
+    (4, '99999999999', 8, '4', 'd', '2014-12-02', '北京'),
+]
+
+
+def cursor():
+    db = sqlite3.connect(':memory:')
+    db.execute("CREATE TABLE t (id, uid, item_id, behavior_type, item_category, visit_date, province)")
+    db.executemany("INSERT INTO t VALUES (?, ?, ?, ?, ?, ?, ?)", ROWS)
+    return db.cursor()
+
+
+def test_invalid_values_become_missing(ba):
+    cur = cursor()
+    cur.execute("SELECT * FROM t")
+    data = ba.fetch_typed_columns(cur, batch_size=2)
+    assert data['behavior_type'].isna().tolist() == [False, True, False, False]
+    assert data['visit_date'].isna().tolist() == [False, True, True, False]
+    assert data['id'].tolist() == [1, 2, 3, 4]
+
+
+def test_non_numeric_uid_falls_back_to_dictionary_codes(ba):
+    cur = cursor()
+    cur.execute("SELECT * FROM t")
+    data = ba.apply_compact_schema(ba.fetch_typed_columns(cur, batch_size=2))
+    assert data['uid'].tolist() == [0, 0, 1, 2]
+
+
+def test_ranges_with_and_without_fallback_concatenate(ba):
+    cur = cursor()
+    cur.execute("SELECT * FROM t WHERE id <= 2")
+    numeric = ba.fetch_typed_columns(cur)
+    cur.execute("SELECT * FROM t WHERE id > 2")
+    coded = ba.fetch_typed_columns(cur)
+    assert isinstance(coded['uid'].dtype, pd.CategoricalDtype)
+    data = ba.apply_compact_schema(ba.concat_typed_frames([numeric, coded]))
+    assert data['uid'].tolist() == [0, 0, 1, 2]
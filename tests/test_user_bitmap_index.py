@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def random_codes():
+    rng = np.random.default_rng(7)
+    # 同时覆盖稀疏块、稠密块和跨块的编码
+    return [np.concatenate([rng.integers(0, 300000, 2000), np.arange(70000, 76000), rng.integers(0, 10, 5)])
+            for _ in range(3)]
+
+
+def test_compressed_bitmap_matches_set_operations(ba, random_codes):
+    a, b, c = (ba.CompressedBitmap.from_codes(codes) for codes in random_codes)
+    sa, sb, sc = (set(codes.tolist()) for codes in random_codes)
+    assert set((a | b).to_codes().tolist()) == sa | sb
+    assert set((a & b).to_codes().tolist()) == sa & sb
+    assert set((a - b).to_codes().tolist()) == sa - sb
+    assert len((a | b) & c) == len((sa | sb) & sc)
+    assert (a | b).max() == max(sa | sb)
+
+
+def test_containers_switch_between_sparse_and_dense(ba):
+    dense = ba.CompressedBitmap.from_codes(np.arange(ba.BITMAP_SPARSE_LIMIT + 1))
+    sparse = ba.CompressedBitmap.from_codes(np.arange(10))
+    assert dense.blocks[0].dtype == np.uint8
+    assert sparse.blocks[0].dtype == np.uint16
+    assert (dense & sparse).blocks[0].dtype == np.uint16
+    assert not (sparse - dense)
+    assert not dense - dense
+
+
+def add_rows(index, rows):
+    dates, behaviors, codes = zip(*rows)
+    index.add(np.array(dates, dtype='datetime64[D]'), np.array(behaviors), np.array(codes))
+
+
+ROWS = [
+    ('2014-12-01', 1, 0), ('2014-12-01', 1, 1), ('2014-12-01', 4, 1),
+    ('2014-12-02', 1, 0), ('2014-12-02', 2, 2), ('2014-12-03', 1, 70000),
+    ('2014-12-04', 3, 2), ('2014-12-04', 4, 2),
+]
+
+
+def test_add_is_idempotent(ba):
+    once, twice = ba.UserBitmapIndex(), ba.UserBitmapIndex()
+    add_rows(once, ROWS)
+    add_rows(twice, ROWS)
+    add_rows(twice, ROWS[:3])
+    assert once.daily_users().equals(twice.daily_users())
+    assert once.funnel() == twice.funnel()
+
+
+def test_queries(ba):
+    index = ba.UserBitmapIndex()
+    add_rows(index, ROWS)
+    assert index.n_users == 70001
+    daily = index.daily_users()
+    assert daily.loc[1, 1] == 2 and daily.loc[1, 4] == 1 and daily.loc[3, 1] == 1
+    # 漏斗不要求先后顺序: 浏览 -> 收藏/加购 -> 购买
+    assert index.funnel() == [3, 0, 0]
+    assert index.funnel(stages=((2, 3), (4,))) == [1, 1]
+    assert index.overlap(['2014-12-01'], ['2014-12-02']) == 1
+
+
+def test_retention_matches_dataframe_version(ba):
+    index = ba.UserBitmapIndex()
+    add_rows(index, ROWS)
+    user_days = pd.DataFrame({'uid': [r[2] for r in ROWS], 'visit_date': pd.to_datetime([r[0] for r in ROWS])})
+    expected_rates, expected_users = ba.compute_user_retention(user_days)
+    rates, users = index.retention()
+    assert users == expected_users
+    pd.testing.assert_series_equal(rates, expected_rates, check_names=False, check_index_type=False)
+
+
+def test_save_load_round_trip(ba, tmp_path, random_codes):
+    index = ba.UserBitmapIndex()
+    for day, codes in enumerate(random_codes):
+        index.add(np.full(len(codes), np.datetime64('2014-12-01') + day), np.ones(len(codes)), codes)
+    path = str(tmp_path / "bitmaps.npz")
+    index.save(path)
+    loaded = ba.UserBitmapIndex.load(path)
+    assert [b.to_codes().tolist() for b in loaded.bitmaps] == [b.to_codes().tolist() for b in index.bitmaps]
+    assert loaded.retention()[1] == index.retention()[1]
+
+
+def test_load_legacy_dense_matrix(ba, tmp_path):
+    bitmaps = np.zeros((2, 2), dtype=np.uint8)
+    bitmaps[0, 0] = 0b101    # 用户0、2
+    bitmaps[1, 1] = 0b1      # 用户8
+    path = str(tmp_path / "legacy.npz")
+    np.savez_compressed(path, dates=np.array(['2014-12-01', '2014-12-02'], dtype='datetime64[D]'),
+                        behaviors=np.array([1, 4], dtype=np.int8), bitmaps=bitmaps)
+    index = ba.UserBitmapIndex.load(path)
+    assert [b.to_codes().tolist() for b in index.bitmaps] == [[0, 2], [8]]
+
+
+def test_index_meta_requires_all_files(ba, tmp_path):
+    index_dir = str(tmp_path)
+    fingerprint = {'table': 't', 'created': None, 'updated': None, 'max_id': 3}
+    watermark = {'id': 3, 'max_visit_date': '2014-12-01'}
+    ba.save_user_index(ba.UidDictionary([1, 2]), ba.UserBitmapIndex(), fingerprint, watermark, index_dir=index_dir)
+    assert ba.load_user_index_meta(index_dir) == {'fingerprint': fingerprint, 'watermark': watermark}
+    # 索引文件丢失时元数据不再有效，增量模式据此改为全量计算
+    (tmp_path / ba.USER_BITMAPS_FILE).unlink()
+    assert ba.load_user_index_meta(index_dir) == {}